@@ -91,5 +91,133 @@ def upgrade_deps():
     pip.main(['install', '--upgrade', '-r', 'requirements.txt'])
 
 
+def _timeit(func, number):
+    """Returns the best time of `number` runs of `func`, in milliseconds."""
+    import timeit
+    return min(timeit.repeat(func, repeat=number, number=1)) * 1000
+
+
+@cli.command()
+@click.argument('files', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--file-count', default=10000, help='Amount of files in the generated torrent when no files are given')
+@click.option('--number', default=5, help='How many times each operation is timed, best time is reported')
+def bench_bencode(files, file_count, number):
+    """Benchmarks decoding, encoding and info hashing of large torrents"""
+    from flexget.utils.bittorrent import Torrent, bdecode, bencode
+
+    torrents = []
+    for filename in files:
+        with open(filename, 'rb') as f:
+            torrents.append((filename, f.read().strip()))
+    if not torrents:
+        meta = {'announce': 'http://tracker/announce', 'info': {
+            'name': 'generated', 'piece length': 4 * 1024 * 1024, 'pieces': os.urandom(20 * file_count),
+            'files': [{'length': i * 1000, 'path': ['CD%d' % (i // 100), '%05d - track.flac' % i]}
+                      for i in range(file_count)]}}
+        torrents.append(('<generated, %d files>' % file_count, bencode(meta)))
+
+    for name, data in torrents:
+        decoded = bdecode(data)
+        torrent = Torrent(data)
+        click.echo('%s (%d bytes)' % (name, len(data)))
+        click.echo('  bdecode:         %8.2f ms' % _timeit(lambda: bdecode(data), number))
+        click.echo('  bencode:         %8.2f ms' % _timeit(lambda: bencode(decoded), number))
+        click.echo('  info_hash:       %8.2f ms' % _timeit(lambda: Torrent(data).info_hash, number))
+        click.echo('  cached info_hash:%8.2f ms' % _timeit(lambda: torrent.info_hash, number))
+
+
+@cli.command()
+@click.option('--folders', default=200, help='Amount of folders on each level of the generated tree')
+@click.option('--files', default=50, help='Amount of files in each folder of the generated tree')
+@click.option('--depth', default=3, help='Depth of the generated tree')
+@click.option('--number', default=3, help='How many times each scan is timed, best time is reported')
+def bench_filesystem(folders, files, depth, number):
+    """Benchmarks the filesystem input on a generated folder tree"""
+    import re
+    import tempfile
+    from path import Path
+    from flexget.plugins.input.filesystem import Filesystem
+
+    root = Path(tempfile.mkdtemp(prefix='bench_filesystem'))
+    try:
+        level = [root]
+        for i in range(depth):
+            # Only the first folder of each level branches out, to keep the tree size manageable
+            level = [level[0] / ('folder%04d' % j) for j in range(folders)]
+            for folder in level:
+                folder.makedirs()
+                for j in range(files):
+                    (folder / ('file%04d.%s' % (j, 'mkv' if j % 2 else 'nfo'))).touch()
+        total = sum(1 for _ in root.walk())
+        click.echo('%s objects in %s' % (total, root))
+
+        def legacy(match):
+            # Naive walk, stat'ing every object several times before matching, for comparison
+            found = []
+            for path_object in root.walk(errors='ignore'):
+                if path_object.exists() and (path_object.isdir() or path_object.islink() or path_object.isfile()):
+                    if match(path_object) and path_object not in found:
+                        found.append(path_object)
+            return found
+
+        filesystem = Filesystem()
+        match_all = re.compile('.', re.IGNORECASE).match
+        match_mkv = re.compile(r'.*\.mkv$', re.IGNORECASE).match
+
+        def scan(match, recursion):
+            return filesystem.get_entries_from_path([root], match, recursion, False, True, True, True)
+
+        click.echo('  naive walk, all:          %10.2f ms' % _timeit(lambda: legacy(match_all), number))
+        click.echo('  scan, all:                %10.2f ms' % _timeit(lambda: scan(match_all, True), number))
+        click.echo('  scan, *.mkv:              %10.2f ms' % _timeit(lambda: scan(match_mkv, True), number))
+        click.echo('  scan, *.mkv, recursive 2: %10.2f ms' % _timeit(lambda: scan(match_mkv, 2), number))
+    finally:
+        shutil.rmtree(root)
+
+
+@cli.command()
+@click.option('--cassettes', default=os.path.join('tests', 'cassettes'), type=click.Path(exists=True, file_okay=False),
+              help='Folder of the VCR cassettes the html pages are taken from')
+@click.option('--number', default=3, help='How many times each parse is timed, best time is reported')
+def bench_soup(cassettes, number):
+    """Benchmarks the html parsers of get_soup on the pages saved in the test cassettes"""
+    import gzip
+    import io
+    import yaml
+    from bs4 import FeatureNotFound
+    from flexget.utils.soup import get_soup
+
+    pages = []
+    for name in sorted(os.listdir(cassettes)):
+        with open(os.path.join(cassettes, name)) as f:
+            # Written by VCR, with python specific tags
+            cassette = yaml.load(f, Loader=yaml.Loader)
+        for interaction in cassette.get('interactions', []):
+            response = interaction['response']
+            headers = dict((key.lower(), value[0]) for key, value in response['headers'].items())
+            if 'html' not in headers.get('content-type', ''):
+                continue
+            body = response['body']['string']
+            if headers.get('content-encoding') == 'gzip':
+                body = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+            pages.append((interaction['request']['uri'], body))
+    total = sum(len(body) for uri, body in pages)
+    click.echo('%s html pages, %.1f KiB in total' % (len(pages), total / 1024))
+
+    for parser in ('html5lib', 'html.parser', 'lxml'):
+        for parse_only in (None, 'a'):
+            try:
+                get_soup('<p>', parser=parser)
+            except FeatureNotFound:
+                click.echo('  %-30s not installed' % parser)
+                break
+            took = sum(_timeit(lambda: get_soup(body, parser=parser, parse_only=parse_only), number)
+                       for uri, body in pages)
+            label = '%s%s' % (parser, ', only links' if parse_only else '')
+            if parse_only and parser == 'html5lib':
+                label += ' (html.parser)'
+            click.echo('  %-30s %10.2f ms' % (label, took))
+
+
 if __name__ == '__main__':
     cli()
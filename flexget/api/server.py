@@ -1,7 +1,7 @@
 import os
 import logging
 import json
-from time import sleep
+import re
 
 import cherrypy
 
@@ -12,7 +12,9 @@ from pyparsing import nums, alphanums, printables
 
 from flask_restplus import inputs
 
+from flexget import logger
 from flexget.api import api, APIResource, ApiError, __version__ as __api_version__
+from flexget.utils.log_index import read_log_lines, line_in_range, line_timestamp, range_ended, file_inode
 from flexget._version import __version__
 
 log = logging.getLogger('api.server')
@@ -100,51 +102,23 @@ server_log_parser.add_argument(
     help='How many lines to find before streaming'
 )
 server_log_parser.add_argument('search', type=str, required=False, help='Search filter support google like syntax')
+server_log_parser.add_argument('since', type=str, required=False,
+                               help='Only show lines logged at or after this time (YYYY-MM-DD[ HH:MM])')
+server_log_parser.add_argument('until', type=str, required=False,
+                               help='Only show lines logged at or before this time (YYYY-MM-DD[ HH:MM]), '
+                                    'the stream ends once it is past this time')
 
+TIME_ARG_RE = re.compile(r'^\d{4}-\d\d-\d\d( \d\d:\d\d)?$')
 
-def reverse_readline(fh, start_byte=0, buf_size=8192):
-    """a generator that returns the lines of a file in reverse order"""
-    segment = None
-    offset = 0
-    if start_byte:
-        fh.seek(start_byte)
-    else:
-        fh.seek(0, os.SEEK_END)
-    total_size = remaining_size = fh.tell()
-    while remaining_size > 0:
-        offset = min(total_size, offset + buf_size)
-        fh.seek(-offset, os.SEEK_END)
-        buf = fh.read(min(remaining_size, buf_size))
-        remaining_size -= buf_size
-        lines = buf.split('\n')
-        # the first line of the buffer is probably not a complete line so
-        # we'll save it and append it to the last line of the next buffer
-        # we read
-        if segment is not None:
-            # if the previous chunk starts right from the beginning of line
-            # do not concact the segment to the last line of new chunk
-            # instead, yield the segment first
-            if buf[-1] is not '\n':
-                lines[-1] += segment
-            else:
-                yield segment
-        segment = lines[0]
-        for index in range(len(lines) - 1, 0, -1):
-            if len(lines[index]):
-                yield lines[index]
-    yield segment
-
-
-def file_inode(filename):
-    try:
-        fd = os.open(filename, os.O_RDONLY)
-        inode = os.fstat(fd).st_ino
-        return inode
-    except OSError:
-        return 0
-    finally:
-        if fd:
-            os.close(fd)
+
+def parse_time_arg(value, end=False):
+    if not value:
+        return None
+    if not TIME_ARG_RE.match(value):
+        raise ApiError('Invalid time `%s`, expected format YYYY-MM-DD[ HH:MM]' % value)
+    if len(value) == 10:
+        value += ' 23:59' if end else ' 00:00'
+    return value.encode('ascii')
 
 
 @server_api.route('/log/')
@@ -155,80 +129,127 @@ class ServerLogAPI(APIResource):
     def get(self, session=None):
         """ Stream Flexget log Streams as line delimited JSON """
         args = server_log_parser.parse_args()
+        since = parse_time_arg(args['since'])
+        until = parse_time_arg(args['until'], end=True)
+
+        if os.path.isabs(self.manager.options.logfile):
+            base_log_file = self.manager.options.logfile
+        else:
+            base_log_file = os.path.join(self.manager.config_base, self.manager.options.logfile)
 
         def follow(lines, search):
             log_parser = LogParser(search)
-            stream_from_byte = 0
-
-            lines_found = []
-
-            if os.path.isabs(self.manager.options.logfile):
-                base_log_file = self.manager.options.logfile
-            else:
-                base_log_file = os.path.join(self.manager.config_base, self.manager.options.logfile)
+            # Taken before reading, so that nothing written in the meantime is missed
+            generation = logger.log_generation()
 
             yield '{"stream": ['  # Start of the json stream
 
-            # Read back in the logs until we find enough lines
-            for i in range(0, 9):
-                log_file = ('%s.%s' % (base_log_file, i)).rstrip('.0')  # 1st log file has no number
-
-                if not os.path.isfile(log_file):
-                    break
+            found, stream_from_byte = read_log_lines(base_log_file, lines, log_parser, since, until)
+            for line in found:
+                yield log_parser.json_string(line) + ',\n'
 
-                with open(log_file, 'rb') as fh:
-                    fh.seek(0, 2)  # Seek to bottom of file
-                    end_byte = fh.tell()
-                    if i == 0:
-                        stream_from_byte = end_byte  # Stream from this point later on
-
-                    if len(lines_found) >= lines:
+            # Keep one handle open, and wait for the log handler to tell us about new lines
+            fh = None
+            try:
+                while True:
+                    # If the server is shutting down then end the stream nicely
+                    if cherrypy.engine.state != cherrypy.engine.states.STARTED:
                         break
 
-                    # Read in reverse for efficiency
-                    for line in reverse_readline(fh, start_byte=end_byte):
-                        if len(lines_found) >= lines:
+                    if fh is None:
+                        try:
+                            fh = open(base_log_file, 'rb')
+                            fh.seek(stream_from_byte)
+                        except IOError:
+                            fh = None
+                            if range_ended(until):
+                                break
+                            generation = logger.wait_for_log(generation, timeout=2)
+                            yield '{},\n'
+                            continue
+
+                    line = fh.readline()
+                    if line.endswith(b'\n'):
+                        if until and (line_timestamp(line) or b'') > until:
+                            # Lines are in time order, none of the following ones are in the range either
                             break
-                        if log_parser.matches(line):
-                            lines_found.append(log_parser.json_string(line))
-
-                    for l in reversed(lines_found):
-                        yield l + ',\n'
+                        if line_in_range(line, since, until) and log_parser.matches(line):
+                            yield log_parser.json_string(line) + ',\n'
+                        continue
+                    if line:
+                        # Partial line, wait for the rest of it
+                        fh.seek(-len(line), os.SEEK_CUR)
+                    elif range_ended(until):
+                        # Everything up to the end of the range has been read
+                        break
 
-            # We need to track the inode in case the log file is rotated
-            current_inode = file_inode(base_log_file)
+                    if file_inode(base_log_file) != os.fstat(fh.fileno()).st_ino:
+                        # File rotated. Read new file from beginning
+                        fh.close()
+                        fh = None
+                        stream_from_byte = 0
+                        continue
+
+                    new_generation = logger.wait_for_log(generation, timeout=2)
+                    if new_generation == generation:
+                        # Nothing new, keep the connection alive
+                        yield '{},\n'
+                    generation = new_generation
+            finally:
+                if fh:
+                    fh.close()
 
-            while True:
-                # If the server is shutting down then end the stream nicely
-                if cherrypy.engine.state != cherrypy.engine.states.STARTED:
-                    break
+            yield '{}]}'  # End of stream
 
-                new_inode = file_inode(base_log_file)
-                if current_inode != new_inode:
-                    # File updated/rotated. Read from beginning
-                    stream_from_byte = 0
-                    current_inode = new_inode
+        return Response(follow(args['lines'], args['search']), mimetype='text/event-stream')
 
-                try:
-                    with open(base_log_file, 'rb') as fh:
-                        fh.seek(stream_from_byte)
-                        line = fh.readline()
-                        stream_from_byte = fh.tell()
-                except IOError:
-                    yield '{}'
 
-                # If a valid line is found and does not pass the filter then set it to none
-                line = log_parser.json_string(line) if log_parser.matches(line) else '{}'
+log_records_parser = api.parser()
+log_records_parser.add_argument('lines', type=int, required=False, default=200, help='Maximum number of records')
+log_records_parser.add_argument('task', type=str, required=False, help='Only records from this task')
+log_records_parser.add_argument('task_id', type=str, required=False, help='Only records from this task execution')
+log_records_parser.add_argument('level', type=str, required=False, help='Minimum log level, eg. verbose or debug')
+log_records_parser.add_argument('follow', type=inputs.boolean, required=False, default=False,
+                                help='Keep streaming new records as they are logged')
 
-                if line == '{}':
-                    # If no match then delay to prevent many read hits on the file
-                    sleep(2)
 
-                yield line + ',\n'
+@server_api.route('/log/records/')
+class ServerLogRecordsAPI(APIResource):
 
-            yield '{}]}'  # End of stream
-
-        return Response(follow(args['lines'], args['search']), mimetype='text/event-stream')
+    @api.doc(parser=log_records_parser)
+    @api.response(200, description='Recent log records, streamed as line delimited JSON when following')
+    def get(self, session=None):
+        """ Recent log records from memory """
+        args = log_records_parser.parse_args()
+        level = None
+        if args['level']:
+            level = logging.getLevelName(args['level'].upper())
+            if not isinstance(level, int):
+                raise ApiError('Unknown log level `%s`' % args['level'])
+        query = dict(task=args['task'], task_id=args['task_id'], level=level)
+        records = logger.record_buffer.query(limit=args['lines'], **query)
+
+        if not args['follow']:
+            return {'records': records}
+
+        def follow(records):
+            yield '{"stream": ['
+            last_id = records[-1]['id'] if records else logger.record_buffer.last_id
+            for record in records:
+                yield json.dumps(record) + ',\n'
+            while cherrypy.engine.state == cherrypy.engine.states.STARTED:
+                current_id = logger.record_buffer.wait(last_id, timeout=2)
+                if current_id == last_id:
+                    # Nothing new, keep the connection alive
+                    yield '{},\n'
+                    continue
+                new_records = logger.record_buffer.query(after=last_id, **query)
+                last_id = max([current_id] + [record['id'] for record in new_records[-1:]])
+                for record in new_records:
+                    yield json.dumps(record) + ',\n'
+            yield '{}]}'
+
+        return Response(follow(records), mimetype='text/event-stream')
 
 
 class LogParser:
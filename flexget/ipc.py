@@ -1,5 +1,6 @@
 from __future__ import absolute_import, division, unicode_literals
 
+import json
 import logging
 import random
 import string
@@ -8,7 +9,7 @@ import threading
 import rpyc
 from rpyc.utils.server import ThreadedServer
 
-from flexget.logger import console, capture_output
+from flexget.logger import console, capture_output, record_buffer
 from flexget.options import get_parser, ParserError
 
 log = logging.getLogger('ipc')
@@ -80,6 +81,20 @@ class DaemonService(rpyc.Service):
         else:
             self.manager.handle_cli(options)
 
+    def exposed_log_records(self, task=None, task_id=None, level=None, after=None, limit=None, timeout=None):
+        """
+        Recent log records from memory, see `LogRecordBuffer.query`. To stream new records, poll with `after` set to
+        the id of the last received record, and `timeout` to wait up to that many seconds for a new record.
+
+        :return: JSON encoded list of record dicts
+        """
+        query = dict(task=task, task_id=task_id, level=level, after=after, limit=limit)
+        records = record_buffer.query(**query)
+        if not records and after is not None and timeout:
+            record_buffer.wait(after, timeout)
+            records = record_buffer.query(**query)
+        return json.dumps(records)
+
     def client_console(self, text):
         self._conn.root.console(text)
 
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, unicode_literals, print_function
 import collections
 import contextlib
+import datetime
 import logging
 import logging.handlers
 import sys
@@ -34,14 +35,17 @@ def get_level_no(level):
 
 
 @contextlib.contextmanager
-def task_logging(task):
+def task_logging(task, task_id=''):
     """Context manager which adds task information to log messages."""
     old_task = getattr(local_context, 'task', '')
+    old_task_id = getattr(local_context, 'task_id', '')
     local_context.task = task
+    local_context.task_id = task_id
     try:
         yield
     finally:
         local_context.task = old_task
+        local_context.task_id = old_task_id
 
 
 class SessionFilter(logging.Filter):
@@ -117,6 +121,149 @@ class RollingBuffer(collections.deque):
         self.append(line)
 
 
+class LogRecordBuffer(object):
+    """
+    Keeps the most recent log records in memory as dicts of their fields, bounded by their total size.
+
+    Records can be looked up by task name or task execution id, so recent logs can be served without reading and
+    parsing the log file.
+    """
+    # Rough per record overhead, in addition to the size of its text fields
+    record_overhead = 100
+
+    def __init__(self, max_bytes=1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.records = collections.deque()
+        self.by_task = collections.defaultdict(collections.deque)
+        self.by_task_id = collections.defaultdict(collections.deque)
+        self.last_id = 0
+        self.lock = threading.Condition()
+
+    def _record_size(self, record):
+        return self.record_overhead + len(record['message']) + len(record['task']) + len(record['plugin'])
+
+    def add(self, record):
+        """Add a record dict, see `LogRecordBufferHandler` for the fields."""
+        with self.lock:
+            self.last_id += 1
+            record['id'] = self.last_id
+            self.records.append(record)
+            if record['task']:
+                self.by_task[record['task']].append(record)
+            if record['task_id']:
+                self.by_task_id[record['task_id']].append(record)
+            self.size += self._record_size(record)
+            while self.size > self.max_bytes and len(self.records) > 1:
+                self._evict()
+            self.lock.notify_all()
+
+    def _evict(self):
+        # The oldest record is also the oldest in its task indexes
+        record = self.records.popleft()
+        self.size -= self._record_size(record)
+        for index, key in ((self.by_task, record['task']), (self.by_task_id, record['task_id'])):
+            if key:
+                index[key].popleft()
+                if not index[key]:
+                    del index[key]
+
+    def query(self, task=None, task_id=None, level=None, after=None, limit=None):
+        """
+        :param task: Only records logged while running task with this name
+        :param task_id: Only records logged while running task execution with this id
+        :param level: Minimum log level number
+        :param after: Only records with higher id than this
+        :param limit: Return at most this many of the newest matching records
+        :return: List of matching record dicts, oldest first
+        """
+        with self.lock:
+            if task_id:
+                records = self.by_task_id.get(task_id, ())
+            elif task:
+                records = self.by_task.get(task, ())
+            else:
+                records = self.records
+            result = []
+            # Walk from the newest record, so we can stop as soon as we have enough
+            for record in reversed(records):
+                if after is not None and record['id'] <= after:
+                    break
+                if task and record['task'] != task:
+                    continue
+                if level is not None and record['levelno'] < level:
+                    continue
+                result.append(record)
+                if limit is not None and len(result) >= limit:
+                    break
+        result.reverse()
+        return result
+
+    def wait(self, after, timeout=None):
+        """Blocks until a record with higher id than `after` is added, or `timeout` seconds have passed."""
+        with self.lock:
+            if self.last_id <= after:
+                self.lock.wait(timeout)
+            return self.last_id
+
+
+class LogRecordBufferHandler(logging.Handler):
+    """Handler which adds the fields of log records to a `LogRecordBuffer`."""
+
+    def __init__(self, buffer):
+        logging.Handler.__init__(self)
+        self.buffer = buffer
+
+    def emit(self, record):
+        try:
+            self.buffer.add({
+                'timestamp': datetime.datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S'),
+                'levelno': record.levelno,
+                'level': record.levelname,
+                'plugin': record.name,
+                'task': getattr(record, 'task', '') or '',
+                'task_id': getattr(record, 'task_id', '') or '',
+                'message': record.getMessage()
+            })
+        except Exception:
+            self.handleError(record)
+
+
+# Incremented each time a line is written to the log file, waiters on `_log_written` are woken up at the same time
+_log_generation = 0
+_log_written = threading.Condition()
+
+
+def log_generation():
+    """Returns a counter which is incremented every time something is written to the log file."""
+    return _log_generation
+
+
+def wait_for_log(generation, timeout=None):
+    """
+    Blocks until something new is written to the log file, or `timeout` seconds have passed.
+
+    :param generation: Value of `log_generation` when the caller last looked at the log file. Returns immediately if
+      the log file has been written to since then.
+    :return: The current log generation.
+    """
+    with _log_written:
+        if _log_generation == generation:
+            _log_written.wait(timeout)
+        return _log_generation
+
+
+class FlexGetRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler which wakes up any threads waiting in `wait_for_log` after each write."""
+
+    def emit(self, record):
+        global _log_generation
+        logging.handlers.RotatingFileHandler.emit(self, record)
+        with _log_written:
+            _log_generation += 1
+            _log_written.notify_all()
+
+
 class FlexGetLogger(logging.Logger):
     """Custom logger that adds trace and verbose logging methods, and contextual information to log records."""
 
@@ -124,6 +271,7 @@ class FlexGetLogger(logging.Logger):
         extra = extra or {}
         extra.update(
             task=getattr(local_context, 'task', ''),
+            task_id=getattr(local_context, 'task_id', ''),
             session_id=getattr(local_context, 'session_id', ''))
         # Replace newlines in log messages with \n
         if isinstance(msg, basestring):
@@ -157,6 +305,8 @@ _buff_handler = None
 _logging_started = False
 # Stores the last 50 debug messages
 debug_buffer = RollingBuffer(maxlen=50)
+# Stores recent log records for querying from the api and ipc clients
+record_buffer = LogRecordBuffer()
 
 
 def initialize(unit_test=False):
@@ -208,7 +358,7 @@ def start(filename=None, level=logging.INFO, to_console=True, to_file=True):
 
     formatter = FlexGetFormatter()
     if to_file:
-        file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=1000 * 1024, backupCount=9)
+        file_handler = FlexGetRotatingFileHandler(filename, maxBytes=1000 * 1024, backupCount=9)
         file_handler.setFormatter(formatter)
         file_handler.setLevel(level)
         logger.addHandler(file_handler)
@@ -220,6 +370,9 @@ def start(filename=None, level=logging.INFO, to_console=True, to_file=True):
         console_handler.setLevel(level)
         logger.addHandler(console_handler)
 
+    # Added here rather than in `initialize`, so the records stored until now only reach it once, when flushed below
+    logger.addHandler(LogRecordBufferHandler(record_buffer))
+
     # flush what we have stored from the plugin initialization
     logger.removeHandler(_buff_handler)
     if _buff_handler:
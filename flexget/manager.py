@@ -19,12 +19,16 @@ import yaml
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 # These need to be declared before we start importing from other flexget modules, since they might import them
 from flexget.utils.sqlalchemy_utils import ContextSession
 
 Base = declarative_base()
 Session = sessionmaker(class_=ContextSession)
+# Sessions for readers which never write (eg. api and cli queries). With a sqlite database file these use their own pool
+# of read only connections, see `Manager.init_sqlalchemy`.
+ReadSession = sessionmaker(class_=ContextSession)
 
 from flexget import config_schema, db_schema, logger, plugin  # noqa
 from flexget.event import fire_event  # noqa
@@ -40,6 +44,11 @@ manager = None
 DB_CLEANUP_INTERVAL = timedelta(days=7)
 
 
+def _set_query_only(dbapi_connection, connection_record):
+    """Makes connections of the read only pool refuse to write."""
+    dbapi_connection.execute('PRAGMA query_only = ON')
+
+
 class Manager(object):
     """Manager class for FlexGet
 
@@ -115,6 +124,7 @@ class Manager(object):
         self.config_path = None
         self.db_filename = None
         self.engine = None
+        self.read_engine = None
         self.lockfile = None
         self.database_uri = None
         self.db_upgraded = False
@@ -654,10 +664,19 @@ class Manager(object):
 
         # fire up the engine
         log.debug('Connecting to: %s' % self.database_uri)
+        engine_args = dict(echo=self.options.debug_sql, connect_args={'check_same_thread': False, 'timeout': 10})
+        sqlite_file = self.database_uri.startswith('sqlite:///') and ':memory:' not in self.database_uri
+        if sqlite_file:
+            # Keep connections (and their page cache and pragmas) around, instead of connecting for every session
+            engine_args.update(poolclass=QueuePool, pool_size=5, max_overflow=-1)
         try:
-            self.engine = sqlalchemy.create_engine(self.database_uri,
-                                                   echo=self.options.debug_sql,
-                                                   connect_args={'check_same_thread': False, 'timeout': 10})
+            self.engine = sqlalchemy.create_engine(self.database_uri, **engine_args)
+            if sqlite_file:
+                self.read_engine = sqlalchemy.create_engine(self.database_uri, **engine_args)
+                sqlalchemy.event.listen(self.read_engine, 'connect', _set_query_only)
+            else:
+                # A separate in-memory database would be a different database
+                self.read_engine = self.engine
         except ImportError:
             print('FATAL: Unable to use SQLite. Are you running Python 2.5 - 2.7 ?\n'
                   'Python should normally have SQLite support built in.\n'
@@ -666,6 +685,7 @@ class Manager(object):
                   'recompile it with SQLite support.', file=sys.stderr)
             sys.exit(1)
         Session.configure(bind=self.engine)
+        ReadSession.configure(bind=self.read_engine)
         # create all tables, doesn't do anything to existing tables
         try:
             Base.metadata.create_all(bind=self.engine)
@@ -864,6 +884,7 @@ class Manager(object):
         if not self.unit_test:  # don't scroll "nosetests" summary results when logging is enabled
             log.debug('Shutting down')
         self.engine.dispose()
+        self.read_engine.dispose()
         # remove temporary database used in test mode
         if self.options.test:
             if 'test' not in self.db_filename:
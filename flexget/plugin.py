@@ -175,6 +175,10 @@ plugins = {}
 # Loading done?
 plugins_loaded = False
 
+# Names of the plugins which are currently builtin. Replaced (not modified) whenever a plugin's builtin flag changes,
+# so it can be used as a cheap cache key.
+builtin_plugins = frozenset()
+
 _loaded_plugins = {}
 _plugin_options = []
 _new_phase_queue = {}
@@ -331,6 +335,13 @@ class PluginInfo(dict):
         return dict.__getattribute__(self, attr)
 
     def __setattr__(self, attr, value):
+        # Ignore duplicate registrations of an already existing plugin
+        if attr == 'builtin' and plugins.get(self.name, self) is self:
+            global builtin_plugins
+            if value:
+                builtin_plugins = builtin_plugins | frozenset([self.name])
+            else:
+                builtin_plugins = builtin_plugins - frozenset([self.name])
         self[attr] = value
 
     def __str__(self):
@@ -7,7 +7,8 @@ from flask import jsonify
 from sqlalchemy import desc
 
 from flexget.api import api, APIResource
-from flexget.plugins.output.history import History
+from flexget.plugins.output.history import History, get_history
+from flexget.utils.database import with_session
 
 log = logging.getLogger('history')
 
@@ -31,7 +32,8 @@ history_api_schema = {
                 }
             }
         },
-        'pages': {'type': 'integer'}
+        'pages': {'type': 'integer'},
+        'next': {'type': ['integer', 'null']}
     }
 }
 
@@ -51,11 +53,16 @@ history_parser = api.parser()
 history_parser.add_argument('page', type=int, required=False, default=1, help='Page number')
 history_parser.add_argument('max', type=int, required=False, default=50, help='Results per page')
 history_parser.add_argument('task', type=str, required=False, default=None, help='Filter by task name')
+history_parser.add_argument('before', type=int, required=False, default=None,
+                            help='Continue after this entry id, the `next` value of the previous page. Much faster '
+                                 'than page numbers on large histories.')
 
 
 @history_api.route('/')
 @api.doc(parser=history_parser)
 class HistoryAPI(APIResource):
+    method_decorators = [with_session(read_only=True, expire_on_commit=False)]
+
     @api.response(404, description='Page does not exist', model=default_error_schema)
     @api.response(200, model=history_api_schema)
     def get(self, session=None):
@@ -65,13 +72,22 @@ class HistoryAPI(APIResource):
         max_results = args['max']
         task = args['task']
 
+        tasks = [task] if task else None
+
+        if args['before'] is not None:
+            items = get_history(session, tasks=tasks, before=args['before'], limit=max_results)
+            return jsonify({
+                'entries': [item.to_dict() for item in items],
+                'next': items[-1].id if len(items) == max_results else None
+            })
+
         if task:
             count = session.query(History).filter(History.task == task).count()
         else:
             count = session.query(History).count()
 
         if not count:
-            return {'entries': [], 'pages': 0}
+            return {'entries': [], 'pages': 0, 'next': None}
 
         pages = int(ceil(count / float(max_results)))
 
@@ -81,13 +97,13 @@ class HistoryAPI(APIResource):
         start = (page - 1) * max_results
         finish = start + max_results
 
+        query = session.query(History)
         if task:
-            items = session.query(History).filter(History.task == task).order_by(desc(History.time)).slice(start,
-                                                                                                           finish)
-        else:
-            items = session.query(History).order_by(desc(History.time)).slice(start, finish)
+            query = query.filter(History.task == task)
+        items = query.order_by(desc(History.time), desc(History.id)).slice(start, finish).all()
 
         return jsonify({
             'entries': [item.to_dict() for item in items],
-            'pages': pages
+            'pages': pages,
+            'next': items[-1].id if page < pages else None
         })
@@ -1,10 +1,12 @@
 from __future__ import unicode_literals, division, absolute_import
+import os
 
 from flexget import options
 from flexget.db_schema import reset_schema, plugin_schemas
 from flexget.event import event
 from flexget.logger import console
-from flexget.manager import Base, Session
+from flexget.manager import Base, Session, ReadSession
+from flexget.utils.simple_persistence import SimplePersistence
 
 
 def do_cli(manager, options):
@@ -17,6 +19,8 @@ def do_cli(manager, options):
             reset(manager)
         elif options.db_action == 'reset-plugin':
             reset_plugin(options)
+        elif options.db_action == 'stats':
+            stats(manager, options)
 
 
 def cleanup(manager):
@@ -35,6 +39,59 @@ def vacuum():
     console('VACUUM complete.')
 
 
+def format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else 'never'
+
+
+def stats(manager, options):
+    with ReadSession() as session:
+        pragmas = dict((name, session.execute('PRAGMA %s' % name).scalar()) for name in (
+            'journal_mode', 'synchronous', 'auto_vacuum', 'page_size', 'page_count', 'freelist_count', 'cache_size',
+            'mmap_size', 'busy_timeout'))
+        tables = [(table.name, session.execute('SELECT COUNT(*) FROM "%s"' % table.name).scalar())
+                  for table in Base.metadata.sorted_tables]
+
+    # Negative cache size is in KiB rather than pages
+    if pragmas['cache_size'] < 0:
+        cache_size = -pragmas['cache_size'] * 1024
+    else:
+        cache_size = pragmas['cache_size'] * pragmas['page_size']
+    values = [
+        ('Journal mode', pragmas['journal_mode']),
+        ('Synchronous', ['off', 'normal', 'full', 'extra'][pragmas['synchronous']]),
+        ('Auto vacuum', ['none', 'full', 'incremental'][pragmas['auto_vacuum']]),
+        ('Page size', pragmas['page_size']),
+        ('Pages', pragmas['page_count']),
+        ('Free pages', pragmas['freelist_count']),
+        ('Cache size', '%s KiB' % (cache_size // 1024)),
+        ('Mmap size', '%s KiB' % ((pragmas['mmap_size'] or 0) // 1024)),
+        ('Busy timeout', '%s ms' % pragmas['busy_timeout'])
+    ]
+    for name, path in (('File size', manager.db_filename), ('WAL size', '%s-wal' % manager.db_filename)):
+        if manager.db_filename and os.path.exists(path):
+            values.append((name, '%s KiB' % (os.path.getsize(path) // 1024)))
+    values.extend([
+        ('Last cleanup', format_time(manager.persist.get('last_cleanup'))),
+        ('Last analyze', format_time(SimplePersistence('db_analyze').get('last_analyze'))),
+        ('Last vacuum', format_time(SimplePersistence('db_vacuum').get('last_vacuum')))
+    ])
+
+    if options.porcelain:
+        for name, value in values:
+            console('%s | %s' % (name, value))
+        for name, rows in tables:
+            console('%s | %s' % (name, rows))
+        return
+    console('-' * 79)
+    for name, value in values:
+        console('%-20s %s' % (name, value))
+    console('-' * 79)
+    console('%-40s %s' % ('Table', 'Rows'))
+    console('-' * 79)
+    for name, rows in sorted(tables, key=lambda t: t[1], reverse=True):
+        console('%-40s %s' % (name, rows))
+
+
 def reset(manager):
     Base.metadata.drop_all(bind=manager.engine)
     Base.metadata.create_all(bind=manager.engine)
@@ -90,3 +147,5 @@ def register_parser_arguments():
     reset_plugin_parser.add_argument('reset_plugin', metavar='<plugin>', nargs='?',
                                  help='name of plugin to reset (if omitted, known plugins will be listed)')
     reset_plugin_parser.add_argument('--porcelain', action='store_true', help='make the output parseable')
+    stats_parser = subparsers.add_parser('stats', help='show database settings, size and row counts of the tables')
+    stats_parser.add_argument('--porcelain', action='store_true', help='make the output parseable')
@@ -6,6 +6,7 @@ from argparse import SUPPRESS
 
 from flexget import options
 from flexget.event import event, add_event_handler, remove_event_handler
+from flexget.utils import requests
 
 from sqlalchemy.engine import Connection
 
@@ -80,6 +81,15 @@ def cleanup(manager, options):
             if took > 0.1 or queries > 10:
                 log.info('%-15s took %0.2f sec (%s queries)' % (keyword, took, queries))
 
+    stats = requests.connection_pools.stats()
+    log.info('HTTP connections: %(requests)s requests, %(hits)s on kept alive connections, %(misses)s new connections, '
+             '%(hosts)s hosts and %(idle_connections)s idle connections pooled' % stats)
+    if requests.response_cache:
+        stats = requests.response_cache.stats()
+        stats['size'] = stats['size'] / 1024 / 1024
+        log.info('HTTP cache: %(hits)s hits, %(revalidated)s revalidated, %(misses)s misses, %(stored)s stored, '
+                 '%(evicted)s evicted, %(entries)s entries using %(size).1f MiB' % stats)
+
     # Deregister our hooks
     if hasattr(Connection, 'execute') and orig_execute:
         Connection.execute = orig_execute
@@ -3,6 +3,7 @@ import logging
 
 from flexget import plugin
 from flexget.event import event
+from flexget.utils.inputs import run_inputs
 
 log = logging.getLogger('crossmatch')
 
@@ -37,28 +38,11 @@ class CrossMatch(object):
         fields = config['fields']
         action = config['action']
 
+        inputs = [(input_name, input_config) for item in config['from']
+                  for input_name, input_config in item.iteritems()]
         match_entries = []
-
-        # TODO: xxx
-        # we probably want to have common "run and combine inputs" function sometime soon .. this code is in
-        # few places already (discover, inputs, ...)
-        # code written so that this can be done easily ...
-        for item in config['from']:
-            for input_name, input_config in item.iteritems():
-                input = plugin.get_plugin_by_name(input_name)
-                if input.api_ver == 1:
-                    raise plugin.PluginError('Plugin %s does not support API v2' % input_name)
-                method = input.phase_handlers['input']
-                try:
-                    result = method(task, input_config)
-                except plugin.PluginError as e:
-                    log.warning('Error during input plugin %s: %s' % (input_name, e))
-                    continue
-                if result:
-                    match_entries.extend(result)
-                else:
-                    log.warning('Input %s did not return anything' % input_name)
-                    continue
+        for input_name, result in run_inputs(task, inputs):
+            match_entries.extend(result)
 
         # perform action on intersecting entries
         for entry in task.entries:
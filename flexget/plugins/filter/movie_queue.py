@@ -1,6 +1,7 @@
 from __future__ import unicode_literals, division, absolute_import
 
 import logging
+from difflib import SequenceMatcher
 
 from sqlalchemy import Column, Integer, String, ForeignKey, or_, and_, select, update, func, Unicode
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
@@ -13,6 +14,7 @@ from flexget.utils import qualities
 from flexget.utils.database import quality_requirement_property, with_session
 from flexget.utils.imdb import extract_id
 from flexget.utils.log import log_once
+from flexget.utils.search import clean_symbols
 from flexget.utils.sqlalchemy_utils import table_exists, table_schema, table_add_column
 
 try:
@@ -116,6 +118,91 @@ class QueuedMovie(queue_base.QueuedItem, Base):
         }
 
 
+#: How alike names spelled differently have to be for :func:`names_alike`, as :meth:`difflib.SequenceMatcher.ratio`
+NAME_SIMILARITY = 0.75
+
+
+def movie_key(title):
+    """
+    Normalized (name, year) of a movie title or release name. Names are lowercase, without punctuation or leading
+    'the', so slightly different spellings of the same movie get the same name.
+    """
+    parsed = plugin.get_plugin_by_name('parsing').instance.parse_movie(title)
+    name = clean_symbols((parsed.name or '').replace('&', ' and '))
+    name = ' '.join(name.split())
+    if name.startswith('the '):
+        name = name[4:]
+    return name, parsed.year
+
+
+def names_alike(name, other):
+    """
+    Whether two normalized movie names may be the same movie. Errs on the side of yes: names match when one is a part
+    of the other (Star Wars, Star Wars Episode IV A New Hope), when they only differ in spaces (Spiderman, Spider Man)
+    or when they are spelled almost the same (Seven, Se7en).
+    """
+    squashed, other_squashed = name.replace(' ', ''), other.replace(' ', '')
+    if squashed.startswith(other_squashed) or other_squashed.startswith(squashed):
+        return True
+    words, other_words = set(name.split()), set(other.split())
+    if words <= other_words or other_words <= words:
+        return True
+    matcher = SequenceMatcher(None, squashed, other_squashed)
+    return matcher.real_quick_ratio() >= NAME_SIMILARITY and matcher.ratio() >= NAME_SIMILARITY
+
+
+class MovieQueueIndex(object):
+    """
+    Movies in a queue which are not downloaded yet, by imdb and tmdb id, and by the name and year of their title.
+
+    :param movies: List of :class:`QueuedMovie`
+    """
+
+    def __init__(self, movies):
+        self.by_imdb_id = {}
+        self.by_tmdb_id = {}
+        # Name -> set of years, None when the title has no year
+        self.years = {}
+        # Queued movies with titles which can't be normalized could match any entry
+        self.match_all = False
+        for movie in movies:
+            if movie.imdb_id:
+                self.by_imdb_id.setdefault(movie.imdb_id, movie)
+            if movie.tmdb_id:
+                self.by_tmdb_id.setdefault(movie.tmdb_id, movie)
+            name, year = movie_key(movie.title or '')
+            if name:
+                self.years.setdefault(name, set()).add(year)
+            else:
+                self.match_all = True
+        self.size = len(movies)
+
+    def __len__(self):
+        return self.size
+
+    def get(self, imdb_id=None, tmdb_id=None):
+        """Returns the queued movie with one of the ids, or None."""
+        return self.by_imdb_id.get(imdb_id) or self.by_tmdb_id.get(tmdb_id)
+
+    def might_contain(self, title):
+        """
+        Whether the movie of `title` may be in the queue, going by its name and year. Only titles which can't be any of
+        the queued movies are ruled out, the ids decide what matches.
+        """
+        if self.match_all:
+            return True
+        name, year = movie_key(title)
+        if not name:
+            return True
+        for queued_name, years in self.years.iteritems():
+            # Release years sometimes differ by one from the year on imdb
+            if year is not None and None not in years and all(abs(year - queued) > 1 for queued in years):
+                continue
+            if queued_name == name or names_alike(name, queued_name):
+                return True
+        return False
+
+
 class MovieQueue(queue_base.FilterQueueBase):
     schema = {
         'oneOf': [
@@ -133,6 +220,18 @@ class MovieQueue(queue_base.FilterQueueBase):
         ]
     }
 
+    def on_task_start(self, task, config):
+        super(MovieQueue, self).on_task_start(task, config)
+        # Queue name -> MovieQueueIndex, loaded when first needed
+        self.indexes = {}
+
+    def get_index(self, task, queue_name):
+        if queue_name not in self.indexes:
+            movies = task.session.query(QueuedMovie).filter(QueuedMovie.downloaded == None).filter(
+                QueuedMovie.queue_name == queue_name).all()
+            self.indexes[queue_name] = MovieQueueIndex(movies)
+        return self.indexes[queue_name]
+
     def matches(self, task, config, entry):
         if not config:
             return
@@ -143,34 +242,38 @@ class MovieQueue(queue_base.FilterQueueBase):
             return
 
         queue_name = config.get('queue_name', 'default')
-
-        # Tell tmdb_lookup to add lazy lookup fields if not already present
-        try:
-            plugin.get_plugin_by_name('imdb_lookup').instance.register_lazy_fields(entry)
-        except plugin.DependencyError:
-            log.debug('imdb_lookup is not available, queue will not work if movie ids are not populated')
-        try:
-            plugin.get_plugin_by_name('tmdb_lookup').instance.lookup(entry)
-        except plugin.DependencyError:
-            log.debug('tmdb_lookup is not available, queue will not work if movie ids are not populated')
-
-        conditions = []
-        # Check if a movie id is already populated before incurring a lazy lookup
-        for lazy in [False, True]:
-            if entry.get('imdb_id', eval_lazy=lazy):
-                conditions.append(QueuedMovie.imdb_id == entry['imdb_id'])
-            if entry.get('tmdb_id', eval_lazy=lazy and not conditions):
-                conditions.append(QueuedMovie.tmdb_id == entry['tmdb_id'])
-            if conditions:
-                break
-        if not conditions:
-            log_once('IMDB and TMDB lookups failed for %s.' % entry['title'], log, logging.WARN)
+        index = self.get_index(task, queue_name)
+        if not index:
             return
 
+        imdb_id = entry.get('imdb_id', eval_lazy=False)
+        tmdb_id = entry.get('tmdb_id', eval_lazy=False)
+        if not (imdb_id or tmdb_id):
+            # Movie ids need remote lookups, only do them for entries which could be one of the queued movies
+            if not index.might_contain(entry['title']):
+                log.trace('%s is not like any title in the queue' % entry['title'])
+                return
+
+            # Tell tmdb_lookup to add lazy lookup fields if not already present
+            try:
+                plugin.get_plugin_by_name('imdb_lookup').instance.register_lazy_fields(entry)
+            except plugin.DependencyError:
+                log.debug('imdb_lookup is not available, queue will not work if movie ids are not populated')
+            try:
+                plugin.get_plugin_by_name('tmdb_lookup').instance.lookup(entry)
+            except plugin.DependencyError:
+                log.debug('tmdb_lookup is not available, queue will not work if movie ids are not populated')
+
+            imdb_id = entry.get('imdb_id')
+            if not imdb_id:
+                tmdb_id = entry.get('tmdb_id')
+            if not (imdb_id or tmdb_id):
+                log_once('IMDB and TMDB lookups failed for %s.' % entry['title'], log, logging.WARN)
+                return
+
         quality = entry.get('quality', qualities.Quality())
 
-        movie = task.session.query(QueuedMovie).filter(QueuedMovie.downloaded == None).filter(
-            QueuedMovie.queue_name == queue_name).filter(or_(*conditions)).first()
+        movie = index.get(imdb_id=imdb_id, tmdb_id=tmdb_id)
         if movie and movie.quality_req.allows(quality):
             return movie
 
@@ -1,8 +1,9 @@
 from __future__ import unicode_literals, division, absolute_import
-import itertools
 import logging
-import threading
 import socket
+from collections import defaultdict
+from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
 from urlparse import urlparse, SplitResult, urlsplit, urlunsplit
 import struct
 from random import randrange
@@ -12,43 +13,36 @@ from urllib2 import URLError
 
 from flexget import plugin
 from flexget.event import event
-from flexget.utils.tools import urlopener
+from flexget.utils.tools import urlopener, TimedDict
 from flexget.utils.bittorrent import bdecode
 
 log = logging.getLogger('torrent_alive')
 
+# Maximum number of scrape requests running at the same time
+MAX_WORKERS = 10
+# Maximum amount of info hashes sent to a tracker in one scrape request. UDP trackers can only fit ~74 hashes into
+# a single packet, most http trackers limit the query length as well.
+BATCH_SIZE = {'udp': 70, 'http': 40}
+# Failing trackers are skipped for an exponentially growing time, up to this limit
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=1)
 
-class TorrentAliveThread(threading.Thread):
-    _counter = itertools.count().next
+# (tracker, info_hash) -> seeds
+scrape_cache = TimedDict(cache_time='10 minutes')
+# tracker -> (failure count, do not scrape before)
+tracker_backoff = {}
 
-    def __init__(self, tracker, info_hash):
-        threading.Thread.__init__(self, name='torrent_alive-%d' % self._counter())
-        self.tracker = tracker
-        self.info_hash = info_hash
-        self.tracker_seeds = 0
 
-    def run(self):
-        self.tracker_seeds = get_tracker_seeds(self.tracker, self.info_hash)
-        log.debug('%s seeds found from %s' % (self.tracker_seeds, get_scrape_url(self.tracker, self.info_hash)))
+class ScrapeError(Exception):
+    """Raised when a tracker could not be scraped."""
 
 
-def max_seeds_from_threads(threads):
+def get_scrape_url(tracker_url, info_hash):
     """
-    Joins the threads and returns the maximum seeds found from any of them.
-
-    :param threads: A list of started `TorrentAliveThread`
-    :return: Maximum seeds found from any of the threads
+    :param tracker_url: Announce url of the tracker
+    :param info_hash: Hex info hash, or a list of them to scrape multiple torrents with one request
+    :return: Scrape url for the given info hash(es)
     """
-    seeds = 0
-    for background in threads:
-        log.debug('Coming up next: %s' % background.tracker)
-        background.join()
-        seeds = max(seeds, background.tracker_seeds)
-        log.debug('Current hightest number of seeds found: %s' % seeds)
-    return seeds
-
-
-def get_scrape_url(tracker_url, info_hash):
     if 'announce' in tracker_url:
         v = urlsplit(tracker_url)
         sr = SplitResult(v.scheme, v.netloc, v.path.replace('announce', 'scrape'),
@@ -58,33 +52,37 @@ def get_scrape_url(tracker_url, info_hash):
         log.debug('`announce` not contained in tracker url, guessing scrape address.')
         result = tracker_url + '/scrape'
 
+    info_hashes = [info_hash] if isinstance(info_hash, basestring) else info_hash
     result += '&' if '?' in result else '?'
-    result += 'info_hash=%s' % quote(info_hash.decode('hex'))
+    result += '&'.join('info_hash=%s' % quote(h.decode('hex')) for h in info_hashes)
     return result
 
 
-def get_udp_seeds(url, info_hash):
+def scrape_udp(url, info_hashes):
+    """
+    Scrapes multiple torrents from an udp tracker with a single request.
+
+    :return: Dict of info_hash -> seeds
+    :raises ScrapeError: If the tracker could not be scraped
+    """
     parsed_url = urlparse(url)
     try:
         port = parsed_url.port
     except ValueError as ve:
-        log.error('UDP Port Error, url was %s' % url)
-        return 0
-
-    log.debug('Checking for seeds from %s' % url)
-
-    connection_id = 0x41727101980  # connection id is always this
-    transaction_id = randrange(1, 65535)  # Random Transaction ID creation
+        raise ScrapeError('UDP Port Error, url was %s' % url)
 
     if port is None:
-        log.error('UDP Port Error, port was None')
-        return 0
+        raise ScrapeError('UDP Port Error, port was None')
 
     if port < 0 or port > 65535:
-        log.error('UDP Port Error, port was %s' % port)
-        return 0
+        raise ScrapeError('UDP Port Error, port was %s' % port)
 
-    # Create the socket
+    log.debug('Checking for seeds of %s torrents from %s' % (len(info_hashes), url))
+
+    connection_id = 0x41727101980  # connection id is always this
+    transaction_id = randrange(1, 65535)  # Random Transaction ID creation
+
+    clisocket = None
     try:
         clisocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         clisocket.settimeout(5.0)
@@ -99,70 +97,187 @@ def get_udp_seeds(url, info_hash):
         # check recieved packet for response
         action, transaction_id, connection_id = struct.unpack(b">LLQ", res)
 
-        # build packet hash out of decoded info_hash
-        packet_hash = info_hash.decode('hex')
-
-        # construct packet for scrape with decoded info_hash setting action byte to 2 for scape
-        packet = struct.pack(b">QLL", connection_id, 2, transaction_id) + packet_hash
+        # construct packet for scrape with decoded info_hashes setting action byte to 2 for scape
+        packet = struct.pack(b">QLL", connection_id, 2, transaction_id)
+        packet += b''.join(h.decode('hex') for h in info_hashes)
 
         clisocket.send(packet)
-        # set recieve size of 8 + 12 bytes
-        res = clisocket.recv(20)
+        # 8 byte header, followed by 12 bytes per requested torrent
+        res = clisocket.recv(8 + 12 * len(info_hashes))
+    except (IOError, struct.error) as e:
+        raise ScrapeError('Socket Error: %s' % e)
+    finally:
+        if clisocket:
+            clisocket.close()
 
-    except IOError as e:
-        log.warning('Socket Error: %s', e)
-        return 0
     # Check for UDP error packet
     (action,) = struct.unpack(b">L", res[:4])
     if action == 3:
-        log.error('There was a UDP Packet Error 3')
-        return 0
+        raise ScrapeError('There was a UDP Packet Error 3')
+
+    # first 8 bytes are followed by seeders, completed and leechers for each requested torrent
+    result = {}
+    for i, info_hash in enumerate(info_hashes):
+        chunk = res[8 + 12 * i:20 + 12 * i]
+        if len(chunk) < 12:
+            break
+        seeders, completed, leechers = struct.unpack(b">LLL", chunk)
+        result[info_hash] = seeders
+    log.debug('scrape_udp is returning: %s', result)
+    return result
 
-    # first 8 bytes are followed by seeders, completed and leechers for requested torrent
-    seeders, completed, leechers = struct.unpack(b">LLL", res[8:20])
-    log.debug('get_udp_seeds is returning: %s', seeders)
-    clisocket.close()
-    return seeders
 
+def scrape_http(url, info_hashes):
+    """
+    Scrapes multiple torrents from a http tracker with a single request.
 
-def get_http_seeds(url, info_hash):
-    url = get_scrape_url(url, info_hash)
-    if not url:
-        log.debug('if not url is true returning 0')
-        return 0
+    :return: Dict of info_hash -> seeds
+    :raises ScrapeError: If the tracker could not be scraped
+    """
+    url = get_scrape_url(url, info_hashes)
     log.debug('Checking for seeds from %s' % url)
-    data = None
     try:
         data = bdecode(urlopener(url, log, retries=1, timeout=10).read()).get('files')
     except URLError as e:
-        log.debug('Error scraping: %s' % e)
-        return 0
+        raise ScrapeError('Error scraping: %s' % e)
     except SyntaxError as e:
-        log.warning('Error decoding tracker response: %s' % e)
-        return 0
+        raise ScrapeError('Error decoding tracker response: %s' % e)
     except BadStatusLine as e:
-        log.warning('Error BadStatusLine: %s' % e)
-        return 0
+        raise ScrapeError('Error BadStatusLine: %s' % e)
     except IOError as e:
-        log.warning('Server error: %s' % e)
-        return 0
+        raise ScrapeError('Server error: %s' % e)
     if not data:
         log.debug('No data received from tracker scrape.')
-        return 0
-    log.debug('get_http_seeds is returning: %s' % data.values()[0]['complete'])
-    return data.values()[0]['complete']
+        return {}
+    result = {}
+    for raw_hash, stats in data.iteritems():
+        # bdecode turns the binary hash into unicode when it happens to be valid utf-8
+        if isinstance(raw_hash, unicode):
+            raw_hash = raw_hash.encode('utf-8')
+        result[raw_hash.encode('hex').upper()] = stats.get('complete', 0)
+    if len(info_hashes) == 1 and info_hashes[0] not in result and len(result) == 1:
+        # Single torrent was requested, don't be picky about how the tracker keyed the response
+        result = {info_hashes[0]: result.values()[0]}
+    log.debug('scrape_http is returning: %s' % result)
+    return result
 
 
-def get_tracker_seeds(url, info_hash):
+def scrape_tracker(url, info_hashes):
+    """
+    :return: Dict of info_hash -> seeds for all of `info_hashes` that the tracker knows about
+    :raises ScrapeError: If the tracker could not be scraped
+    """
     if url.startswith('udp'):
-        return get_udp_seeds(url, info_hash)
+        return scrape_udp(url, info_hashes)
     elif url.startswith('http'):
-        return get_http_seeds(url, info_hash)
+        result = scrape_http(url, info_hashes)
+        missing = [h for h in info_hashes if h not in result]
+        if len(info_hashes) > 1 and missing and len(result) <= 1:
+            # Some trackers ignore all but one info_hash in the query, fall back to one request per missing torrent
+            log.debug('%s does not seem to support multi scrape, scraping torrents one by one' % url)
+            for info_hash in missing:
+                result.update(scrape_http(url, [info_hash]))
+        return result
     else:
-        log.warning('There has beena problem with the get_tracker_seeds')
+        raise ScrapeError('Unsupported tracker protocol: %s' % url)
+
+
+def get_udp_seeds(url, info_hash):
+    try:
+        return scrape_udp(url, [info_hash]).get(info_hash, 0)
+    except ScrapeError as e:
+        log.warning(e)
+        return 0
+
+
+def get_http_seeds(url, info_hash):
+    try:
+        return scrape_http(url, [info_hash]).get(info_hash, 0)
+    except ScrapeError as e:
+        log.warning(e)
+        return 0
+
+
+def get_tracker_seeds(url, info_hash):
+    try:
+        return scrape_tracker(url, [info_hash]).get(info_hash, 0)
+    except ScrapeError as e:
+        log.warning(e)
         return 0
 
 
+def _scrape_batch(args):
+    """Runs in a worker thread. Returns (tracker, info_hashes, result or None on failure)."""
+    tracker, info_hashes = args
+    try:
+        return tracker, info_hashes, scrape_tracker(tracker, info_hashes)
+    except ScrapeError as e:
+        log.debug('Error scraping %s: %s' % (tracker, e))
+    except Exception as e:
+        log.warning('Unexpected error scraping %s: %s' % (tracker, e))
+    return tracker, info_hashes, None
+
+
+def _in_backoff(tracker):
+    failures = tracker_backoff.get(tracker)
+    return failures is not None and failures[1] > datetime.now()
+
+
+def _record_failure(tracker):
+    count = tracker_backoff.get(tracker, (0, None))[0] + 1
+    delay = min(BACKOFF_BASE * 2 ** (count - 1), BACKOFF_MAX)
+    log.debug('Scraping %s failed %s time(s), not trying again for %s' % (tracker, count, delay))
+    tracker_backoff[tracker] = (count, datetime.now() + delay)
+
+
+def scrape_torrents(torrents):
+    """
+    Scrapes seeds for many torrents at once. Torrents sharing a tracker are scraped with batched requests, and all
+    requests run in a bounded pool of worker threads.
+
+    :param torrents: Dict of info_hash -> list of tracker urls
+    :return: Dict of info_hash -> highest number of seeds reported by any of its trackers
+    """
+    seeds = dict((info_hash, 0) for info_hash in torrents)
+    # tracker -> info hashes which still need to be scraped
+    pending = defaultdict(list)
+    for info_hash, trackers in torrents.iteritems():
+        for tracker in trackers:
+            cached = scrape_cache.get((tracker, info_hash))
+            if cached is not None:
+                log.debug('Using cached seed count %s for %s from %s' % (cached, info_hash, tracker))
+                seeds[info_hash] = max(seeds[info_hash], cached)
+            elif _in_backoff(tracker):
+                log.debug('Skipping %s, it has failed recently' % tracker)
+            elif info_hash not in pending[tracker]:
+                pending[tracker].append(info_hash)
+
+    jobs = []
+    for tracker, info_hashes in pending.iteritems():
+        size = BATCH_SIZE['udp' if tracker.startswith('udp') else 'http']
+        for i in range(0, len(info_hashes), size):
+            jobs.append((tracker, info_hashes[i:i + size]))
+    if not jobs:
+        return seeds
+
+    pool = ThreadPool(min(MAX_WORKERS, len(jobs)))
+    try:
+        for tracker, info_hashes, result in pool.imap_unordered(_scrape_batch, jobs):
+            if result is None:
+                _record_failure(tracker)
+                continue
+            tracker_backoff.pop(tracker, None)
+            for info_hash in info_hashes:
+                tracker_seeds = result.get(info_hash, 0)
+                scrape_cache[(tracker, info_hash)] = tracker_seeds
+                seeds[info_hash] = max(seeds[info_hash], tracker_seeds)
+                log.debug('%s seeds found for %s from %s' % (tracker_seeds, info_hash, tracker))
+    finally:
+        pool.close()
+        pool.join()
+    return seeds
+
+
 class TorrentAlive(object):
     schema = {
         'oneOf': [
@@ -206,52 +321,44 @@ class TorrentAlive(object):
         config = self.prepare_config(config)
         min_seeds = config['min_seeds']
 
+        # Collect all trackers for all accepted torrents first, so they can be scraped together
+        torrents = {}
+        checked_entries = []
         for entry in task.accepted:
             # If torrent_seeds is filled, we will have already filtered in filter phase
             if entry.get('torrent_seeds'):
                 log.debug('Not checking trackers for seeds, as torrent_seeds is already filled.')
                 continue
-            log.debug('Checking for seeds for %s:' % entry['title'])
             torrent = entry.get('torrent')
-            if torrent:
-                seeds = 0
-                info_hash = torrent.info_hash
-                announce_list = torrent.content.get('announce-list')
-                if announce_list:
-                    # Multitracker torrent
-                    threadlist = []
-                    for tier in announce_list:
-                        for tracker in tier:
-                            background = TorrentAliveThread(tracker, info_hash)
-                            try:
-                                background.start()
-                                threadlist.append(background)
-                            except threading.ThreadError:
-                                # If we can't start a new thread, wait for current ones to complete and continue
-                                log.debug('Reached max threads, finishing current threads.')
-                                seeds = max(seeds, max_seeds_from_threads(threadlist))
-                                background.start()
-                                threadlist = [background]
-                            log.debug('Started thread to scrape %s with info hash %s' % (tracker, info_hash))
-
-                    seeds = max(seeds, max_seeds_from_threads(threadlist))
-                    log.debug('Highest number of seeds found: %s' % seeds)
-                else:
-                    # Single tracker
-                    tracker = torrent.content['announce']
-                    try:
-                        seeds = get_tracker_seeds(tracker, info_hash)
-                    except URLError as e:
-                        log.debug('Error scraping %s: %s' % (tracker, e))
-
-                # Reject if needed
-                if seeds < min_seeds:
-                    entry.reject(reason='Tracker(s) had < %s required seeds. (%s)' % (min_seeds, seeds),
-                                 remember_time=config['reject_for'])
-                    # Maybe there is better match that has enough seeds
-                    task.rerun()
-                else:
-                    log.debug('Found %i seeds from trackers' % seeds)
+            if not torrent:
+                continue
+            info_hash = torrent.info_hash
+            announce_list = torrent.content.get('announce-list')
+            if announce_list:
+                # Multitracker torrent
+                trackers = [tracker for tier in announce_list for tracker in tier]
+            else:
+                # Single tracker
+                trackers = [torrent.content['announce']] if torrent.content.get('announce') else []
+            torrents.setdefault(info_hash, [])
+            torrents[info_hash].extend(t for t in trackers if t not in torrents[info_hash])
+            checked_entries.append((entry, info_hash))
+
+        if not checked_entries:
+            return
+        log.verbose('Checking seeds for %s torrents from %s trackers' %
+                    (len(torrents), len(set(t for trackers in torrents.itervalues() for t in trackers))))
+        seeds = scrape_torrents(torrents)
+
+        for entry, info_hash in checked_entries:
+            # Reject if needed
+            if seeds[info_hash] < min_seeds:
+                entry.reject(reason='Tracker(s) had < %s required seeds. (%s)' % (min_seeds, seeds[info_hash]),
+                             remember_time=config['reject_for'])
+                # Maybe there is better match that has enough seeds
+                task.rerun()
+            else:
+                log.debug('Found %i seeds from trackers for %s' % (seeds[info_hash], entry['title']))
 
 
 @event('plugin.register')
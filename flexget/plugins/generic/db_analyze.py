@@ -1,12 +1,33 @@
 from __future__ import unicode_literals, division, absolute_import
 import logging
+from datetime import datetime
+
 from flexget.event import event
+from flexget.manager import Session
+from flexget.plugins.generic.db_tuning import get_setting
+from flexget.utils.simple_persistence import SimplePersistence
 
 log = logging.getLogger('db_analyze')
 
 
+def analyze(session):
+    """Runs ANALYZE if `analyze_interval` has passed since the last time."""
+    persistence = SimplePersistence('db_analyze')
+    last_analyze = persistence.get('last_analyze')
+    if not last_analyze or last_analyze < datetime.now() - get_setting('analyze_interval'):
+        log.info('Running ANALYZE on database to improve performance.')
+        session.execute('ANALYZE')
+        persistence['last_analyze'] = datetime.now()
+
+
 # Run after the cleanup is actually finished
 @event('manager.db_cleanup', 0)
 def on_cleanup(manager, session):
-    log.info('Running ANALYZE on database to improve performance.')
-    session.execute('ANALYZE')
+    analyze(session)
+
+
+@event('task.execute.completed')
+def on_task_completed(task):
+    # The cleanup only runs once a week, shorter analyze intervals are kept after the tasks
+    with Session() as session:
+        analyze(session)
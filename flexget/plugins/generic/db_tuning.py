@@ -0,0 +1,101 @@
+from __future__ import unicode_literals, division, absolute_import
+import logging
+
+import sqlalchemy
+
+from flexget.config_schema import register_config_key, parse_interval, parse_size
+from flexget.event import event
+
+log = logging.getLogger('db_tuning')
+
+DEFAULTS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': '16 MiB',
+    'mmap_size': '64 MiB',
+    'busy_timeout': 10,
+    'analyze_interval': '1 week',
+    'vacuum_interval': '24 weeks',
+    'incremental_vacuum': True
+}
+
+database_config_schema = {
+    'type': 'object',
+    'properties': {
+        'journal_mode': {'type': 'string', 'enum': ['wal', 'delete', 'truncate', 'persist']},
+        'synchronous': {'type': 'string', 'enum': ['off', 'normal', 'full']},
+        'cache_size': {'type': ['string', 'integer'], 'format': 'size'},
+        'mmap_size': {'type': ['string', 'integer'], 'format': 'size'},
+        'busy_timeout': {'type': 'number', 'minimum': 0},
+        'analyze_interval': {'type': 'string', 'format': 'interval'},
+        'vacuum_interval': {'type': 'string', 'format': 'interval'},
+        'incremental_vacuum': {'type': 'boolean'}
+    },
+    'additionalProperties': False
+}
+
+# Settings from the `database` section of the config, used for every new connection
+settings = dict(DEFAULTS)
+
+
+def get_setting(name):
+    """Get database setting `name`, sizes are returned in bytes and intervals as timedelta."""
+    value = settings[name]
+    if name in ('cache_size', 'mmap_size'):
+        return parse_size(value)
+    if name.endswith('_interval'):
+        return parse_interval(value)
+    return value
+
+
+def on_connect(dbapi_connection, connection_record):
+    """Applies the pragmas to new sqlite connections."""
+    statements = [
+        'PRAGMA synchronous = %s' % get_setting('synchronous'),
+        # Negative value is the size in KiB instead of pages
+        'PRAGMA cache_size = -%d' % (get_setting('cache_size') // 1024),
+        'PRAGMA mmap_size = %d' % get_setting('mmap_size'),
+        # SQLite's own busy handler retries with increasing sleeps until the timeout has passed
+        'PRAGMA busy_timeout = %d' % (get_setting('busy_timeout') * 1000)
+    ]
+    for statement in statements:
+        dbapi_connection.execute(statement)
+    try:
+        dbapi_connection.execute('PRAGMA journal_mode = %s' % get_setting('journal_mode'))
+    except Exception as e:
+        # Changing the journal mode needs an exclusive lock, it will be tried again on the next connection
+        log.debug('Could not change journal mode: %s' % e)
+
+
+def is_sqlite_file(engine):
+    return engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:')
+
+
+@event('manager.initialize')
+def setup_engines(manager):
+    for engine in set([manager.engine, manager.read_engine]):
+        if not is_sqlite_file(engine):
+            continue
+        sqlalchemy.event.listen(engine, 'connect', on_connect)
+        # Connections made while creating the tables don't have the pragmas
+        engine.dispose()
+
+
+@event('manager.config_updated')
+def update_settings(manager):
+    new_settings = dict(DEFAULTS)
+    new_settings.update(manager.config.get('database', {}))
+    if new_settings == settings:
+        return
+    log.debug('Database settings changed: %s' % new_settings)
+    settings.clear()
+    settings.update(new_settings)
+    # Idle pooled connections will be replaced by ones using the new settings
+    for engine in set([manager.engine, manager.read_engine]):
+        if engine is not None and is_sqlite_file(engine):
+            engine.dispose()
+
+
+@event('config.register')
+def register_config():
+    register_config_key('database', database_config_schema)
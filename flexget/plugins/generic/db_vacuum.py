@@ -1,20 +1,31 @@
 from __future__ import unicode_literals, division, absolute_import
 import logging
-from datetime import datetime, timedelta
-from flexget.utils.simple_persistence import SimplePersistence
+from datetime import datetime
+
 from flexget.event import event
+from flexget.plugins.generic.db_tuning import get_setting
+from flexget.utils.simple_persistence import SimplePersistence
 
 log = logging.getLogger('db_vacuum')
-VACUUM_INTERVAL = timedelta(weeks=24) # 6 months
+
+# Value of auto_vacuum pragma when incremental vacuum is enabled
+AUTO_VACUUM_INCREMENTAL = 2
 
 
 # Run after the cleanup is actually finished, but before analyze
 @event('manager.db_cleanup', 1)
 def on_cleanup(manager, session):
+    incremental = get_setting('incremental_vacuum')
     # Vacuum can take a long time, and is not needed frequently
     persistence = SimplePersistence('db_vacuum')
     last_vacuum = persistence.get('last_vacuum')
-    if not last_vacuum or last_vacuum < datetime.now() - VACUUM_INTERVAL:
+    if not last_vacuum or last_vacuum < datetime.now() - get_setting('vacuum_interval'):
+        if incremental:
+            # Takes effect with the vacuum, after that free pages can be released without a full vacuum
+            session.execute('PRAGMA auto_vacuum = INCREMENTAL')
         log.info('Running VACUUM on database to improve performance and decrease db size.')
         session.execute('VACUUM')
         persistence['last_vacuum'] = datetime.now()
+    elif incremental and session.execute('PRAGMA auto_vacuum').scalar() == AUTO_VACUUM_INCREMENTAL:
+        log.debug('Running incremental vacuum on database.')
+        session.execute('PRAGMA incremental_vacuum')
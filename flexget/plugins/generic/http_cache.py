@@ -0,0 +1,73 @@
+from __future__ import unicode_literals, division, absolute_import
+import logging
+import os
+
+from flexget.config_schema import register_config_key, parse_interval, parse_size
+from flexget.event import event
+from flexget.utils import requests
+from flexget.utils.http_cache import DiskStore, HTTPCache
+from flexget.utils.tools import timedelta_total_seconds
+
+log = logging.getLogger('http_cache')
+
+DEFAULT_MAX_SIZE = '100 MiB'
+
+http_cache_config_schema = {
+    'oneOf': [
+        {'type': 'boolean'},
+        {
+            'type': 'object',
+            'properties': {
+                'max_size': {'type': ['string', 'integer'], 'format': 'size'},
+                'domains': {
+                    'type': 'object',
+                    'additionalProperties': {'type': 'string', 'format': 'interval'}
+                }
+            },
+            'additionalProperties': False
+        }
+    ]
+}
+
+# Config the current cache was set up with
+_config = None
+
+
+@event('manager.config_updated')
+def setup_cache(manager):
+    """
+    Enables the HTTP cache for new sessions, when the `http_cache` section is in the config.
+
+    Example::
+
+      http_cache:
+        max_size: 200 MiB
+        domains:
+          # Responses from these domains are used for this long, whatever their headers say
+          api.thetvdb.com: 6 hours
+    """
+    global _config
+    config = manager.config.get('http_cache', False)
+    if config is True:
+        config = {}
+    if config == _config:
+        return
+    _config = config
+    if config is False:
+        requests.response_cache = None
+        return
+    path = os.path.join(manager.config_base, 'http_cache')
+    max_size = parse_size(config.get('max_size', DEFAULT_MAX_SIZE))
+    domains = dict((domain, timedelta_total_seconds(parse_interval(ttl)))
+                   for domain, ttl in config.get('domains', {}).iteritems())
+    log.debug('Caching HTTP responses in %s, up to %s bytes' % (path, max_size))
+    try:
+        requests.response_cache = HTTPCache(DiskStore(path, max_size), domains)
+    except OSError as e:
+        log.error('Cannot use HTTP cache directory %s: %s' % (path, e))
+        requests.response_cache = None
+
+
+@event('config.register')
+def register_config():
+    register_config_key('http_cache', http_cache_config_schema)
@@ -9,7 +9,9 @@ from flexget import options, plugin
 from flexget import db_schema
 from flexget.event import event
 from flexget.manager import Session
-from flexget.plugin import get_plugin_by_name, PluginError, PluginWarning
+from flexget.plugin import get_plugin_by_name, PluginWarning
+from flexget.utils.inputs import aggregate_inputs
+from flexget.utils.search import search_batch
 from flexget.utils.tools import parse_timedelta, multiply_timedelta
 
 log = logging.getLogger('discover')
@@ -81,39 +83,9 @@ class Discover(object):
         :param task: Current task
         :return: List of pseudo entries created by inputs under `what` configuration
         """
-        entries = []
-        entry_titles = set()
-        entry_urls = set()
-        # run inputs
-        for item in config['what']:
-            for input_name, input_config in item.iteritems():
-                input = get_plugin_by_name(input_name)
-                if input.api_ver == 1:
-                    raise PluginError('Plugin %s does not support API v2' % input_name)
-                method = input.phase_handlers['input']
-                try:
-                    result = method(task, input_config)
-                except PluginError as e:
-                    log.warning('Error during input plugin %s: %s' % (input_name, e))
-                    continue
-                if not result:
-                    log.warning('Input %s did not return anything' % input_name)
-                    continue
-
-                for entry in result:
-                    urls = ([entry['url']] if entry.get('url') else []) + entry.get('urls', [])
-                    if any(url in entry_urls for url in urls):
-                        log.debug('URL for `%s` already in entry list, skipping.' % entry['title'])
-                        continue
-
-                    if entry['title'] in entry_titles:
-                        log.verbose('Ignored duplicate title `%s`' % entry['title'])    # TODO: should combine?
-                        continue
-
-                    entries.append(entry)
-                    entry_titles.add(entry['title'])
-                    entry_urls.update(urls)
-        return entries
+        inputs = [(input_name, input_config) for item in config['what']
+                  for input_name, input_config in item.iteritems()]
+        return aggregate_inputs(task, inputs)
 
     def execute_searches(self, config, entries, task):
         """
@@ -123,50 +95,45 @@ class Discover(object):
         :return: List of entries found from search engines listed under `from` configuration
         """
 
-        result = []
-        for index, entry in enumerate(entries):
-            entry_results = []
-            for item in config['from']:
-                if isinstance(item, dict):
-                    plugin_name, plugin_config = item.items()[0]
-                else:
-                    plugin_name, plugin_config = item, None
-                search = get_plugin_by_name(plugin_name).instance
-                if not callable(getattr(search, 'search')):
-                    log.critical('Search plugin %s does not implement search method' % plugin_name)
+        entry_results = [[] for entry in entries]
+        for item in config['from']:
+            if isinstance(item, dict):
+                plugin_name, plugin_config = item.items()[0]
+            else:
+                plugin_name, plugin_config = item, None
+            search = get_plugin_by_name(plugin_name).instance
+            if not callable(getattr(search, 'search', None)) and not callable(getattr(search, 'search_batch', None)):
+                log.critical('Search plugin %s does not implement search method' % plugin_name)
+                continue
+            searched = search_batch(search, task, entries, plugin_config, name=plugin_name)
+            for entry, found, (search_results, error) in zip(entries, entry_results, searched):
+                if isinstance(error, PluginWarning):
+                    log.verbose('No results from %s: %s' % (plugin_name, error))
                     continue
-                log.verbose('Searching for `%s` with plugin `%s` (%i of %i)' %
-                            (entry['title'], plugin_name, index + 1, len(entries)))
-                try:
-                    try:
-                        search_results = search.search(task=task, entry=entry, config=plugin_config)
-                    except TypeError:
-                        # Old search api did not take task argument
-                        log.warning('Search plugin %s does not support latest search api.' % plugin_name)
-                        search_results = search.search(entry, plugin_config)
-                    if not search_results:
-                        log.debug('No results from %s' % plugin_name)
-                        continue
-                    log.debug('Discovered %s entries from %s' % (len(search_results), plugin_name))
-                    if config.get('limit'):
-                        search_results = sorted(search_results, reverse=True,
-                                                key=lambda x: x.get('search_sort'))[:config['limit']]
-                    for e in search_results:
-                        e['discovered_from'] = entry['title']
-                        e['discovered_with'] = plugin_name
-                        e.on_complete(self.entry_complete, query=entry, search_results=search_results)
-
-                    entry_results.extend(search_results)
-
-                except PluginWarning as e:
-                    log.verbose('No results from %s: %s' % (plugin_name, e))
-                except PluginError as e:
-                    log.error('Error searching with %s: %s' % (plugin_name, e))
-            if not entry_results:
+                if error:
+                    log.error('Error searching with %s: %s' % (plugin_name, error))
+                    continue
+                if not search_results:
+                    log.debug('No results from %s' % plugin_name)
+                    continue
+                log.debug('Discovered %s entries from %s' % (len(search_results), plugin_name))
+                if config.get('limit'):
+                    search_results = sorted(search_results, reverse=True,
+                                            key=lambda x: x.get('search_sort'))[:config['limit']]
+                for e in search_results:
+                    e['discovered_from'] = entry['title']
+                    e['discovered_with'] = plugin_name
+                    e.on_complete(self.entry_complete, query=entry, search_results=search_results)
+
+                found.extend(search_results)
+
+        result = []
+        for entry, found in zip(entries, entry_results):
+            if not found:
                 log.verbose('No search results for `%s`' % entry['title'])
                 entry.complete()
                 continue
-            result.extend(entry_results)
+            result.extend(found)
 
         return sorted(result, reverse=True, key=lambda x: x.get('search_sort'))
 
@@ -1,6 +1,8 @@
 from __future__ import unicode_literals, division, absolute_import
 import logging
+import os
 import re
+import stat
 import sys
 import urllib
 import urlparse
@@ -15,6 +17,86 @@ from flexget.entry import Entry
 
 log = logging.getLogger('filesystem')
 
+try:
+    # Backport of os.scandir, gets file types from the directory listing without stat calls
+    from scandir import scandir
+except ImportError:
+    scandir = None
+
+
+class DirEntry(object):
+    """
+    Stand-in for the entries of `scandir` when it's not installed. Each object is stat'ed at most once, and only when
+    something is asked about it.
+    """
+    __slots__ = ('name', 'path', '_lstat', '_stat')
+
+    def __init__(self, folder, name):
+        self.name = name
+        self.path = os.path.join(folder, name)
+        self._lstat = None
+        self._stat = None
+
+    def stat(self, follow_symlinks=True):
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        if not follow_symlinks:
+            return self._lstat
+        if self._stat is None:
+            self._stat = os.stat(self.path) if stat.S_ISLNK(self._lstat.st_mode) else self._lstat
+        return self._stat
+
+    def _is_mode(self, test, follow_symlinks=True):
+        try:
+            return test(self.stat(follow_symlinks=follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_dir(self):
+        return self._is_mode(stat.S_ISDIR)
+
+    def is_file(self):
+        return self._is_mode(stat.S_ISREG)
+
+    def is_symlink(self):
+        return self._is_mode(stat.S_ISLNK, follow_symlinks=False)
+
+
+def list_folder(folder):
+    """Returns the `scandir` like entries of `folder`."""
+    children = list(scandir(folder)) if scandir else os.listdir(folder)
+    if isinstance(folder, unicode):
+        # Names which can't be decoded are returned as byte strings
+        for child in children[:]:
+            name = getattr(child, 'name', child)
+            if not isinstance(name, unicode):
+                log.error('File %s not decodable with filesystem encoding: %s' %
+                          (name.decode('utf8', 'replace'), sys.getfilesystemencoding()))
+                children.remove(child)
+    if not scandir:
+        children = [DirEntry(folder, name) for name in children]
+    return children
+
+
+def scan_folder(folder, max_level, level=1):
+    """
+    Yields the `scandir` like entries of everything in `folder` and its sub folders, depth first with each folder
+    before its contents. Sub folders deeper than `max_level` are not listed at all.
+    """
+    try:
+        children = list_folder(folder)
+    except OSError as e:
+        if level == 1:
+            log.warning('Unable to list folder %s: %s' % (folder, e))
+        else:
+            log.debug('Unable to list folder %s: %s' % (folder, e))
+        return
+    for child in children:
+        yield child
+        if level < max_level and child.is_dir():
+            for item in scan_folder(child.path, max_level, level + 1):
+                yield item
+
 
 class Filesystem(object):
     """
@@ -101,27 +183,31 @@ class Filesystem(object):
 
         return config
 
-    def create_entry(self, filepath, test_mode):
+    def create_entry(self, filepath, test_mode, stat_result=None):
         """
         Creates a single entry using a filepath and a type (file/dir)
+
+        :param stat_result: Result of stat on `filepath` if already known
         """
         filepath = filepath.abspath()
+        if stat_result is None:
+            try:
+                stat_result = os.stat(filepath)
+            except OSError:
+                # Broken symlink
+                stat_result = os.lstat(filepath)
         entry = Entry()
         entry['location'] = filepath
         entry['url'] = urlparse.urljoin('file:', urllib.pathname2url(filepath.encode('utf8')))
         entry['filename'] = filepath.name
-        if filepath.isfile():
+        if stat.S_ISREG(stat_result.st_mode):
             entry['title'] = filepath.namebase
         else:
             entry['title'] = filepath.name
-        try:
-            entry['timestamp'] = datetime.fromtimestamp(filepath.getmtime())
-        except Exception as e:
-            log.warning('Error setting timestamp for %s: %s' % (filepath, e))
-            entry['timestamp'] = None
-        entry['accessed'] = datetime.fromtimestamp(filepath.getatime())
-        entry['modified'] = datetime.fromtimestamp(filepath.getmtime())
-        entry['created'] = datetime.fromtimestamp(filepath.getctime())
+        entry['timestamp'] = datetime.fromtimestamp(stat_result.st_mtime)
+        entry['accessed'] = datetime.fromtimestamp(stat_result.st_atime)
+        entry['modified'] = datetime.fromtimestamp(stat_result.st_mtime)
+        entry['created'] = datetime.fromtimestamp(stat_result.st_ctime)
         if entry.isvalid():
             if test_mode:
                 log.info("Test mode. Entry includes:")
@@ -143,41 +229,38 @@ class Filesystem(object):
         else:
             return base_depth + recursion
 
-    def get_folder_objects(self, folder, recursion):
-        if recursion is False:
-            return folder.listdir()
-        else:
-            return folder.walk(errors='ignore')
-
     def get_entries_from_path(self, path_list, match, recursion, test_mode, get_files, get_dirs, get_symlinks):
         entries = []
+        # Locations of the objects already handled, same object can be reached from more than one path
+        seen = set()
 
         for folder in path_list:
             log.verbose('Scanning folder %s. Recursion is set to %s.' % (folder, recursion))
             folder = Path(folder).expanduser()
             log.debug('Scanning %s' % folder)
-            base_depth = len(folder.splitall())
-            max_depth = self.get_max_depth(recursion, base_depth)
-            folder_objects = self.get_folder_objects(folder, recursion)
-            for path_object in folder_objects:
-                log.debug('Checking if %s qualifies to be added as an entry.' % path_object)
-                try:
-                    path_object.exists()
-                except UnicodeError:
-                    log.error('File %s not decodable with filesystem encoding: %s' % (path_object, sys.getfilesystemencoding()))
+            max_level = self.get_max_depth(recursion, 0)
+            for dir_entry in scan_folder(folder, max_level):
+                path_object = Path(dir_entry.path)
+                # Matching only needs the path, so objects which don't match are never stat'ed
+                if not match(path_object):
+                    continue
+                location = path_object.abspath()
+                if location in seen:
                     continue
-                entry = None
-                object_depth = len(path_object.splitall())
-                if object_depth <= max_depth:
-                    if match(path_object):
-                        if (path_object.isdir() and get_dirs) or (
-                                path_object.islink() and get_symlinks) or (
-                                path_object.isfile() and not path_object.islink() and get_files):
-                            entry = self.create_entry(path_object, test_mode)
-                        else:
-                            log.debug("Path object's %s type doesn't match requested object types." % path_object)
-                        if entry and entry not in entries:
-                            entries.append(entry)
+                seen.add(location)
+                log.debug('Checking if %s qualifies to be added as an entry.' % path_object)
+                is_link = dir_entry.is_symlink()
+                if (dir_entry.is_dir() and get_dirs) or (is_link and get_symlinks) or (
+                        dir_entry.is_file() and not is_link and get_files):
+                    try:
+                        stat_result = dir_entry.stat()
+                    except OSError:
+                        stat_result = None
+                    entry = self.create_entry(path_object, test_mode, stat_result)
+                    if entry:
+                        entries.append(entry)
+                else:
+                    log.debug("Path object's %s type doesn't match requested object types." % path_object)
 
         return entries
 
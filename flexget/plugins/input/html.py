@@ -125,7 +125,8 @@ class InputHtml(object):
         log.verbose('Requesting: %s' % url)
         page = task.requests.get(url, auth=auth)
         log.verbose('Response: %s (%s)' % (page.status_code, page.reason))
-        soup = get_soup(page.content)
+        # Only links are needed to create the entries, the whole page when it's dumped
+        soup = get_soup(page.content, parse_only=None if dump_name else 'a')
 
         # dump received content into a file
         if dump_name:
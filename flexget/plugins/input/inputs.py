@@ -3,6 +3,7 @@ import logging
 
 from flexget import plugin
 from flexget.event import event
+from flexget.utils.inputs import aggregate_inputs
 
 log = logging.getLogger('inputs')
 
@@ -34,40 +35,8 @@ class PluginInputs(object):
     }
 
     def on_task_input(self, task, config):
-        entries = []
-        entry_titles = set()
-        entry_urls = set()
-        for item in config:
-            for input_name, input_config in item.iteritems():
-                input = plugin.get_plugin_by_name(input_name)
-                if input.api_ver == 1:
-                    raise plugin.PluginError('Plugin %s does not support API v2' % input_name)
-
-                method = input.phase_handlers['input']
-                try:
-                    result = method(task, input_config)
-                except plugin.PluginError as e:
-                    log.warning('Error during input plugin %s: %s' % (input_name, e))
-                    continue
-                if not result:
-                    msg = 'Input %s did not return anything' % input_name
-                    if getattr(task, 'no_entries_ok', False):
-                        log.verbose(msg)
-                    else:
-                        log.warning(msg)
-                    continue
-                for entry in result:
-                    if entry['title'] in entry_titles:
-                        log.debug('Title `%s` already in entry list, skipping.' % entry['title'])
-                        continue
-                    urls = ([entry['url']] if entry.get('url') else []) + entry.get('urls', [])
-                    if any(url in entry_urls for url in urls):
-                        log.debug('URL for `%s` already in entry list, skipping.' % entry['title'])
-                        continue
-                    entries.append(entry)
-                    entry_titles.add(entry['title'])
-                    entry_urls.update(urls)
-        return entries
+        inputs = [(input_name, input_config) for item in config for input_name, input_config in item.iteritems()]
+        return aggregate_inputs(task, inputs)
 
 
 @event('plugin.register')
@@ -1,18 +1,30 @@
 from __future__ import unicode_literals, division, absolute_import
+import mmap
 import os
 import re
 import logging
 
 from sqlalchemy import Column, Integer, Unicode
 
-from flexget import options, plugin
-from flexget.db_schema import versioned_base
+from flexget import db_schema, options, plugin
 from flexget.entry import Entry
 from flexget.event import event
 from flexget.manager import Session
+from flexget.utils.sqlalchemy_utils import table_add_column
 
 log = logging.getLogger('tail')
-Base = versioned_base('tail', 0)
+Base = db_schema.versioned_base('tail', 1)
+
+# Amount of the file searched at once, rounded to whole lines
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+@db_schema.upgrade('tail')
+def upgrade(ver, session):
+    if ver == 0:
+        table_add_column('tail', 'inode', Integer, session)
+        ver = 1
+    return ver
 
 
 class TailPosition(Base):
@@ -21,6 +33,40 @@ class TailPosition(Base):
     task = Column(Unicode)
     filename = Column(Unicode)
     position = Column(Integer)
+    # Identifies the file the position is in, a different one means the log was rotated
+    inode = Column(Integer)
+
+
+def read_chunks(file, position, chunk_size=None):
+    """
+    Maps the complete lines of `file` from byte offset `position` to the end of the file, a chunk at a time. A line
+    which is still being written is left for the next time.
+
+    :return: Generator of (buffer, start, end) tuples. Buffer is a :class:`mmap.mmap` which is only valid until the next
+        chunk, `start` and `end` are the offsets of the chunk in it.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    size = os.fstat(file.fileno()).st_size
+    while position < size:
+        # Maps have to start at a multiple of the allocation granularity
+        offset = position - position % mmap.ALLOCATIONGRANULARITY
+        length = min(position - offset + chunk_size, size - offset)
+        while True:
+            buf = mmap.mmap(file.fileno(), length, access=mmap.ACCESS_READ, offset=offset)
+            end = buf.rfind(b'\n', position - offset)
+            if end >= 0 or offset + length == size:
+                break
+            # Lines longer than the chunk
+            buf.close()
+            length = min(length * 2, size - offset)
+        if end < 0:
+            buf.close()
+            return
+        try:
+            yield buf, position - offset, end + 1
+        finally:
+            buf.close()
+        position = offset + end + 1
 
 
 class InputTail(object):
@@ -38,6 +84,9 @@ class InputTail(object):
 
     Note: each entry must have at least two fields, title and url
 
+    The file is read from where the previous run stopped. It's read from the start again when it's replaced (log
+    rotation) or truncated. With max_entries, the entries after the first <max_entries> are left for the next runs.
+
     You may wish to specify encoding used by file so file can be properly
     decoded. List of encodings
     at http://docs.python.org/library/codecs.html#standard-encodings.
@@ -50,6 +99,7 @@ class InputTail(object):
           title: 'TITLE: (.*) URL:'
           url: 'URL: (.*)'
         encoding: utf8
+        max_entries: 100
     """
     schema = {
         'type': 'object',
@@ -67,7 +117,8 @@ class InputTail(object):
             'format': {
                 'type': 'object',
                 'additionalProperties': {'type': 'string'}
-            }
+            },
+            'max_entries': {'type': 'integer', 'minimum': 1}
         },
         'required': ['file', 'entry'],
         'additionalProperties': False
@@ -84,6 +135,7 @@ class InputTail(object):
 
         filename = os.path.expanduser(config['file'])
         encoding = config.get('encoding', None)
+        max_entries = config.get('max_entries')
         with Session() as session:
             db_pos = (session.query(TailPosition).
                       filter(TailPosition.task == task.name).filter(TailPosition.filename == filename).first())
@@ -92,7 +144,8 @@ class InputTail(object):
             else:
                 last_pos = 0
 
-            with open(filename, 'r') as file:
+            with open(filename, 'rb') as file:
+                stat = os.fstat(file.fileno())
                 if task.options.tail_reset == filename or task.options.tail_reset == task.name:
                     if last_pos == 0:
                         log.info('Task %s tail position is already zero' % task.name)
@@ -100,77 +153,122 @@ class InputTail(object):
                         log.info('Task %s tail position (%s) reset to zero' % (task.name, last_pos))
                         last_pos = 0
 
-                if os.path.getsize(filename) < last_pos:
+                # Inodes aren't available on all platforms, those have them as zero
+                if db_pos and db_pos.inode and stat.st_ino and db_pos.inode != stat.st_ino:
+                    log.info('File has been replaced since previous execution, resetting to beginning of the file')
+                    last_pos = 0
+                elif stat.st_size < last_pos:
                     log.info('File size is smaller than in previous execution, resetting to beginning of the file')
                     last_pos = 0
 
-                file.seek(last_pos)
-
                 log.debug('continuing from last position %s' % last_pos)
 
-                entry_config = config.get('entry')
-                format_config = config.get('format', {})
-
-                # keep track what fields have been found
-                used = {}
-                entries = []
-                entry = Entry()
-
-                # now parse text
-
-                while True:
-                    line = file.readline()
-                    if encoding:
-                        try:
-                            line = line.decode(encoding)
-                        except UnicodeError:
-                            raise plugin.PluginError('Failed to decode file using %s. Check encoding.' % encoding)
-
-                    if not line:
-                        break
-
-                    for field, regexp in entry_config.iteritems():
-                        # log.debug('search field: %s regexp: %s' % (field, regexp))
-                        match = re.search(regexp, line)
-                        if match:
-                            # check if used field detected, in such case start with new entry
-                            if field in used:
-                                if entry.isvalid():
-                                    log.info('Found field %s again before entry was completed. \
-                                              Adding current incomplete, but valid entry and moving to next.' % field)
-                                    self.format_entry(entry, format_config)
-                                    entries.append(entry)
-                                else:
-                                    log.info(
-                                        'Invalid data, entry field %s is already found once. Ignoring entry.' % field)
-                                # start new entry
-                                entry = Entry()
-                                used = {}
-
-                            # add field to entry
-                            entry[field] = match.group(1)
-                            used[field] = True
-                            log.debug('found field: %s value: %s' % (field, entry[field]))
-
-                        # if all fields have been found
-                        if len(used) == len(entry_config):
-                            # check that entry has at least title and url
-                            if not entry.isvalid():
-                                log.info('Invalid data, constructed entry is missing mandatory fields (title or url)')
-                            else:
-                                self.format_entry(entry, format_config)
-                                entries.append(entry)
-                                log.debug('Added entry %s' % entry)
-                                # start new entry
-                                entry = Entry()
-                                used = {}
-                last_pos = file.tell()
+                entries, last_pos = self.parse(file, last_pos, config.get('entry'), config.get('format', {}),
+                                               encoding, max_entries)
+                if max_entries and len(entries) == max_entries and last_pos < stat.st_size:
+                    log.verbose('Reached max_entries, continuing from position %s next time' % last_pos)
             if db_pos:
                 db_pos.position = last_pos
+                db_pos.inode = stat.st_ino
             else:
-                session.add(TailPosition(task=task.name, filename=filename, position=last_pos))
+                session.add(TailPosition(task=task.name, filename=filename, position=last_pos, inode=stat.st_ino))
         return entries
 
+    def parse(self, file, position, entry_config, format_config, encoding=None, max_entries=None):
+        """
+        Finds the entries in the lines of `file` after byte offset `position`.
+
+        :return: Tuple of the entries and the byte offset to continue from next time
+        """
+        fields = [(field, re.compile(regexp, re.MULTILINE)) for field, regexp in entry_config.iteritems()]
+
+        # keep track what fields have been found
+        used = {}
+        entries = []
+        entry = Entry()
+
+        for buf, start, end in read_chunks(file, position):
+            # File offsets of the start of the buffer and the end of the chunk
+            base = position - start
+            chunk_end = base + end
+            if encoding:
+                try:
+                    buf = buf[start:end].decode(encoding)
+                except UnicodeError:
+                    raise plugin.PluginError('Failed to decode file using %s. Check encoding.' % encoding)
+                base, start, end = position, 0, len(buf)
+            for line_start, line_end, field, match in self.find_fields(buf, start, end, fields):
+                # check if used field detected, in such case start with new entry
+                if field in used:
+                    if entry.isvalid():
+                        log.info('Found field %s again before entry was completed. \
+                                  Adding current incomplete, but valid entry and moving to next.' % field)
+                        self.format_entry(entry, format_config)
+                        entries.append(entry)
+                        if len(entries) == max_entries:
+                            # The next entry starts on this line
+                            return entries, self.file_offset(buf, base, line_start, encoding)
+                    else:
+                        log.info('Invalid data, entry field %s is already found once. Ignoring entry.' % field)
+                    # start new entry
+                    entry = Entry()
+                    used = {}
+
+                # add field to entry
+                entry[field] = match.group(1)
+                used[field] = True
+                log.debug('found field: %s value: %s' % (field, entry[field]))
+
+                # if all fields have been found
+                if len(used) == len(fields):
+                    # check that entry has at least title and url
+                    if not entry.isvalid():
+                        log.info('Invalid data, constructed entry is missing mandatory fields (title or url)')
+                    else:
+                        self.format_entry(entry, format_config)
+                        entries.append(entry)
+                        log.debug('Added entry %s' % entry)
+                        # start new entry
+                        entry = Entry()
+                        used = {}
+
+                if len(entries) == max_entries:
+                    # The rest of the file is left for the next run, starting after the current line
+                    return entries, self.file_offset(buf, base, line_end, encoding)
+            position = chunk_end
+        return entries, position
+
+    def file_offset(self, buf, base, index, encoding=None):
+        """File offset of `index` in a buffer starting at file offset `base`, decoded with `encoding`."""
+        if encoding:
+            return base + len(buf[:index].encode(encoding))
+        return base + index
+
+    def find_fields(self, buf, start, end, fields):
+        """
+        Searches the fields over the whole buffer at once, instead of line by line. The buffer search only finds the
+        lines to look at, matches are from searching the line itself so they can't span lines.
+
+        :return: List of (line start, line end, field, match) of the first match of each field on a line, in the order
+            of the lines and fields.
+        """
+        found = []
+        for order, (field, regexp) in enumerate(fields):
+            position = start
+            while position < end:
+                candidate = regexp.search(buf, position, end)
+                if not candidate:
+                    break
+                line_start = buf.rfind(b'\n', start, candidate.start()) + 1 or start
+                line_end = buf.find(b'\n', candidate.start(), end) + 1 or end
+                # Only the first match of a line counts, continue with the next line
+                position = line_end
+                match = regexp.search(buf, line_start, line_end)
+                if match:
+                    found.append((line_start, order, line_end, field, match))
+        found.sort(key=lambda item: item[:2])
+        return [(line_start, line_end, field, match) for line_start, order, line_end, field, match in found]
+
 
 @event('plugin.register')
 def register_plugin():
@@ -0,0 +1,29 @@
+from __future__ import unicode_literals, division, absolute_import
+import logging
+
+from flexget import plugin
+from flexget.event import event
+
+log = logging.getLogger('deferred_commit')
+
+
+class DeferredCommit(object):
+    """
+    Commit the database changes made during filter to learn phases at once at the end of the learn phase, instead of
+    after every plugin. Each plugin still runs in its own savepoint, so an error only rolls back its own changes.
+
+    Example::
+
+      deferred_commit: yes
+    """
+
+    schema = {'type': 'boolean'}
+
+    @plugin.priority(255)
+    def on_task_start(self, task, config):
+        task.deferred_commit = config
+
+
+@event('plugin.register')
+def register_plugin():
+    plugin.register(DeferredCommit, 'deferred_commit', api_ver=2)
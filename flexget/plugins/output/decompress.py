@@ -3,9 +3,11 @@ import logging
 import os
 import re
 import shutil
+import time
 import zipfile
+from multiprocessing.pool import ThreadPool
 
-from flexget import plugin
+from flexget import logger, plugin
 from flexget.entry import Entry
 from flexget.event import event
 from flexget.utils.template import render_from_entry, RenderError
@@ -17,6 +19,11 @@ except ImportError:
 
 log = logging.getLogger('decompress')
 
+# Size of the chunks streamed from archive members to the extracted files
+BUFFER_SIZE = 1024 * 1024
+
+ARCHIVE_ERRORS = (zipfile.BadZipfile, rarfile.Error) if rarfile else (zipfile.BadZipfile,)
+
 
 class Decompress(object):
     """
@@ -41,6 +48,10 @@ class Decompress(object):
     unrar_tool:         Specifies the path of the unrar tool. Only necessary if its location is not
                         defined in the operating system's PATH environment variable.
     delete_archive:     [yes|no] (default: no) Delete this archive after extraction is completed.
+    workers:            (default: 2) Number of archives which are extracted at the same time.
+
+    Files which already exist with the same size and modification time as in the archive are not
+    extracted again.
 
 
     Example:
@@ -62,7 +73,8 @@ class Decompress(object):
                     'mask': {'type': 'string'},
                     'regexp': {'type': 'string', 'format': 'regex'},
                     'unrar_tool': {'type': 'string'},
-                    'delete_archive': {'type': 'boolean'}
+                    'delete_archive': {'type': 'boolean'},
+                    'workers': {'type': 'integer', 'minimum': 1}
                 },
                 'additionalProperties': False
             }
@@ -124,6 +136,7 @@ class Decompress(object):
         config.setdefault('keep_dirs', True)
         config.setdefault('unrar_tool', '')
         config.setdefault('delete_archive', False)
+        config.setdefault('workers', 2)
 
         # If mask was specified, turn it in to a regexp
         if 'mask' in config:
@@ -145,11 +158,12 @@ class Decompress(object):
             base = os.path.basename(info.filename)
             return not base
 
-    def handle_entry(self, entry, config):
+    def prepare_entry(self, entry, config, handled_volumes):
         """
-        Extract matching files into the directory specified
+        Opens and lists the archive of entry, returns a function extracting the matching files from it.
 
-        Optionally delete the original archive if config.delete_archive is True
+        :param handled_volumes: Paths of all the volumes of the archives already prepared, further volumes of the same
+            multi-volume archives are skipped.
         """
 
         match = re.compile(config['regexp'], re.IGNORECASE).match
@@ -157,12 +171,12 @@ class Decompress(object):
         if not archive_path:
             log.warn('Entry does not appear to represent a local file, decompress plugin only supports local files')
             return
-        archive_dir = os.path.dirname(archive_path)
-        archive_file = os.path.basename(archive_path)
-
         if not os.path.exists(archive_path):
             log.warn('File no longer exists: %s', archive_path)
             return
+        if os.path.abspath(archive_path) in handled_volumes:
+            log.debug('Volume of an archive which is already being extracted: %s', archive_path)
+            return
 
         archive = self.open_archive(entry)
 
@@ -176,13 +190,21 @@ class Decompress(object):
             except RenderError as e:
                 log.error('Could not render path: %s', to)
                 entry.fail(e)
+                archive.close()
                 return
         else:
-            to = archive_dir
+            to = os.path.dirname(archive_path)
 
+        if hasattr(archive, 'volumelist'):
+            volumes = archive.volumelist()
+        else:
+            volumes = [archive_path]
+        handled_volumes.update(os.path.abspath(volume) for volume in volumes)
+
+        # The member list is read once, and used for extracting as well
+        members = []
         for info in archive.infolist():
             path = info.filename
-            filename = os.path.basename(path)
 
             if self.is_dir(info):
                 log.debug('Appears to be a directory: %s', path)
@@ -197,61 +219,129 @@ class Decompress(object):
             if config['keep_dirs']:
                 path_suffix = path
             else:
-                path_suffix = filename
-            destination = os.path.join(to, path_suffix)
-            dest_dir = os.path.dirname(destination)
+                path_suffix = os.path.basename(path)
+            members.append((info, os.path.join(to, path_suffix)))
 
-            if not os.path.exists(dest_dir):
-                log.debug('Creating path: %s', dest_dir)
-                os.makedirs(dest_dir)
+        def extract():
+            try:
+                return self.extract_members(archive, archive_path, members)
+            finally:
+                archive.close()
+
+        def delete():
+            for volume in volumes:
+                log.debug('Deleting volume: %s', volume)
+                os.remove(volume)
+
+            log.verbose('Deleted archive: %s', os.path.basename(archive_path))
+
+        def job():
+            error_message = extract()
+            if not error_message and config['delete_archive']:
+                delete()
+            return error_message
+
+        return job
+
+    def member_mtime(self, info):
+        """Modification time of archive member as a timestamp, None if the archive has an invalid one."""
+        try:
+            return time.mktime(tuple(info.date_time) + (0, 0, -1))
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+    def is_extracted(self, info, destination):
+        """Tests whether archive member described in info has already been extracted to destination"""
+        try:
+            st = os.stat(destination)
+        except OSError:
+            return False
+        mtime = self.member_mtime(info)
+        return st.st_size == info.file_size and (mtime is None or int(st.st_mtime) == int(mtime))
+
+    def extract_members(self, archive, archive_path, members):
+        """
+        Extracts the members of archive, streaming each of them to its destination.
+
+        :param members: List of (info, destination) tuples
+        :return: Error message if extracting failed, None otherwise
+        """
 
-            if not os.path.exists(destination):
-                success = False
-                error_message = ''
-                source = None
+        for info, destination in members:
+            path = info.filename
+            dest_dir = os.path.dirname(destination)
 
-                log.debug('Attempting to extract: %s to %s', path, destination)
+            if not os.path.isdir(dest_dir):
+                log.debug('Creating path: %s', dest_dir)
                 try:
-                    # python 2.6 doesn't seem to like "with" in conjuntion with ZipFile.open
-                    source = archive.open(path)
-                    with open(destination, 'wb') as target:
-                        shutil.copyfileobj(source, target)
+                    os.makedirs(dest_dir)
+                except OSError as error:
+                    # Another archive could be extracting to the same path
+                    if not os.path.isdir(dest_dir):
+                        return 'OS error while creating path: %s (%s)' % (dest_dir, error)
 
-                    log.verbose('Extracted: %s', path)
-                    success = True
-                except (IOError, os.error) as error:
-                    error_message = 'OS error while creating file: %s (%s)' % (destination, error)
-                except (zipfile.BadZipfile, rarfile.Error) as error:
-                    error_message = 'Failed to extract file: %s in %s (%s)' % (path, archive_path, error)
-                finally:
-                    if source and not source.closed:
-                        source.close()
-
-                if not success:
-                    log.error(error_message)
-                    entry.fail(error_message)
-
-                    if os.path.exists(destination):
-                        log.debug('Cleaning up partially extracted file: %s', destination)
-                    return
-            else:
+            if self.is_extracted(info, destination):
                 log.verbose('File already exists: %s', destination)
+                continue
 
-        if config['delete_archive']:
-            if hasattr(archive, 'volumelist'):
-                volumes = archive.volumelist()
-            else:
-                volumes = [archive_path]
-
-            archive.close()
+            error_message = ''
+            source = None
 
-            for volume in volumes:
-                log.debug('Deleting volume: %s', volume)
-                os.remove(volume)
+            log.debug('Attempting to extract: %s to %s', path, destination)
+            try:
+                # python 2.6 doesn't seem to like "with" in conjuntion with ZipFile.open
+                source = archive.open(info)
+                with open(destination, 'wb') as target:
+                    shutil.copyfileobj(source, target, BUFFER_SIZE)
+                # Matching modification time shows the file is complete, when the archive is extracted again
+                mtime = self.member_mtime(info)
+                if mtime is not None:
+                    os.utime(destination, (mtime, mtime))
+
+                log.verbose('Extracted: %s', path)
+            except (IOError, os.error) as error:
+                error_message = 'OS error while creating file: %s (%s)' % (destination, error)
+            except ARCHIVE_ERRORS as error:
+                error_message = 'Failed to extract file: %s in %s (%s)' % (path, archive_path, error)
+            finally:
+                if source and not source.closed:
+                    source.close()
+
+            if error_message:
+                if os.path.exists(destination):
+                    log.debug('Cleaning up partially extracted file: %s', destination)
+                    try:
+                        os.remove(destination)
+                    except OSError as error:
+                        log.debug('Could not remove %s: %s', destination, error)
+                return error_message
+
+    def run_jobs(self, task, jobs, workers):
+        """Runs the extraction jobs in a pool of workers threads, fails entries with errors afterwards."""
+
+        def run(job):
+            entry, extract = job
+            with logger.task_logging(task.name, task.id):
+                try:
+                    return entry, extract()
+                except (IOError, os.error) as error:
+                    return entry, 'OS error while extracting: %s (%s)' % (entry['location'], error)
 
-            log.verbose('Deleted archive: %s', archive_file)
+        if workers > 1 and len(jobs) > 1:
+            pool = ThreadPool(min(workers, len(jobs)))
+            try:
+                results = pool.map(run, jobs)
+            finally:
+                pool.close()
+                pool.join()
         else:
-            archive.close()
+            results = [run(job) for job in jobs]
+
+        for entry, error_message in results:
+            if error_message:
+                log.error(error_message)
+                # failing runs the entry hooks, which must not happen in the worker threads
+                entry.fail(error_message)
 
     @plugin.priority(255)
     def on_task_output(self, task, config):
@@ -274,8 +364,13 @@ class Decompress(object):
                 rarfile.UNRAR_TOOL = unrar_tool
                 log.debug('Set RarFile.unrar_tool to: %s', unrar_tool)
 
+        jobs = []
+        handled_volumes = set()
         for entry in task.accepted:
-            self.handle_entry(entry, config)
+            job = self.prepare_entry(entry, config, handled_volumes)
+            if job:
+                jobs.append((entry, job))
+        self.run_jobs(task, jobs, config['workers'])
 
 
 @event('plugin.register')
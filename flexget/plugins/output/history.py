@@ -3,14 +3,25 @@ from __future__ import unicode_literals, division, absolute_import
 import logging
 from datetime import datetime
 
-from sqlalchemy import Column, String, Integer, DateTime, Unicode, desc
+from sqlalchemy import Column, String, Integer, DateTime, Unicode, Index, desc, or_, and_
 
-from flexget import options, plugin
+from flexget import db_schema, options, plugin
 from flexget.event import event
 from flexget.logger import console
-from flexget.manager import Base, Session
+from flexget.manager import ReadSession
+from flexget.utils.sqlalchemy_utils import create_index
 
 log = logging.getLogger('history')
+Base = db_schema.versioned_base('history', 0)
+
+
+@db_schema.upgrade('history')
+def upgrade(ver, session):
+    if ver is None:
+        log.info('Creating index on history table.')
+        create_index('history', session, 'feed', 'time')
+        ver = 0
+    return ver
 
 
 class History(Base):
@@ -41,6 +52,34 @@ class History(Base):
             'details': self.details,
         }
 
+Index('ix_history_feed_time', History.task, History.time)
+
+
+def get_history(session, tasks=None, search=None, before=None, limit=50):
+    """
+    Returns history items from newest to oldest. Pages after the first continue from the last item of the previous
+    page, rather than skipping over all the items before them.
+
+    :param session: Session to query with
+    :param list tasks: Only items of these tasks
+    :param string search: Only items with titles containing this, spaces and dots match anything
+    :param before: Id of the last item of the previous page
+    :param int limit: Amount of items
+    :return: List of :class:`History`
+    """
+    query = session.query(History)
+    if tasks is not None:
+        query = query.filter(History.task.in_(tasks))
+    if search:
+        search = search.replace(' ', '%').replace('.', '%')
+        query = query.filter(History.title.like('%' + search + '%'))
+    if before is not None:
+        last = session.query(History.time).filter(History.id == before).scalar()
+        if last is None:
+            return []
+        query = query.filter(or_(History.time < last, and_(History.time == last, History.id < before)))
+    return query.order_by(desc(History.time), desc(History.id)).limit(limit).all()
+
 
 class PluginHistory(object):
     """Records all accepted entries for later lookup"""
@@ -52,31 +91,38 @@ class PluginHistory(object):
         if config is False:
             return  # Explicitly disabled with configuration
 
+        rows = []
+        now = datetime.now()
         for entry in task.accepted:
-            item = History()
-            item.task = task.name
-            item.filename = entry.get('output', None)
-            item.title = entry['title']
-            item.url = entry['url']
             reason = ''
             if 'reason' in entry:
                 reason = ' (reason: %s)' % entry['reason']
-            item.details = 'Accepted by %s%s' % (entry.get('accepted_by', '<unknown>'), reason)
-            task.session.add(item)
+            rows.append({
+                'feed': task.name,
+                'filename': entry.get('output', None),
+                'title': entry['title'],
+                'url': entry['url'],
+                'time': now,
+                'details': 'Accepted by %s%s' % (entry.get('accepted_by', '<unknown>'), reason)
+            })
+        if rows:
+            # A single executemany instead of flushing an object per entry
+            task.session.execute(History.__table__.insert(), rows)
 
 
 def do_cli(manager, options):
-    session = Session()
+    session = ReadSession()
     try:
         console('-- History: ' + '-' * 67)
-        query = session.query(History)
-        if options.search:
-            search_term = options.search.replace(' ', '%').replace('.', '%')
-            query = query.filter(History.title.like('%' + search_term + '%'))
+        tasks = None
         if options.task:
-            query = query.filter(History.task.like('%' + options.task + '%'))
-        query = query.order_by(desc(History.time)).limit(options.limit)
-        for item in reversed(query.all()):
+            # Matching the task names first, so the items can be found with the task index
+            tasks = [name for (name,) in session.query(History.task).distinct()
+                     if name and options.task.lower() in name.lower()]
+            if not tasks:
+                return
+        items = get_history(session, tasks=tasks, search=options.search, limit=options.limit)
+        for item in reversed(items):
             console(' Task    : %s' % item.task)
             console(' Title   : %s' % item.title)
             console(' Url     : %s' % item.url)
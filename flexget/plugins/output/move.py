@@ -3,9 +3,11 @@ import os
 import shutil
 import logging
 import time
+from multiprocessing.pool import ThreadPool
 
-from flexget import plugin
+from flexget import logger, plugin
 from flexget.event import event
+from flexget.utils import file_ops
 from flexget.utils.template import RenderError
 from flexget.utils.pathscrub import pathscrub
 
@@ -38,6 +40,7 @@ class BaseFileOps(object):
         if 'along' in config:
             sexts = [('.' + s).replace('..', '.').lower() for s in config['along']]
         
+        jobs = []
         for entry in task.accepted:
             if 'location' not in entry:
                 self.log.verbose('Cannot handle %s because it does not have the field location.' % entry['title'])
@@ -61,10 +64,46 @@ class BaseFileOps(object):
                         if ext != src_ext.lower() and os.path.exists(src_file + ext):
                             siblings.append(src_file + ext)
                 # execute action in subclasses
-                self.handle_entry(task, config, entry, siblings)
+                job = self.handle_entry(task, config, entry, siblings)
+                if job:
+                    jobs.append((entry, job))
             except Exception as err:
                 entry.fail(str(err))
                 continue
+        self.run_jobs(task, config, jobs)
+
+    def run_jobs(self, task, config, jobs):
+        """
+        Runs the file transfers returned by `handle_entry` in a pool of `workers` threads. Each job returns a function
+        which finishes the entry, those are called in order on the main thread once all the transfers are done.
+        """
+        workers = config.get('workers', 1)
+        # A single directory can use all the workers for its own files
+        tree_workers = workers if len(jobs) == 1 else 1
+
+        def run(job):
+            entry, transfer = job
+            with logger.task_logging(task.name, task.id):
+                try:
+                    return entry, transfer(tree_workers), None
+                except Exception as err:
+                    return entry, None, err
+
+        if workers > 1 and len(jobs) > 1:
+            pool = ThreadPool(min(workers, len(jobs)))
+            try:
+                results = pool.map(run, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [run(job) for job in jobs]
+        for entry, finish, err in results:
+            if err:
+                # failing runs the entry hooks, which must not happen in the worker threads
+                entry.fail(str(err))
+            else:
+                finish()
     
     def clean_source(self, task, config, entry):
         min_size = entry.get('clean_source', config.get('clean_source', -1))
@@ -186,22 +225,6 @@ class TransformingOps(BaseFileOps):
         if not os.path.isdir(dst_path) and not task.options.test:
             raise plugin.PluginWarning('destination `%s` is not a directory.' % dst_path)
         
-        # unpack_safety
-        if config.get('unpack_safety', entry.get('unpack_safety', True)):
-            count = 0
-            while True:
-                if count > 60 * 30:
-                    raise plugin.PluginWarning('The task has been waiting unpacking for 30 minutes')
-                size = os.path.getsize(src)
-                time.sleep(1)
-                new_size = os.path.getsize(src)
-                if size != new_size:
-                    if not count % 10:
-                        self.log.verbose('File `%s` is possibly being unpacked, waiting ...' % src_name)
-                else:
-                    break
-                count += 1
-        
         src_file, src_ext = os.path.splitext(src)
         dst_file, dst_ext = os.path.splitext(dst)
         
@@ -214,36 +237,66 @@ class TransformingOps(BaseFileOps):
         funct_name = 'move' if self.move else 'copy'
         funct_done = 'moved' if self.move else 'copied'
         
+        def finish():
+            entry['output'] = dst
+            if self.move and not src_isdir:
+                self.clean_source(task, config, entry)
+
         if task.options.test:
+            self.wait_unpacked(config, entry, src)
             self.log.info('Would %s `%s` to `%s`' % (funct_name, src, dst))
             for s in siblings:
                 # we cannot rely on splitext for extensions here (subtitles may have the language code)
                 d = dst_file + s[len(src_file):]
                 self.log.info('Would also %s `%s` to `%s`' % (funct_name, s, d))
-        else:
-            # IO errors will have the entry mark failed in the base class
+            finish()
+            return
+
+        def transfer(workers):
+            # runs in a worker thread, IO errors will have the entry mark failed in the base class
+            self.wait_unpacked(config, entry, src)
+            started = time.time()
             if self.move:
-                shutil.move(src, dst)
+                result = file_ops.move(src, dst, workers=workers)
             elif src_isdir:
-                shutil.copytree(src, dst)
+                result = file_ops.copy_tree(src, dst, workers=workers)
             else:
-                shutil.copy(src, dst)
-            self.log.info('`%s` has been %s to `%s`' % (src, funct_done, dst))
+                result = file_ops.copy_file(src, dst)
+            self.log.info('`%s` has been %s to `%s` (%s)' %
+                          (src, funct_done, dst, file_ops.format_throughput(result, time.time() - started)))
             # further errors will not have any effect (the entry has been successfully moved or copied out)
             for s in siblings:
                 # we cannot rely on splitext for extensions here (subtitles may have the language code)
                 d = dst_file + s[len(src_file):]
                 try:
                     if self.move:
-                        shutil.move(s, d)
+                        file_ops.move(s, d)
                     else:
-                        shutil.copy(s, d)
+                        file_ops.copy_file(s, d)
                     self.log.info('`%s` has been %s to `%s` as well.' % (s, funct_done, d))
                 except Exception as err:
                     self.log.warning(str(err))
-        entry['output'] = dst
-        if self.move and not src_isdir:
-            self.clean_source(task, config, entry)
+            return finish
+
+        return transfer
+
+    def wait_unpacked(self, config, entry, src):
+        """Waits until the size of `src` stops changing, unless disabled with the unpack_safety option."""
+        if not config.get('unpack_safety', entry.get('unpack_safety', True)):
+            return
+        count = 0
+        while True:
+            if count > 60 * 30:
+                raise plugin.PluginWarning('The task has been waiting unpacking for 30 minutes')
+            size = os.path.getsize(src)
+            time.sleep(1)
+            new_size = os.path.getsize(src)
+            if size != new_size:
+                if not count % 10:
+                    self.log.verbose('File `%s` is possibly being unpacked, waiting ...' % os.path.basename(src))
+            else:
+                break
+            count += 1
 
 
 class CopyFiles(TransformingOps):
@@ -260,7 +313,8 @@ class CopyFiles(TransformingOps):
                     'allow_dir': {'type': 'boolean'},
                     'unpack_safety': {'type': 'boolean'},
                     'keep_extension': {'type': 'boolean'},
-                    'along': {'type': 'array', 'items': {'type': 'string'}}
+                    'along': {'type': 'array', 'items': {'type': 'string'}},
+                    'workers': {'type': 'integer', 'minimum': 1}
                 },
                 'additionalProperties': False
             }
@@ -287,7 +341,8 @@ class MoveFiles(TransformingOps):
                     'unpack_safety': {'type': 'boolean'},
                     'keep_extension': {'type': 'boolean'},
                     'along': {'type': 'array', 'items': {'type': 'string'}},
-                    'clean_source': {'type': 'number'}
+                    'clean_source': {'type': 'number'},
+                    'workers': {'type': 'integer', 'minimum': 1}
                 },
                 'additionalProperties': False
             }
@@ -8,8 +8,8 @@ from flexget import db_schema, plugin
 from flexget.config_schema import process_config
 from flexget.event import event
 from flexget.manager import Session
-from flexget.plugin import PluginError
 from flexget.plugins.filter.series import FilterSeriesBase
+from flexget.utils.inputs import run_inputs
 
 log = logging.getLogger('configure_series')
 Base = db_schema.versioned_base('import_series', 0)
@@ -59,21 +59,7 @@ class ConfigureSeries(FilterSeriesBase):
     def on_task_start(self, task, config):
 
         series = {}
-        for input_name, input_config in config.get('from', {}).iteritems():
-            input = plugin.get_plugin_by_name(input_name)
-            if input.api_ver == 1:
-                raise plugin.PluginError('Plugin %s does not support API v2' % input_name)
-
-            method = input.phase_handlers['input']
-            try:
-                result = method(task, input_config)
-            except PluginError as e:
-                log.warning('Error during input plugin %s: %s' % (input_name, e))
-                continue
-            if not result:
-                log.warning('Input %s did not return anything' % input_name)
-                continue
-
+        for input_name, result in run_inputs(task, config.get('from', {}).items()):
             for entry in result:
                 s = series.setdefault(entry['title'], {})
                 if entry.get('tvdb_id'):
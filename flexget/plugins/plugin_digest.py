@@ -2,19 +2,28 @@ from __future__ import unicode_literals, division, absolute_import
 import logging
 from datetime import datetime
 
-from sqlalchemy import Column, Unicode, PickleType, Integer, DateTime
+from sqlalchemy import Column, Unicode, PickleType, Integer, DateTime, Index
 
-from flexget import plugin
+from flexget import db_schema, plugin
 from flexget.config_schema import one_or_more
-from flexget.db_schema import versioned_base
 from flexget.entry import Entry
 from flexget.event import event
 from flexget.manager import Session
-from flexget.utils.database import safe_pickle_synonym
+from flexget.utils.database import safe_pickle_synonym, only_builtins
+from flexget.utils.sqlalchemy_utils import create_index
 from flexget.utils.tools import parse_timedelta
 
 log = logging.getLogger('digest')
-Base = versioned_base('digest', 0)
+Base = db_schema.versioned_base('digest', 1)
+
+
+@db_schema.upgrade('digest')
+def upgrade(ver, session):
+    if ver == 0:
+        log.info('Creating index on digest_entries table.')
+        create_index('digest_entries', session, 'list', 'added')
+        ver = 1
+    return ver
 
 
 class DigestEntry(Base):
@@ -25,6 +34,8 @@ class DigestEntry(Base):
     _entry = Column('entry', PickleType)
     entry = safe_pickle_synonym('_entry')
 
+Index('ix_digest_entries_list_added', DigestEntry.list, DigestEntry.added)
+
 
 class OutputDigest(object):
     schema = {
@@ -52,13 +63,17 @@ class OutputDigest(object):
 
     def on_task_learn(self, task, config):
         config = self.prepare_config(config)
-        with Session() as session:
-            for entry in task.all_entries:
-                if entry.state not in config['state']:
-                    continue
-                entry['digest_task'] = task.name
-                entry['digest_state'] = entry.state
-                session.add(DigestEntry(list=config['list'], entry=entry))
+        rows = []
+        for entry in task.all_entries:
+            if entry.state not in config['state']:
+                continue
+            entry['digest_task'] = task.name
+            entry['digest_state'] = entry.state
+            rows.append({'list': config['list'], 'entry': only_builtins(entry)})
+        if rows:
+            with Session() as session:
+                # A single executemany instead of flushing an object per entry
+                session.execute(DigestEntry.__table__.insert(), rows)
 
 
 class EmitDigest(object):
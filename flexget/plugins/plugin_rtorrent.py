@@ -19,6 +19,16 @@ from flexget.utils.bittorrent import Torrent, is_torrent_file
 
 log = logging.getLogger('rtorrent')
 
+# By default rtorrent won't allow calls over 512kb in size
+XMLRPC_SIZE_LIMIT = 524288
+XMLRPC_SIZE_BUFFER = 71680
+
+# Clients are kept between tasks and runs, so their connections can be reused
+_clients = {}
+
+# Fault codes of calls to methods rTorrent doesn't know (xmlrpc-c, and the xml-rpc spec)
+METHOD_NOT_FOUND_FAULTS = (-506, -32601)
+
 
 class TimeoutHTTPConnection(httplib.HTTPConnection):
     def __init__(self, host, timeout=30):
@@ -99,13 +109,14 @@ class SCGITransport(xmlrpclib.Transport):
     def parse_response(self, response):
         p, u = self.getparser()
 
-        response_body = ''
+        chunks = []
 
         while True:
-            data = response.read(1024)
+            data = response.read(65536)
             if not data:
                 break
-            response_body += data
+            chunks.append(data)
+        response_body = ''.join(chunks)
 
         if self.verbose:
             log.info('body: %s', repr(response_body))
@@ -204,6 +215,8 @@ class RTorrent(object):
         self.username = username
         self.password = password
         self._version = None
+        # Whether rTorrent knows about d.multicall2, found out on first use
+        self._multicall2 = None
 
         parsed_uri = urlparse(uri)
 
@@ -258,28 +271,54 @@ class RTorrent(object):
 
     @property
     def version(self):
-        return [int(v) for v in self._server.system.client_version().split('.')]
+        if self._version is None:
+            self._version = [int(v) for v in self._server.system.client_version().split('.')]
+        return self._version
 
-    def load(self, raw_torrent, fields=None, start=False, mkdir=True):
+    def close(self):
+        self._server('close')()
 
-        if fields is None:
-            fields = {}
+    def multicall(self, calls):
+        """
+        Run several methods with a single request.
+
+        :param calls: List of ``(method_name, params)`` tuples
+        :return: List with the result of each call, or the :class:`xmlrpclib.Fault` of the calls which failed
+        """
+        if not calls:
+            return []
+        resp = self._server.system.multicall([{'methodName': name, 'params': list(params)} for name, params in calls])
+        results = []
+        for item in resp:
+            if isinstance(item, dict):
+                results.append(xmlrpclib.Fault(item['faultCode'], item['faultString']))
+            else:
+                results.append(item[0])
+        return results
+
+    def _load_params(self, raw_torrent, fields):
         # First param is empty 'target'
         params = ['', xmlrpclib.Binary(raw_torrent)]
 
         # Additional fields to set
-        for key, val in fields.iteritems():
+        for key, val in (fields or {}).iteritems():
             # Values must be escaped if within params
             params.append('d.%s.set=%s' % (key, re.escape(str(val))))
+        return params
+
+    def load(self, raw_torrent, fields=None, start=False, mkdir=True):
+
+        if fields is None:
+            fields = {}
+        params = self._load_params(raw_torrent, fields)
 
         if mkdir and 'directory' in fields:
             result = self._server.execute.throw('', 'mkdir', '-p', fields['directory'])
             if result != 0:
                 raise xmlrpclib.Error('Failed creating directory %s' % fields['directory'])
 
-        # by default rtorrent won't allow calls over 512kb in size.
-        xmlrpc_size = len(xmlrpclib.dumps(tuple(params), 'raw_start')) + 71680  # Add 70kb for buffer
-        if xmlrpc_size > 524288:
+        xmlrpc_size = len(xmlrpclib.dumps(tuple(params), 'raw_start')) + XMLRPC_SIZE_BUFFER
+        if xmlrpc_size > XMLRPC_SIZE_LIMIT:
             prev_size = self._server.network.xmlrpc.size_limit()
             self._server.network.xmlrpc.size_limit.set('', xmlrpc_size)
 
@@ -289,11 +328,59 @@ class RTorrent(object):
         else:
             result = self._server.load.raw(*params)
 
-        if xmlrpc_size > 524288:
+        if xmlrpc_size > XMLRPC_SIZE_LIMIT:
             self._server.network.xmlrpc.size_limit.set('', prev_size)
 
         return result
 
+    def load_many(self, torrents, start=False, mkdir=True):
+        """
+        Load several torrents with as few requests as the xmlrpc size limit of rTorrent allows.
+
+        :param torrents: List of ``(raw_torrent, fields)`` tuples, like the arguments of :meth:`load`
+        :return: List with the result of loading each torrent, or the error it failed with
+        """
+        results = [None] * len(torrents)
+
+        if mkdir:
+            directories = sorted(set(fields['directory'] for raw_torrent, fields in torrents
+                                     if fields and 'directory' in fields))
+            created = self.multicall([('execute.throw', ['', 'mkdir', '-p', directory]) for directory in directories])
+            failed = set(directory for directory, result in zip(directories, created) if result != 0)
+            for i, (raw_torrent, fields) in enumerate(torrents):
+                if fields and fields.get('directory') in failed:
+                    results[i] = xmlrpclib.Error('Failed creating directory %s' % fields['directory'])
+
+        method = 'load.raw_start' if start else 'load.raw'
+        batch = []
+        batch_size = XMLRPC_SIZE_BUFFER
+
+        def flush():
+            for i, result in zip([i for i, params in batch], self.multicall([(method, params) for i, params in batch])):
+                results[i] = result
+            del batch[:]
+
+        for i, (raw_torrent, fields) in enumerate(torrents):
+            if results[i] is not None:
+                continue
+            params = self._load_params(raw_torrent, fields)
+            size = len(xmlrpclib.dumps(tuple(params), method))
+            if size + XMLRPC_SIZE_BUFFER > XMLRPC_SIZE_LIMIT:
+                # Too big to batch, load raises the size limit just for this one
+                try:
+                    results[i] = self.load(raw_torrent, fields=fields, start=start, mkdir=False)
+                except (IOError, xmlrpclib.Error) as e:
+                    results[i] = e
+                continue
+            if batch_size + size > XMLRPC_SIZE_LIMIT:
+                flush()
+                batch_size = XMLRPC_SIZE_BUFFER
+            batch.append((i, params))
+            batch_size += size
+        flush()
+
+        return results
+
     def torrent(self, info_hash, fields=None):
         """ Get the details of a torrent """
         if not fields:
@@ -311,15 +398,47 @@ class RTorrent(object):
         # TODO: Maybe we should return a named tuple or a Torrent class?
         return dict(zip(self._clean_fields(fields, reverse=True), [val for val in resp]))
 
+    def torrents_info(self, info_hashes, fields=None):
+        """
+        Get the details of several torrents with a single request.
+
+        :return: Dict from info hash to the details of the torrent, torrents unknown to rTorrent are left out
+        """
+        fields = self._clean_fields(list(fields or self.default_fields))
+        names = self._clean_fields(list(fields), reverse=True)
+
+        results = self.multicall([('d.%s' % field, [info_hash]) for info_hash in info_hashes for field in fields])
+
+        torrents = {}
+        for i, info_hash in enumerate(info_hashes):
+            values = results[i * len(fields):(i + 1) * len(fields)]
+            if any(isinstance(value, xmlrpclib.Fault) for value in values):
+                continue
+            torrents[info_hash] = dict(zip(names, values))
+        return torrents
+
     def torrents(self, view='main', fields=None):
         if not fields:
             fields = list(self.default_fields)
         fields = self._clean_fields(fields)
 
         params = ['d.%s=' % field for field in fields]
-        params.insert(0, view)
 
-        resp = self._server.d.multicall(params)
+        resp = None
+        if self._multicall2 is not False:
+            try:
+                # First param is empty 'target'
+                resp = self._server.d.multicall2('', view, *params)
+                self._multicall2 = True
+            except xmlrpclib.Fault as e:
+                # Other faults, eg. for an unknown view, don't tell whether d.multicall2 is supported
+                if self._multicall2 or e.faultCode not in METHOD_NOT_FOUND_FAULTS:
+                    raise
+                log.debug('d.multicall2 not supported by rTorrent, using d.multicall')
+                self._multicall2 = False
+        if not self._multicall2:
+            params.insert(0, view)
+            resp = self._server.d.multicall(params)
 
         # Response is formatted as a list of lists, with just the values
         return [dict(zip(self._clean_fields(fields, reverse=True), val)) for val in resp]
@@ -333,9 +452,31 @@ class RTorrent(object):
 
         return multi_call()[0]
 
+    def update_many(self, updates):
+        """
+        Update several torrents with a single request.
+
+        :param updates: Dict from info hash to the fields to set, like the arguments of :meth:`update`
+        :return: Dict from info hash to the result of updating it, or the fault of the first field which failed
+        """
+        calls = []
+        for info_hash, fields in updates.iteritems():
+            for key, val in fields.iteritems():
+                calls.append((info_hash, ('d.%s.set' % key, [info_hash, str(val)])))
+
+        results = dict((info_hash, 0) for info_hash in updates)
+        for (info_hash, call), result in zip(calls, self.multicall([call for info_hash, call in calls])):
+            if not isinstance(results[info_hash], xmlrpclib.Fault):
+                results[info_hash] = result
+        return results
+
     def delete(self, info_hash):
         return self._server.d.erase(info_hash)
 
+    def delete_many(self, info_hashes):
+        """Delete several torrents with a single request, returns a list with the result of each delete."""
+        return self.multicall([('d.erase', [info_hash]) for info_hash in info_hashes])
+
     def stop(self, info_hash):
         self._server.d.stop(info_hash)
         return self._server.d.close(info_hash)
@@ -344,19 +485,23 @@ class RTorrent(object):
         return self._server.d.start(info_hash)
 
     def move(self, info_hash, dst_path):
-        self.stop(info_hash)
-
-        torrent = self.torrent(info_hash, fields=['base_path'])
-
-        try:
-            log.verbose('Creating destination directory `%s`' % dst_path)
-            self._server.execute.throw('', 'mkdir', '-p', dst_path)
-        except xmlrpclib.Error:
+        log.verbose('Creating destination directory `%s`' % dst_path)
+        stopped, closed, base_path, created = self.multicall([
+            ('d.stop', [info_hash]),
+            ('d.close', [info_hash]),
+            ('d.base_path', [info_hash]),
+            ('execute.throw', ['', 'mkdir', '-p', dst_path]),
+        ])
+        for result in (stopped, closed, base_path):
+            if isinstance(result, xmlrpclib.Fault):
+                raise result
+        if isinstance(created, xmlrpclib.Fault):
             raise xmlrpclib.Error("unable to create folder %s" % dst_path)
 
-        self._server.execute.throw('', 'mv', '-u', torrent['base_path'], dst_path)
-        self._server.d.set_directory(info_hash, dst_path)
-        self.start(info_hash)
+        self._server.execute.throw('', 'mv', '-u', base_path, dst_path)
+        for result in self.multicall([('d.directory.set', [info_hash, dst_path]), ('d.start', [info_hash])]):
+            if isinstance(result, xmlrpclib.Fault):
+                raise result
 
 
 class RTorrentPluginBase(object):
@@ -404,10 +549,17 @@ class RTorrentPluginBase(object):
 
         return options
 
+    def get_client(self, config):
+        """Get the client for the rTorrent in `config`, its connection is reused by following tasks."""
+        key = (config['uri'], config.get('username'), config.get('password'), config.get('timeout'))
+        if key not in _clients:
+            _clients[key] = RTorrent(config['uri'], username=config.get('username'),
+                                     password=config.get('password'), timeout=config.get('timeout'))
+        return _clients[key]
+
     def on_task_start(self, task, config):
         try:
-            client = RTorrent(config['uri'], username=config.get('username'),
-                              password=config.get('password'), timeout=config.get('timeout'))
+            client = self.get_client(config)
             if client.version < [0, 9, 2]:
                 log.error('rtorrent version >=0.9.2 required, found {0}'.format('.'.join(map(str, client.version))))
                 task.abort('rtorrent version >=0.9.2 required, found {0}'.format('.'.join(map(str, client.version))))
@@ -442,13 +594,19 @@ class RTorrentOutputPlugin(RTorrentPluginBase):
         'additionalProperties': False,
     }
 
-    def _verify_load(self, client, info_hash):
+    def _verify_load(self, client, info_hashes):
+        """Waits for rTorrent to know about loaded torrents, returns the info hashes of those which didn't show up."""
+        missing = list(info_hashes)
         for i in range(0, 5):
             try:
-                return client.torrent(info_hash, fields=['hash'])
-            except (IOError, xmlrpclib.Error):
-                sleep(0.5)
-        raise
+                found = client.torrents_info(missing, fields=['hash'])
+                missing = [info_hash for info_hash in missing if info_hash not in found]
+            except (IOError, xmlrpclib.Error) as e:
+                log.debug('Failed to check loaded torrents: %s' % e)
+            if not missing:
+                break
+            sleep(0.5)
+        return missing
 
     def on_task_download(self, task, config):
         # If the download plugin is not enabled, we need to call it to get
@@ -458,148 +616,199 @@ class RTorrentOutputPlugin(RTorrentPluginBase):
             download.instance.get_temp_files(task, handle_magnets=True, fail_html=True)
 
     def on_task_output(self, task, config):
-        client = RTorrent(config['uri'], username=config.get('username'),
-                          password=config.get('password'), timeout=config.get('timeout'))
+        client = self.get_client(config)
 
+        entries = []
         for entry in task.accepted:
             if task.options.test:
                 log.info('Would add %s to rTorrent' % entry['url'])
                 continue
 
             if config['action'] == 'add':
+                if 'torrent_info_hash' not in entry:
+                    entry.fail('missing torrent_info_hash')
+                    continue
                 try:
                     options = self._build_options(config, entry)
                 except RenderError as e:
                     entry.fail("failed to render properties %s" % str(e))
                     continue
+                torrent_raw = self.read_torrent(entry)
+                if torrent_raw is not None:
+                    entries.append((entry, torrent_raw, options))
+                continue
 
-                self.add_entry(client, entry, options, start=config['start'], mkdir=config['mkdir'])
-
-            info_hash = entry.get('torrent_info_hash')
-
-            if not info_hash:
+            if not entry.get('torrent_info_hash'):
                 entry.fail('Failed to %s as no info_hash found' % config['action'])
                 continue
+            entries.append(entry)
 
-            if config['action'] == 'delete':
-                self.delete_entry(client, entry)
+        if not entries:
+            return
 
-            if config['action'] == 'update':
-                self.update_entry(client, entry, config)
+        # Each action works on all the entries at once, to save round trips to rTorrent
+        if config['action'] == 'add':
+            self.add_entries(client, entries, start=config['start'], mkdir=config['mkdir'])
+        elif config['action'] == 'delete':
+            self.delete_entries(client, entries)
+        elif config['action'] == 'update':
+            self.update_entries(client, entries, config)
 
-    def delete_entry(self, client, entry):
+    def delete_entries(self, client, entries):
         try:
-            client.delete(entry['torrent_info_hash'])
-            log.verbose('Deleted %s (%s) in rtorrent ' % (entry['title'], entry['torrent_info_hash']))
+            results = client.delete_many([entry['torrent_info_hash'] for entry in entries])
         except (IOError, xmlrpclib.Error) as e:
-            entry.fail('Failed to delete: %s' % str(e))
+            for entry in entries:
+                entry.fail('Failed to delete: %s' % str(e))
             return
 
-    def update_entry(self, client, entry, config):
-        info_hash = entry['torrent_info_hash']
+        for entry, result in zip(entries, results):
+            if isinstance(result, xmlrpclib.Fault):
+                entry.fail('Failed to delete: %s' % str(result))
+                continue
+            log.verbose('Deleted %s (%s) in rtorrent ' % (entry['title'], entry['torrent_info_hash']))
 
-        # First check if it already exists
+    def update_entries(self, client, entries, config):
+        # First check which already exist
         try:
-            existing = client.torrent(info_hash, fields=['base_path'])
-        except IOError as e:
-            entry.fail("Error updating torrent %s" % str(e))
+            existing = client.torrents_info([entry['torrent_info_hash'] for entry in entries], fields=['base_path'])
+        except (IOError, xmlrpclib.Error) as e:
+            for entry in entries:
+                entry.fail("Error updating torrent %s" % str(e))
             return
-        except xmlrpclib.Error as e:
-            existing = False
 
-        # Build options but make config values override entry values
-        try:
-            options = self._build_options(config, entry, entry_first=False)
-        except RenderError as e:
-            entry.fail("failed to render properties %s" % str(e))
-            return
+        updates = {}
+        for entry in entries:
+            info_hash = entry['torrent_info_hash']
 
-        if existing and 'directory' in options:
-            # Check if changing to another directory which requires a move
-            if options['directory'] != existing['base_path']\
-                    and options['directory'] != os.path.dirname(existing['base_path']):
-                try:
-                    log.verbose("Path is changing, moving files from '%s' to '%s'"
-                                % (existing['base_path'], options['directory']))
-                    client.move(info_hash, options['directory'])
-                except (IOError, xmlrpclib.Error) as e:
-                    entry.fail('Failed moving torrent: %s' % str(e))
-                    return
+            # Build options but make config values override entry values
+            try:
+                options = self._build_options(config, entry, entry_first=False)
+            except RenderError as e:
+                entry.fail("failed to render properties %s" % str(e))
+                continue
 
-        # Remove directory from update otherwise rTorrent will append the title to the directory path
-        if 'directory' in options:
-            del options['directory']
+            torrent = existing.get(info_hash)
+            if torrent and 'directory' in options:
+                # Check if changing to another directory which requires a move
+                if options['directory'] != torrent['base_path']\
+                        and options['directory'] != os.path.dirname(torrent['base_path']):
+                    try:
+                        log.verbose("Path is changing, moving files from '%s' to '%s'"
+                                    % (torrent['base_path'], options['directory']))
+                        client.move(info_hash, options['directory'])
+                    except (IOError, xmlrpclib.Error) as e:
+                        entry.fail('Failed moving torrent: %s' % str(e))
+                        continue
+
+            # Remove directory from update otherwise rTorrent will append the title to the directory path
+            if 'directory' in options:
+                del options['directory']
+
+            updates[info_hash] = options
+
+        if not updates:
+            return
 
         try:
-            client.update(info_hash, options)
-            log.verbose('Updated %s (%s) in rtorrent ' % (entry['title'], info_hash))
+            results = client.update_many(updates)
         except (IOError, xmlrpclib.Error) as e:
-            entry.fail('Failed to update: %s' % str(e))
-            return
+            results = dict((info_hash, e) for info_hash in updates)
 
-    def add_entry(self, client, entry, options, start=True, mkdir=False):
+        for entry in entries:
+            info_hash = entry['torrent_info_hash']
+            if info_hash not in results:
+                continue
+            if isinstance(results[info_hash], Exception):
+                entry.fail('Failed to update: %s' % str(results[info_hash]))
+                continue
+            log.verbose('Updated %s (%s) in rtorrent ' % (entry['title'], info_hash))
 
-        if 'torrent_info_hash' not in entry:
-            entry.fail('missing torrent_info_hash')
+    def read_torrent(self, entry):
+        """Returns the raw torrent to load for `entry`, or fails the entry and returns None."""
+        if entry['url'].startswith('magnet:'):
+            return 'd10:magnet-uri%d:%se' % (len(entry['url']), entry['url'])
+
+        # Check that file is downloaded
+        if 'file' not in entry:
+            entry.fail('file missing?')
             return
 
-        if entry['url'].startswith('magnet:'):
-            torrent_raw = 'd10:magnet-uri%d:%se' % (len(entry['url']), entry['url'])
-        else:
-            # Check that file is downloaded
-            if 'file' not in entry:
-                entry.fail('file missing?')
-                return
+        # Verify the temp file exists
+        if not os.path.exists(entry['file']):
+            entry.fail("Downloaded temp file '%s' doesn't exist!?" % entry['file'])
+            return
+
+        # Verify valid torrent file
+        if not is_torrent_file(entry['file']):
+            entry.fail("Downloaded temp file '%s' is not a torrent file" % entry['file'])
+            return
 
-            # Verify the temp file exists
-            if not os.path.exists(entry['file']):
-                entry.fail("Downloaded temp file '%s' doesn't exist!?" % entry['file'])
-                return
+        try:
+            with open(entry['file'], 'rb') as f:
+                torrent_raw = f.read()
+        except IOError as e:
+            entry.fail('Failed to add to rTorrent %s' % str(e))
+            return
 
-            # Verify valid torrent file
-            if not is_torrent_file(entry['file']):
-                entry.fail("Downloaded temp file '%s' is not a torrent file" % entry['file'])
-                return
+        try:
+            Torrent(torrent_raw)
+        except SyntaxError as e:
+            entry.fail('Strange, unable to decode torrent, raise a BUG: %s' % str(e))
+            return
 
-            try:
-                with open(entry['file'], 'rb') as f:
-                    torrent_raw = f.read()
-            except IOError as e:
-                entry.fail('Failed to add to rTorrent %s' % str(e))
-                return
+        return torrent_raw
 
-            try:
-                Torrent(torrent_raw)
-            except SyntaxError as e:
-                entry.fail('Strange, unable to decode torrent, raise a BUG: %s' % str(e))
-                return
+    def add_entries(self, client, entries, start=True, mkdir=False):
+        """
+        Loads the torrents of `entries` into rTorrent.
 
-        # First check if it already exists
+        :param entries: List of ``(entry, raw_torrent, options)`` tuples
+        """
+        # First check which already exist
         try:
-            if client.torrent(entry['torrent_info_hash']):
+            existing = client.torrents_info([entry['torrent_info_hash'] for entry, raw, options in entries],
+                                            fields=['hash'])
+        except (IOError, xmlrpclib.Error) as e:
+            for entry, raw, options in entries:
+                entry.fail("Error checking if torrent already exists %s" % str(e))
+            return
+
+        to_load = []
+        for entry, torrent_raw, options in entries:
+            if entry['torrent_info_hash'] in existing:
                 log.warning("Torrent %s already exists, won't add" % entry['title'])
-                return
-        except IOError as e:
-            entry.fail("Error checking if torrent already exists %s" % str(e))
-        except xmlrpclib.Error:
-            # No existing found
-            pass
+                continue
+            to_load.append((entry, torrent_raw, options))
+        if not to_load:
+            return
 
         try:
-            resp = client.load(torrent_raw, fields=options, start=start, mkdir=mkdir)
-            if resp != 0:
-                entry.fail('Failed to add to rTorrent invalid return value %s' % resp)
+            results = client.load_many([(raw, options) for entry, raw, options in to_load], start=start, mkdir=mkdir)
         except (IOError, xmlrpclib.Error) as e:
             log.exception(e)
-            entry.fail('Failed to add to rTorrent %s' % str(e))
+            for entry, raw, options in to_load:
+                entry.fail('Failed to add to rTorrent %s' % str(e))
             return
 
-        # Verify the torrent loaded
-        try:
-            self._verify_load(client, entry['torrent_info_hash'])
+        loaded = []
+        for (entry, raw, options), result in zip(to_load, results):
+            if isinstance(result, Exception):
+                entry.fail('Failed to add to rTorrent %s' % str(result))
+            elif result != 0:
+                entry.fail('Failed to add to rTorrent invalid return value %s' % result)
+            else:
+                loaded.append(entry)
+        if not loaded:
+            return
+
+        # Verify the torrents loaded
+        missing = self._verify_load(client, [entry['torrent_info_hash'] for entry in loaded])
+        for entry in loaded:
+            if entry['torrent_info_hash'] in missing:
+                entry.fail('Failed to verify torrent loaded')
+                continue
             log.info('%s added to rtorrent' % entry['title'])
-        except (IOError, xmlrpclib.Error) as e:
-            entry.fail('Failed to verify torrent loaded: %s' % str(e))
 
     def on_task_exit(self, task, config):
         """ Make sure all temp files are cleaned up when task exists """
@@ -628,8 +837,7 @@ class RTorrentInputPlugin(RTorrentPluginBase):
     }
 
     def on_task_input(self, task, config):
-        client = RTorrent(config['uri'], username=config.get('username'),
-                          password=config.get('password'), timeout=config.get('timeout'))
+        client = self.get_client(config)
 
         fields = config.get('fields')
 
@@ -657,6 +865,16 @@ class RTorrentInputPlugin(RTorrentPluginBase):
         return entries
 
 
+@event('manager.shutdown')
+def close_clients(manager):
+    for client in _clients.itervalues():
+        try:
+            client.close()
+        except Exception as e:
+            log.debug('Failed to close rtorrent client (%s)' % e)
+    _clients.clear()
+
+
 @event('plugin.register')
 def register_plugin():
     plugin.register(RTorrentOutputPlugin, 'rtorrent', api_ver=2)
@@ -1,11 +1,14 @@
 from __future__ import unicode_literals, division, absolute_import
 from urlparse import urljoin, urlparse
-from collections import namedtuple
-from itertools import groupby
+from collections import namedtuple, defaultdict
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 import logging
 import os
 import posixpath
-from functools import partial
+import shutil
+import stat
+import threading
 import time
 from flexget import plugin
 from flexget.event import event
@@ -24,6 +27,11 @@ RETRY_INTERVAL = 15
 RETRY_STEP = 5
 SOCKET_TIMEOUT = 15
 
+# Larger ssh channel window than paramiko's default, so pipelined reads and writes don't stall on high latency links
+WINDOW_SIZE = 16 * 1024 * 1024
+# Block size used when copying between local and remote files
+TRANSFER_BLOCK_SIZE = 1024 * 1024
+
 # make separate path instances for local vs remote path styles
 localpath = os.path
 remotepath = posixpath  # pysftp uses POSIX style paths
@@ -49,6 +57,10 @@ def sftp_connect(conf):
             sftp = pysftp.Connection(host=conf.host, username=conf.username,
                                      private_key=conf.private_key, password=conf.password,
                                      port=conf.port, private_key_pass=conf.private_key_pass)
+            # pysftp opens the sftp channel on first use, which takes its window size from the transport
+            transport = getattr(sftp, '_transport', None)
+            if transport is not None:
+                transport.default_window_size = WINDOW_SIZE
             sftp.timeout = SOCKET_TIMEOUT
             log.verbose('Connected to %s' % conf.host)
         except Exception as e:
@@ -65,25 +77,172 @@ def sftp_connect(conf):
     return sftp
 
 
-def sftp_from_config(config):
+class ConnectionPool(object):
+    """
+    Idle SFTP connections by :class:`ConnectionConfig`, so they can be reused by transfer workers and the following
+    tasks of a run.
+    """
+
+    def __init__(self):
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def get(self, conf):
+        """Returns an idle connection to the server of `conf`, or connects a new one."""
+        with self._lock:
+            if self._idle[conf]:
+                return self._idle[conf].pop()
+        return sftp_connect(conf)
+
+    def put(self, conf, sftp):
+        """Hands a connection which isn't used anymore back to the pool."""
+        with self._lock:
+            self._idle[conf].append(sftp)
+
+    def discard(self, sftp):
+        """Closes a connection which might be broken, instead of handing it back to the pool."""
+        try:
+            sftp.close()
+        except Exception as e:
+            log.debug('Failed to close connection (%s)' % e)
+
+    @contextmanager
+    def connection(self, conf):
+        sftp = self.get(conf)
+        try:
+            yield sftp
+        except Exception:
+            # Connection might be broken, don't hand it out again
+            self.discard(sftp)
+            raise
+        self.put(conf, sftp)
+
+    def close(self):
+        with self._lock:
+            connections = [sftp for idle in self._idle.itervalues() for sftp in idle]
+            self._idle.clear()
+        for sftp in connections:
+            self.discard(sftp)
+
+
+pool = ConnectionPool()
+
+
+@event('manager.execute.completed')
+def close_connections(manager, options):
+    pool.close()
+
+
+def connection_config(config):
     """
-    Creates an SFTP connection from a Flexget config object 
+    Creates a :class:`ConnectionConfig` from a Flexget config object
     """
-    host = config['host']
-    port = config['port']
-    username = config['username']
-    password = config['password']
-    private_key = config['private_key']
-    private_key_pass = config['private_key_pass']
+    return ConnectionConfig(config['host'], config['port'], config['username'], config['password'],
+                            config['private_key'], config['private_key_pass'])
 
-    conn_conf = ConnectionConfig(host, port, username, password, private_key, private_key_pass)
 
+@contextmanager
+def sftp_from_config(config):
+    """
+    Gets an SFTP connection for a Flexget config object from the pool
+    """
+    conf = connection_config(config)
     try:
-        sftp = sftp_connect(conn_conf)
+        sftp = pool.get(conf)
     except Exception as e:
-        raise plugin.PluginError('Failed to connect to %s (%s)' % (host, e))
+        raise plugin.PluginError('Failed to connect to %s (%s)' % (conf.host, e))
+    try:
+        yield sftp
+    except Exception:
+        pool.discard(sftp)
+        raise
+    pool.put(conf, sftp)
 
-    return sftp
+
+class RemoteTree(object):
+    """
+    Listing of remote directories. Each directory is listed once, along with the attributes of its contents, rather
+    than with a stat per node.
+    """
+
+    def __init__(self, sftp):
+        self.sftp = sftp
+        self._listings = {}
+        self._sizes = {}
+
+    def listdir(self, path):
+        """Returns ``(path, attributes)`` of the contents of `path`, with symlinks resolved."""
+        if path not in self._listings:
+            nodes = []
+            for attr in self.sftp.listdir_attr(path):
+                node_path = remotepath.join(path, attr.filename)
+                if stat.S_ISLNK(attr.st_mode):
+                    try:
+                        attr = self.sftp.stat(node_path)
+                    except IOError:
+                        log.debug('Broken symlink %s' % node_path)
+                nodes.append((node_path, attr))
+            self._listings[path] = nodes
+        return self._listings[path]
+
+    def walk(self, path, recursive=True):
+        """Yields ``(path, attributes)`` of everything in `path`, each directory before its contents."""
+        for node_path, attr in self.listdir(path):
+            yield node_path, attr
+            if recursive and stat.S_ISDIR(attr.st_mode):
+                for node in self.walk(node_path):
+                    yield node
+
+    def size(self, path, attr):
+        """Returns the size of a file, or the total size of the files in a directory."""
+        if not stat.S_ISDIR(attr.st_mode):
+            return attr.st_size
+        if path not in self._sizes:
+            self._sizes[path] = sum(self.size(node_path, node_attr) for node_path, node_attr in self.listdir(path))
+        return self._sizes[path]
+
+
+def download_file(sftp, path, destination, size=None):
+    """
+    Downloads a remote file, with the reads pipelined
+    """
+    with sftp.open(path, 'rb') as remote:
+        remote.prefetch(size)
+        with open(destination, 'wb') as local:
+            shutil.copyfileobj(remote, local, TRANSFER_BLOCK_SIZE)
+
+
+def upload_file(sftp, location, destination):
+    """
+    Uploads a local file, with the writes pipelined
+    """
+    with open(location, 'rb') as local:
+        with sftp.open(destination, 'wb') as remote:
+            remote.set_pipelined(True)
+            shutil.copyfileobj(local, remote, TRANSFER_BLOCK_SIZE)
+
+
+def run_transfers(transfer, jobs, workers):
+    """
+    Runs `transfer` for each of `jobs` in a pool of `workers` threads, yields ``(job, error)`` as they finish.
+    """
+    if not jobs:
+        return
+
+    def run(job):
+        try:
+            transfer(*job)
+        except Exception as e:
+            return job, e
+        return job, None
+
+    threads = ThreadPool(min(workers, len(jobs)))
+    try:
+        for result in threads.imap_unordered(run, jobs):
+            yield result
+    finally:
+        threads.close()
+        threads.join()
 
 
 def sftp_prefix(config):
@@ -128,7 +287,7 @@ class SftpList(object):
     private_key_pass:     Password for the private key (if needed)
     recursive:            Indicates whether the listing should be recursive
     get_size:             Indicates whetern to calculate the size of the remote file/directory.
-                          WARNING: This can be very slow when computing the size of directories!
+                          WARNING: This lists everything inside the directories, which can be slow for large trees!
     files_only:           Indicates wheter to omit diredtories from the results.
     dirs:                 List of directories to download
 
@@ -196,49 +355,20 @@ class SftpList(object):
 
         log.debug('Connecting to %s' % config['host'])
 
-        sftp = sftp_from_config(config)
         url_prefix = sftp_prefix(config)
 
         entries = []
 
-        def file_size(path):
-            """
-            Helper function to get the size of a node
-            """
-            return sftp.lstat(path).st_size
-
-        def dir_size(path):
-            """
-            Walk a directory to get its size
-            """
-            sizes = []
-
-            def node_size(f):
-                sizes.append(file_size(f))
-
-            sftp.walktree(path, node_size, node_size, node_size, True)
-            size = sum(sizes)
-
-            return size
-
-        def handle_node(path, size_handler, is_dir):
+        def handle_node(path, size):
             """
             Generic helper function for handling a remote file system node
             """
-            if is_dir and files_only:
-                return
-
-            url = urljoin(url_prefix, sftp.normalize(path))
+            url = urljoin(url_prefix, path)
             title = remotepath.basename(path)
 
             entry = Entry(title, url)
 
             if get_size:
-                try:
-                    size = size_handler(path)
-                except Exception as e:
-                    log.error('Failed to get size for %s (%s)' % (path, e))
-                    size = -1
                 entry['content_size'] = size
 
             if private_key:
@@ -248,25 +378,31 @@ class SftpList(object):
 
             entries.append(entry)
 
-        # create helper functions to handle files and directories
-        handle_file = partial(handle_node, size_handler=file_size, is_dir=False)
-        handle_dir = partial(handle_node, size_handler=dir_size, is_dir=True)
-
-        def handle_unknown(path):
-            """
-            Skip unknown files
-            """
-            log.warn('Skipping unknown file: %s' % path)
-
         # the business end
-        for dir in dirs:
-            try:
-                sftp.walktree(dir, handle_file, handle_dir, handle_unknown, recursive)
-            except IOError as e:
-                log.error('Failed to open %s (%s)' % (dir, e))
-                continue
-
-        sftp.close()
+        with sftp_from_config(config) as sftp:
+            # Sizes of directories are computed from the listing of the whole tree, which is done only once
+            tree = RemoteTree(sftp)
+            for dir in dirs:
+                try:
+                    dir = sftp.normalize(dir)
+                    for path, attr in tree.walk(dir, recursive):
+                        if stat.S_ISDIR(attr.st_mode):
+                            if files_only:
+                                continue
+                        elif not stat.S_ISREG(attr.st_mode):
+                            log.warn('Skipping unknown file: %s' % path)
+                            continue
+                        size = None
+                        if get_size:
+                            try:
+                                size = tree.size(path, attr)
+                            except Exception as e:
+                                log.error('Failed to get size for %s (%s)' % (path, e))
+                                size = -1
+                        handle_node(path, size)
+                except IOError as e:
+                    log.error('Failed to open %s (%s)' % (dir, e))
+                    continue
 
         return entries
 
@@ -283,6 +419,7 @@ class SftpDownload(object):
                         metainfo_series or similar.
     recursive:          Indicates wether to download directory contents recursively.
     delete_origin:      Indicates wether to delete the remote files(s) once they've been downloaded.
+    workers:            Number of files downloaded at the same time, each over its own connection. Defaults to 4.
 
     Example:
 
@@ -296,7 +433,8 @@ class SftpDownload(object):
         'properties': {
             'to': {'type': 'string', 'format': 'path'},
             'recursive': {'type': 'boolean', 'default': True},
-            'delete_origin': {'type': 'boolean', 'default': False}
+            'delete_origin': {'type': 'boolean', 'default': False},
+            'workers': {'type': 'integer', 'minimum': 1, 'default': 4}
         },
         'required': ['to'],
         'additionalProperties': False
@@ -325,54 +463,40 @@ class SftpDownload(object):
 
         return config
 
-    def download_file(self, path, dest, sftp, delete_origin):
+    def download_file(self, sftp_config, path, destination, size, delete_origin):
         """
-        Download a file from path to dest
+        Download a file from path to destination. Runs in a worker thread.
         """
-        dir_name = remotepath.dirname(path)
-        dest_relpath = localpath.join(*remotepath.split(path))  # convert remote path style to local style
-        destination = localpath.join(dest, dest_relpath)
-        dest_dir = localpath.dirname(destination)
-
         if localpath.exists(destination):
             log.verbose('Destination file already exists. Skipping %s' % path)
             return
 
-        if not localpath.exists(dest_dir):
+        dest_dir = localpath.dirname(destination)
+        try:
             os.makedirs(dest_dir)
+        except OSError:
+            # Might have been created by another worker in the meantime
+            if not localpath.isdir(dest_dir):
+                raise
 
         log.verbose('Downloading file %s to %s' % (path, destination))
 
-        try:
-            sftp.get(path, destination)
-        except Exception as e:
-            log.error('Failed to download %s (%s)' % (path, e))
-            if localpath.exists(destination):
-                log.debug('Removing partially downloaded file %s' % destination)
-                os.remove(destination)
-            raise e
-
-        if delete_origin:
-            log.debug('Deleting remote file %s' % path)
+        with pool.connection(sftp_config) as sftp:
             try:
-                sftp.remove(path)
+                download_file(sftp, path, destination, size)
             except Exception as e:
-                log.error('Failed to delete file %s (%s)' % (path, e))
-                return
-
-            self.remove_dir(sftp, dir_name)
-
-    def handle_dir(self, path):
-        """
-        Dummy directory handler. Does nothing.
-        """
-        pass
+                log.error('Failed to download %s (%s)' % (path, e))
+                if localpath.exists(destination):
+                    log.debug('Removing partially downloaded file %s' % destination)
+                    os.remove(destination)
+                raise e
 
-    def handle_unknown(self, path):
-        """
-        Dummy unknown file handler. Warns about unknown files.
-        """
-        log.warn('Skipping unknown file %s' % path)
+            if delete_origin:
+                log.debug('Deleting remote file %s' % path)
+                try:
+                    sftp.remove(path)
+                except Exception as e:
+                    log.error('Failed to delete file %s (%s)' % (path, e))
 
     def remove_dir(self, sftp, path):
         """
@@ -385,13 +509,13 @@ class SftpDownload(object):
             except Exception as e:
                 log.error('Failed to delete directory %s (%s)' % (path, e))
 
-    def download_entry(self, entry, config, sftp):
+    def get_downloads(self, entry, config, sftp, tree):
         """
-        Downloads the file(s) described in entry
+        Returns the ``(remote path, destination, size)`` of the file(s) described in entry, and the remote directories
+        to remove once they are downloaded.
         """
 
         path = urlparse(entry['url']).path or '.'
-        delete_origin = config['delete_origin']
         recursive = config['recursive']
 
         to = config['to']
@@ -401,41 +525,44 @@ class SftpDownload(object):
             except RenderError as e:
                 log.error('Could not render path: %s' % to)
                 entry.fail(e)
-                return
+                return [], []
 
-        if not sftp.lexists(path):
+        try:
+            attr = sftp.stat(path)
+        except IOError:
             log.error('Remote path does not exist: %s' % path)
-            return
+            return [], []
 
-        if sftp.isfile(path):
-            source_file = remotepath.basename(path)
-            source_dir = remotepath.dirname(path)
-            try:
-                sftp.cwd(source_dir)
-                self.download_file(source_file, to, sftp, delete_origin)
-            except Exception as e:
-                error = 'Failed to download file %s (%s)' % (path, e)
-                log.error(error)
-                entry.fail(error)
-        elif sftp.isdir(path):
-            base_path = remotepath.normpath(remotepath.join(path, '..'))
+        if stat.S_ISREG(attr.st_mode):
+            destination = localpath.join(to, remotepath.basename(path))
+            return [(path, destination, attr.st_size)], [remotepath.dirname(path)]
+        elif stat.S_ISDIR(attr.st_mode):
+            path = remotepath.normpath(path)
             dir_name = remotepath.basename(path)
-            handle_file = partial(self.download_file, dest=to, sftp=sftp, delete_origin=delete_origin)
+            downloads = []
+            dirs = [path]
 
             try:
-                sftp.cwd(base_path)
-                sftp.walktree(dir_name, handle_file, self.handle_dir, self.handle_unknown, recursive)
+                for node_path, node_attr in tree.walk(path, recursive):
+                    if stat.S_ISDIR(node_attr.st_mode):
+                        dirs.append(node_path)
+                    elif stat.S_ISREG(node_attr.st_mode):
+                        # convert remote path style to local style
+                        relpath = node_path[len(path):].lstrip('/').split('/')
+                        destination = localpath.join(to, dir_name, *relpath)
+                        downloads.append((node_path, destination, node_attr.st_size))
+                    else:
+                        log.warn('Skipping unknown file %s' % node_path)
             except Exception as e:
                 error = 'Failed to download directory %s (%s)' % (path, e)
                 log.error(error)
                 entry.fail(error)
+                return [], []
 
-                return
-
-            if delete_origin:
-                self.remove_dir(sftp, path)
+            return downloads, dirs
         else:
             log.warn('Skipping unknown file %s' % path)
+            return [], []
 
     def on_task_download(self, task, config):
         """
@@ -443,26 +570,65 @@ class SftpDownload(object):
         """
         dependency_check()
 
-        # Download entries by host so we can reuse the connection
-        for sftp_config, entries in groupby(task.accepted, self.get_sftp_config):
-            if not sftp_config:
-                continue
+        delete_origin = config['delete_origin']
+        # Connection and listing for each server, shared by its entries while collecting the files to download
+        connections = {}
+        connect_errors = {}
+        jobs = []
+        entry_dirs = []
+        try:
+            for entry in task.accepted:
+                sftp_config = self.get_sftp_config(entry)
+                if not sftp_config:
+                    continue
+
+                if sftp_config not in connections and sftp_config not in connect_errors:
+                    try:
+                        sftp = pool.get(sftp_config)
+                        connections[sftp_config] = sftp, RemoteTree(sftp)
+                    except Exception as e:
+                        connect_errors[sftp_config] = 'Failed to connect to %s (%s)' % (sftp_config.host, e)
+                        log.error(connect_errors[sftp_config])
+                if sftp_config in connect_errors:
+                    entry.fail(connect_errors[sftp_config])
+                    continue
+
+                sftp, tree = connections[sftp_config]
+                try:
+                    downloads, dirs = self.get_downloads(entry, config, sftp, tree)
+                except Exception:
+                    # Connection might be broken, don't hand it out again
+                    del connections[sftp_config]
+                    pool.discard(sftp)
+                    raise
+                for path, destination, size in downloads:
+                    jobs.append((entry, sftp_config, path, destination, size))
+                if delete_origin:
+                    entry_dirs.append((entry, sftp_config, dirs))
+        finally:
+            for sftp_config, (sftp, tree) in connections.iteritems():
+                pool.put(sftp_config, sftp)
+
+        # Files of all the entries are downloaded concurrently, the pool hands each worker its own connection
+        def transfer(entry, sftp_config, path, destination, size):
+            self.download_file(sftp_config, path, destination, size, delete_origin)
+
+        for (entry, sftp_config, path, destination, size), error in run_transfers(transfer, jobs, config['workers']):
+            if error and not entry.failed:
+                error = 'Failed to download file %s (%s)' % (path, error)
+                log.error(error)
+                entry.fail(error)
 
-            error_message = None
-            sftp = None
+        for entry, sftp_config, dirs in entry_dirs:
+            if entry.failed:
+                continue
             try:
-                sftp = sftp_connect(sftp_config)
+                with pool.connection(sftp_config) as sftp:
+                    # Deepest first, so directories emptied by removing their sub directories are removed as well
+                    for path in sorted(dirs, key=lambda path: path.count('/'), reverse=True):
+                        self.remove_dir(sftp, path)
             except Exception as e:
-                error_message = 'Failed to connect to %s (%s)' % (sftp_config.host, e)
-                log.error(error_message)
-
-            for entry in entries:
-                if sftp:
-                    self.download_entry(entry, config, sftp)
-                else:
-                    entry.fail(error_message)
-            if sftp:
-                sftp.close()
+                log.error('Failed to remove directories of %s (%s)' % (entry['title'], e))
 
 
 class SftpUpload(object):
@@ -481,6 +647,7 @@ class SftpUpload(object):
                           metainfo_series or similar.
     delete_origin:        Indicates wheter to delete the original file after a successful
                           upload.
+    workers:              Number of files uploaded at the same time, each over its own connection. Defaults to 4.
 
     Example:
 
@@ -502,7 +669,8 @@ class SftpUpload(object):
             'private_key': {'type': 'string'},
             'private_key_pass': {'type': 'string'},
             'to': {'type': 'string'},
-            'delete_origin': {'type': 'boolean', 'default': False}
+            'delete_origin': {'type': 'boolean', 'default': False},
+            'workers': {'type': 'integer', 'minimum': 1, 'default': 4}
         },
         'additionProperties': False,
         'required': ['host', 'username']
@@ -516,79 +684,93 @@ class SftpUpload(object):
         config.setdefault('private_key', None)
         config.setdefault('private_key_pass', None)
         config.setdefault('to', None)
+        config.setdefault('workers', 4)
 
         return config
 
-    def handle_entry(self, entry, sftp, config, url_prefix):
+    def prepare_entry(self, entry, config, sftp, remote_dirs):
+        """
+        Returns the remote destination of the file of `entry`, or None if it can't be uploaded.
+
+        :param remote_dirs: Remote directories known to exist, shared by all entries
+        """
 
         location = entry['location']
         filename = localpath.basename(location)
 
-        to = config['to']
-        if to:
-            try:
-                to = render_from_entry(to, entry)
-            except RenderError as e:
-                log.error('Could not render path: %s', to)
-                entry.fail(e)
-                return
-
-        destination = remotepath.join(to, filename)
-        destination_url = urljoin(url_prefix, destination)
+        to = config['to'] or '.'
+        try:
+            to = render_from_entry(to, entry)
+        except RenderError as e:
+            log.error('Could not render path: %s', to)
+            entry.fail(e)
+            return
 
         if not os.path.exists(location):
             log.warn('File no longer exists: %s', location)
             return
 
-        if not sftp.lexists(to):
-            try:
-                sftp.makedirs(to)
-            except Exception as e:
-                log.error('Failed to create remote directory %s (%s)' % (to, e))
-                entry.fail(e)
+        if to not in remote_dirs:
+            if not sftp.lexists(to):
+                try:
+                    sftp.makedirs(to)
+                except Exception as e:
+                    log.error('Failed to create remote directory %s (%s)' % (to, e))
+                    entry.fail(e)
+                    return
+
+            if not sftp.isdir(to):
+                log.error('Not a directory: %s' % to)
+                entry.fail('Not a directory: %s' % to)
                 return
+            remote_dirs.add(to)
 
-        if not sftp.isdir(to):
-            log.error('Not a directory: %s' % to)
-            entry.fail
-            return
+        return remotepath.join(to, filename)
 
-        try:
-            sftp.put(localpath=location, remotepath=destination)
-            log.verbose('Successfully uploaded %s to %s' % (location, destination_url))
-        except OSError as e:
-            log.warn('File no longer exists: %s', location)
-            return
-        except IOError as e:
-            log.error('Remote directory does not exist: %s (%s)' % to)
-            entry.fail
-            return
-        except Exception as e:
-            log.error('Failed to upload %s (%s)' % (location, e))
-            entry.fail
-            return
-
-        if config['delete_origin']:
-            try:
-                os.remove(location)
-            except Exception as e:
-                log.error('Failed to delete file %s (%s)')
+    def upload_file(self, sftp_config, location, destination):
+        """
+        Uploads a file. Runs in a worker thread.
+        """
+        with pool.connection(sftp_config) as sftp:
+            upload_file(sftp, location, destination)
 
     def on_task_output(self, task, config):
         """Uploads accepted entries to the specified SFTP server."""
 
-        config = self.prepare_config(config)
+        dependency_check()
 
-        sftp = sftp_from_config(config)
+        config = self.prepare_config(config)
+        sftp_config = connection_config(config)
         url_prefix = sftp_prefix(config)
 
-        for entry in task.accepted:
-            if sftp:
+        jobs = []
+        remote_dirs = set()
+        with sftp_from_config(config) as sftp:
+            for entry in task.accepted:
                 log.debug('Uploading file: %s' % entry)
-                self.handle_entry(entry, sftp, config, url_prefix)
-            else:
-                log.debug('SFTP connection failed; failing entry: %s' % entry)
-                entry.fail
+                destination = self.prepare_entry(entry, config, sftp, remote_dirs)
+                if destination:
+                    jobs.append((entry, sftp_config, entry['location'], destination))
+
+        # Files are uploaded concurrently, the pool hands each worker its own connection
+        def transfer(entry, sftp_config, location, destination):
+            self.upload_file(sftp_config, location, destination)
+
+        for (entry, sftp_config, location, destination), error in run_transfers(transfer, jobs, config['workers']):
+            if isinstance(error, EnvironmentError) and not os.path.exists(location):
+                log.warn('File no longer exists: %s', location)
+                continue
+            elif error:
+                log.error('Failed to upload %s (%s)' % (location, error))
+                entry.fail('Failed to upload %s (%s)' % (location, error))
+                continue
+            log.verbose('Successfully uploaded %s to %s' % (location, urljoin(url_prefix, destination)))
+
+            if config['delete_origin']:
+                try:
+                    os.remove(location)
+                except Exception as e:
+                    log.error('Failed to delete file %s (%s)' % (location, e))
 
 
 @event('plugin.register')
@@ -21,6 +21,83 @@ from fnmatch import fnmatch
 
 log = logging.getLogger('transmission')
 
+# Transmission reports torrents which changed in this many seconds as recently active
+RECENTLY_ACTIVE_SECONDS = 60
+# Torrent fields used by `torrent_info` and `check_seed_limits`
+INFO_FIELDS = ['id', 'totalSize', 'downloadDir', 'files', 'priorities', 'wanted', 'seedRatioMode', 'seedRatioLimit',
+               'uploadRatio', 'seedIdleMode', 'seedIdleLimit', 'activityDate']
+
+# TransmissionSync per (host, port, username, password), shared by all tasks
+_syncs = {}
+
+
+class TransmissionSync(object):
+    """
+    Torrent state of one transmission daemon, shared by the tasks of a run.
+
+    Only the torrent fields which are asked for are fetched, with a single request. While the state is fresh enough,
+    only the torrents transmission reports as recently active are fetched again.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.torrents = {}
+        self.fields = set()
+        self.refreshed = None
+
+    def clear(self):
+        self.torrents = {}
+        self.fields = set()
+        self.refreshed = None
+
+    def get_torrents(self, fields):
+        """:return: List of `transmissionrpc.Torrent` with (at least) the given fields"""
+        fields = set(fields) | set(['id'])
+        now = time.time()
+        # Leave some margin, so changes in between requests are never missed
+        if (not fields <= self.fields or self.refreshed is None or
+                now - self.refreshed > RECENTLY_ACTIVE_SECONDS - 10 or not self.refresh_active()):
+            self.fields |= fields
+            log.debug('Fetching all torrents from transmission')
+            self.torrents = dict((t.id, t) for t in self.client.get_torrents(arguments=list(self.fields)))
+        self.refreshed = now
+        return self.torrents.values()
+
+    def refresh_active(self):
+        """
+        Fetches the torrents transmission reports as recently active, and the ones added since the last refresh.
+
+        :return: False if the recently active torrents couldn't be fetched, the state must then be fetched in full.
+        """
+        ids = set(t.id for t in self.client.get_torrents(arguments=['id']))
+        try:
+            # The public methods don't accept `recently-active` as ids
+            active = self.client._request('torrent-get', {'fields': list(self.fields), 'ids': 'recently-active'})
+        except Exception as e:
+            log.debug('Could not fetch recently active torrents from transmission: %s' % e, exc_info=True)
+            return False
+        for torrent_id in set(self.torrents) - ids:
+            del self.torrents[torrent_id]
+        self.torrents.update(active)
+        missing = ids - set(self.torrents)
+        if missing:
+            self.torrents.update((t.id, t) for t in
+                                 self.client.get_torrents(ids=list(missing), arguments=list(self.fields)))
+        log.debug('Refreshed %s recently active torrents from transmission' % len(active))
+        return True
+
+    def remove_torrents(self, ids, delete_files):
+        self.client.remove_torrent(ids, delete_files)
+        for torrent_id in ids:
+            self.torrents.pop(torrent_id, None)
+
+
+@event('manager.execute.completed')
+def clear_torrent_state(manager, options):
+    """Torrents change between runs, only keep the clients."""
+    for sync in _syncs.itervalues():
+        sync.clear()
+
 
 def save_opener(f):
     """
@@ -97,6 +174,13 @@ class TransmissionBase(object):
                 raise plugin.PluginError("Error connecting to transmission: %s" % e.message)
         return cli
 
+    def get_sync(self, config):
+        """Get the :class:`TransmissionSync` for the transmission daemon in `config`, connecting if needed."""
+        key = (config['host'], config['port'], config.get('username'), config.get('password'))
+        if key not in _syncs:
+            _syncs[key] = TransmissionSync(self.create_rpc_client(config))
+        return _syncs[key]
+
     def torrent_info(self, torrent, config):
         done = torrent.totalSize > 0
         vloc = None
@@ -142,15 +226,15 @@ class TransmissionBase(object):
         if [int(part) for part in transmissionrpc.__version__.split('.')] < [0, 11]:
             raise plugin.PluginError('Transmissionrpc module version 0.11 or higher required, please upgrade', log)
         """ 
-        Mark rpc client for garbage collector so every task can start 
-        a fresh new according its own config - fix to bug #2804
+        Clients are shared per host, so every task uses the one
+        according its own config - fix to bug #2804
         """
         self.client = None
         config = self.prepare_config(config)
         if config['enabled']:
             if task.options.test:
                 log.info('Trying to connect to transmission...')
-                self.client = self.create_rpc_client(config)
+                self.client = self.get_sync(config).client
                 if self.client:
                     log.info('Successfully connected to transmission.')
                 else:
@@ -178,8 +262,8 @@ class PluginTransmissionInput(TransmissionBase):
         if not config['enabled']:
             return
 
-        if not self.client:
-            self.client = self.create_rpc_client(config)
+        sync = self.get_sync(config)
+        self.client = sync.client
         entries = []
 
         # Hack/Workaround for http://flexget.com/ticket/2002
@@ -189,7 +273,9 @@ class PluginTransmissionInput(TransmissionBase):
 
         session = self.client.get_session()
 
-        for torrent in self.client.get_torrents():
+        fields = INFO_FIELDS + ['name', 'status', 'torrentFile', 'hashString', 'comment', 'isFinished', 'isPrivate',
+                                'trackers']
+        for torrent in sync.get_torrents(fields):
             downloaded, bigfella = self.torrent_info(torrent, config)
             seed_ratio_ok, idle_limit_ok = self.check_seed_limits(torrent, session)
             if not config['onlycomplete'] or (downloaded and
@@ -302,7 +388,7 @@ class PluginTransmission(TransmissionBase):
         if not task.accepted:
             return
         if self.client is None:
-            self.client = self.create_rpc_client(config)
+            self.client = self.get_sync(config).client
             if self.client:
                 log.debug('Successfully connected to transmission.')
             else:
@@ -661,19 +747,20 @@ class PluginTransmissionClean(TransmissionBase):
         config = self.prepare_config(config)
         if not config['enabled'] or task.options.learn:
             return
-        if not self.client:
-            self.client = self.create_rpc_client(config)
+        sync = self.get_sync(config)
+        self.client = sync.client
         nrat = float(config['min_ratio']) if 'min_ratio' in config else None
         nfor = parse_timedelta(config['finished_for']) if 'finished_for' in config else None
         delete_files = bool(config['delete_files']) if 'delete_files' in config else False
         trans_checks = bool(config['transmission_seed_limits']) if 'transmission_seed_limits' in config else False
         tracker_re = re.compile(config['tracker'], re.IGNORECASE) if 'tracker' in config else None
-        directories_re = config.get('directories')
-        
+        directories_re = [re.compile(directory, re.IGNORECASE) for directory in config.get('directories', [])]
+
         session = self.client.get_session()
 
         remove_ids = []
-        for torrent in self.client.get_torrents():
+        fields = INFO_FIELDS + ['name', 'status', 'addedDate', 'doneDate', 'trackers']
+        for torrent in sync.get_torrents(fields):
             log.verbose('Torrent "%s": status: "%s" - ratio: %s -  date added: %s - date done: %s' %
                         (torrent.name, torrent.status, torrent.ratio, torrent.date_added, torrent.date_done))
             downloaded, dummy = self.torrent_info(torrent, config)
@@ -688,7 +775,8 @@ class PluginTransmissionClean(TransmissionBase):
             is_torrent_idlelimit_since_added_reached = nfor and (torrent.date_added + nfor) <= datetime.now()
             is_torrent_idlelimit_since_finished_reached = nfor and (torrent.date_done + nfor) <= datetime.now()
             is_tracker_matching = not tracker_re or any(tracker_re.search(host) for host in tracker_hosts)
-            is_directories_matching = not directories_re or any(re.compile(directory, re.IGNORECASE).search(torrent.downloadDir) for directory in directories_re)
+            is_directories_matching = not directories_re or any(directory_re.search(torrent.downloadDir)
+                                                                for directory_re in directories_re)
             if (downloaded and (is_clean_all or
                                 is_transmission_seedlimit_unset or
                                 is_transmission_seedlimit_reached or
@@ -703,7 +791,7 @@ class PluginTransmissionClean(TransmissionBase):
                 log.info('Removing finished torrent `%s` from transmission' % torrent.name)
                 remove_ids.append(torrent.id)
         if remove_ids:
-            self.client.remove_torrent(remove_ids, delete_files)
+            sync.remove_torrents(remove_ids, delete_files)
 
 
 @event('plugin.register')
@@ -1,11 +1,24 @@
 from __future__ import unicode_literals, division, absolute_import
+from collections import OrderedDict
+from datetime import datetime
+import copy
+from multiprocessing.pool import ThreadPool
+from urlparse import urlparse
 import logging
 
-from flexget import plugin
+from flexget import logger, plugin
 from flexget.event import event
+from flexget.utils.lazy_dict import LazyLookup
+from flexget.utils.requests import find_limiter
+from flexget.utils.sqlalchemy_utils import threads_share_database
+from flexget.utils.tools import parse_timedelta
 
 log = logging.getLogger('urlrewriter')
 
+# Amount of sites whose entries are rewritten at the same time
+DEFAULT_WORKERS = 4
+DEFAULT_CACHE_TIME = '30 minutes'
+
 
 class UrlRewritingError(Exception):
 
@@ -16,61 +29,191 @@ class UrlRewritingError(Exception):
         return repr(self.value)
 
 
+class RewriterIndex(object):
+    """
+    Finds the url rewriters which may handle an url with a single lookup by its host. Rewriters declare the domains
+    they handle in their `url_rewrite_hosts` attribute, subdomains included. Rewriters without it are tried for
+    every url.
+
+    :param rewriters: List of :class:`flexget.plugin.PluginInfo`, in the order they are tried
+    """
+
+    def __init__(self, rewriters):
+        self.by_host = {}
+        self.generic = []
+        for position, rewriter in enumerate(rewriters):
+            hosts = getattr(rewriter.instance, 'url_rewrite_hosts', None)
+            if hosts is None:
+                self.generic.append((position, rewriter))
+                continue
+            for host in hosts:
+                self.by_host.setdefault(host.lower(), []).append((position, rewriter))
+
+    def rewriters(self, url):
+        """Rewriters which may handle `url`, in order."""
+        found = dict(self.generic)
+        host = urlparse(url).hostname or ''
+        while host:
+            found.update(self.by_host.get(host, ()))
+            host = host.partition('.')[2]
+        return [found[position] for position in sorted(found)]
+
+
 class PluginUrlRewriting(object):
     """
     Provides URL rewriting framework
+
+    Entries are rewritten in a pool of threads. Entries for the same site, or behind the same domain limiter, are
+    rewritten one after another. Rewritten urls are remembered for `cache_time`, so the rewriters aren't run again
+    for the same url meanwhile.
+
+    Example::
+
+      urlrewriting:
+        workers: 8
+        cache_time: 1 hour
     """
 
+    schema = {
+        'type': 'object',
+        'properties': {
+            'workers': {'type': 'integer', 'minimum': 1},
+            'cache_time': {'type': 'string', 'format': 'interval'}
+        },
+        'additionalProperties': False
+    }
+
     def __init__(self):
         self.disabled_rewriters = []
+        self.index = None
+        # (task name, url) -> (time rewritten, fields set by the rewriters, fields removed by them)
+        self.rewritten = {}
 
     def on_task_urlrewrite(self, task, config):
+        config = config or {}
+        cache_time = parse_timedelta(config.get('cache_time', DEFAULT_CACHE_TIME))
+        self.index = RewriterIndex(plugin.get_plugins(group='urlrewriter'))
+        self.prune_rewritten(cache_time)
         log.debug('Checking %s entries' % len(task.accepted))
         # try to urlrewrite all accepted
+        groups = OrderedDict()
         for entry in task.accepted:
+            url = entry.get('url') or ''
+            limiter = find_limiter(url, task.requests.domain_limiters)
+            groups.setdefault(limiter or urlparse(url).hostname, []).append(entry)
+
+        def rewrite(entries):
+            failed = []
+            with logger.task_logging(task.name, task.id):
+                for entry in entries:
+                    try:
+                        self.cached_url_rewrite(task, entry, cache_time)
+                    except UrlRewritingError as e:
+                        failed.append((entry, e))
+            return failed
+
+        workers = min(config.get('workers', DEFAULT_WORKERS), len(groups))
+        if workers > 1 and threads_share_database(task.manager.engine):
+            pool = ThreadPool(workers)
             try:
-                self.url_rewrite(task, entry)
-            except UrlRewritingError as e:
+                results = pool.map(rewrite, groups.values())
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [rewrite(entries) for entries in groups.values()]
+        for failed in results:
+            for entry, e in failed:
+                # failing runs the entry hooks, which must not happen in the worker threads
                 log.warn(e.value)
                 entry.fail()
 
-    # API method
-    def url_rewritable(self, task, entry):
-        """Return True if entry is urlrewritable by registered rewriter."""
-        for urlrewriter in plugin.get_plugins(group='urlrewriter'):
+    def prune_rewritten(self, cache_time):
+        expired = datetime.now() - cache_time
+        for key, (rewritten, fields, removed) in self.rewritten.items():
+            if rewritten < expired:
+                del self.rewritten[key]
+
+    def cached_url_rewrite(self, task, entry, cache_time):
+        """
+        Rewrites entry url like :meth:`url_rewrite`, unless the same url was rewritten less than `cache_time` ago. All
+        the fields the rewriters changed are cached, not only the url.
+        """
+        key = (task.name, entry.get('url'))
+        cached = self.rewritten.get(key)
+        if cached and cached[0] > datetime.now() - cache_time:
+            rewritten, fields, removed = cached
+            log.debug('Url %s was rewritten to %s recently' % (key[1], fields['url']))
+            for field, value in fields.iteritems():
+                entry[field] = copy.copy(value)
+            for field in removed:
+                entry.pop(field, None)
+            return
+        # Containers are copied, rewriters may change them in place
+        before = dict((field, copy.copy(value) if isinstance(value, (list, dict)) else value)
+                      for field, value in entry.store.iteritems())
+        self.url_rewrite(task, entry)
+        if not (cache_time and entry.accepted and entry.get('url') and entry['url'] != key[1]):
+            return
+        fields = {}
+        for field, value in entry.store.iteritems():
+            if field in before and (isinstance(before[field], LazyLookup) or before[field] == value):
+                # Lazy fields evaluated while rewriting belong to this entry, not to the url
+                continue
+            if isinstance(value, LazyLookup):
+                # Lazy lookups are bound to this entry, it can't be repeated for others
+                return
+            fields[field] = copy.copy(value)
+        removed = [field for field in before if field not in entry.store]
+        self.rewritten[key] = (datetime.now(), fields, removed)
+
+    def rewriters(self, task, entry):
+        """Enabled rewriters which can rewrite `entry`, in order."""
+        if self.index is None:
+            self.index = RewriterIndex(plugin.get_plugins(group='urlrewriter'))
+        rewriters = []
+        for urlrewriter in self.index.rewriters(entry.get('url') or ''):
             if urlrewriter.name in self.disabled_rewriters:
                 log.trace('Skipping rewriter %s since it\'s disabled' % urlrewriter.name)
                 continue
             log.trace('checking urlrewriter %s' % urlrewriter.name)
             if urlrewriter.instance.url_rewritable(task, entry):
-                return True
-        return False
+                rewriters.append(urlrewriter)
+        return rewriters
+
+    # API method
+    def url_rewritable(self, task, entry):
+        """Return True if entry is urlrewritable by registered rewriter."""
+        return bool(self.rewriters(task, entry))
 
     # API method - why priority though?
     @plugin.priority(255)
     def url_rewrite(self, task, entry):
         """Rewrites given entry url. Raises UrlRewritingError if failed."""
         tries = 0
-        while self.url_rewritable(task, entry) and entry.accepted:
+        while entry.accepted:
+            rewriters = self.rewriters(task, entry)
+            if not rewriters:
+                break
             tries += 1
             if tries > 20:
                 raise UrlRewritingError('URL rewriting was left in infinite loop while rewriting url for %s, '
                                         'some rewriter is returning always True' % entry)
-            for urlrewriter in plugin.get_plugins(group='urlrewriter'):
+            checked_url = entry['url']
+            for urlrewriter in rewriters:
                 name = urlrewriter.name
-                if name in self.disabled_rewriters:
-                    log.trace('Skipping rewriter %s since it\'s disabled' % name)
-                    continue
                 try:
-                    if urlrewriter.instance.url_rewritable(task, entry):
-                        old_url = entry['url']
-                        log.debug('Url rewriting %s' % entry['url'])
-                        urlrewriter.instance.url_rewrite(task, entry)
-                        if entry['url'] != old_url:
-                            log.info('Entry \'%s\' URL rewritten to %s (with %s)' % (
-                                entry['title'],
-                                entry['url'],
-                                name))
+                    # rewriters found for the previous url must still be able to handle the current one
+                    if entry['url'] != checked_url and not urlrewriter.instance.url_rewritable(task, entry):
+                        continue
+                    old_url = entry['url']
+                    log.debug('Url rewriting %s' % entry['url'])
+                    urlrewriter.instance.url_rewrite(task, entry)
+                    if entry['url'] != old_url:
+                        log.info('Entry \'%s\' URL rewritten to %s (with %s)' % (
+                            entry['title'],
+                            entry['url'],
+                            name))
                 except UrlRewritingError as r:
                     # increase failcount
                     # count = self.shared_cache.storedefault(entry['url'], 1)
@@ -111,6 +254,12 @@ class DisableUrlRewriter(object):
     on_task_abort = on_task_exit
 
 
+@event('manager.config_updated')
+def clear_rewritten(manager):
+    # Rewrites depend on the task configuration
+    plugin.get_plugin_by_name('urlrewriting').instance.rewritten.clear()
+
+
 @event('plugin.register')
 def register_plugin():
     plugin.register(PluginUrlRewriting, 'urlrewriting', builtin=True, api_ver=2)
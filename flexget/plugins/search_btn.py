@@ -12,16 +12,17 @@ from flexget.utils.search import torrent_availability
 
 log = logging.getLogger('search_btn')
 
+# Amount of searches sent in a single request
+BATCH_SIZE = 50
+
 
 class SearchBTN(object):
     schema = {'type': 'string'}
     # Advertised limit is 150/hour (24s/request average). This may need some tweaking.
     request_limiter = TokenBucketLimiter('api.btnapps.net', 100, '25 seconds')
 
-    def search(self, task, entry, config):
-        task.requests.add_domain_limiter(self.request_limiter)
-        api_key = config
-
+    def build_searches(self, entry):
+        """Searches for `entry`, each one is only tried when the ones before it had no results."""
         searches = entry.get('search_strings', [entry['title']])
 
         if 'series_name' in entry:
@@ -44,46 +45,89 @@ class SearchBTN(object):
                 match = re.match('(.+)\([^\(\)]+\)$', search['series'])
                 if match:
                     searches.append(dict(search, series=match.group(1).strip()))
+        return searches
+
+    def call(self, task, data):
+        """Posts json-rpc call(s) `data` to the api, returns the decoded response or None if it failed."""
+        try:
+            r = task.requests.post('http://api.btnapps.net/',
+                                   data=json.dumps(data), headers={'Content-type': 'application/json'})
+        except requests.RequestException as e:
+            log.error('Error searching btn: %s' % e)
+            return None
+        return r.json()
+
+    def parse_response(self, content):
+        """Returns the entries in a `getTorrents` response."""
+        results = set()
+        if not content or not content.get('result'):
+            log.debug('No results from btn')
+            if content and content.get('error'):
+                if content['error'].get('code') == -32002:
+                    log.error('btn api call limit exceeded, throttling connection rate')
+                    self.request_limiter.tokens = -1
+                else:
+                    log.error('Error searching btn: %s' % content['error'].get('message', content['error']))
+            return results
+        if 'torrents' in content['result']:
+            for item in content['result']['torrents'].itervalues():
+                entry = Entry()
+                entry['title'] = item['ReleaseName']
+                entry['title'] += ' '.join(['', item['Resolution'], item['Source'], item['Codec']])
+                entry['url'] = item['DownloadURL']
+                entry['torrent_seeds'] = int(item['Seeders'])
+                entry['torrent_leeches'] = int(item['Leechers'])
+                entry['torrent_info_hash'] = item['InfoHash']
+                entry['search_sort'] = torrent_availability(entry['torrent_seeds'], entry['torrent_leeches'])
+                if item['TvdbID'] and int(item['TvdbID']):
+                    entry['tvdb_id'] = int(item['TvdbID'])
+                if item['TvrageID'] and int(item['TvrageID']):
+                    entry['tvrage_id'] = int(item['TvrageID'])
+                results.add(entry)
+        return results
 
+    def search(self, task, entry, config):
+        task.requests.add_domain_limiter(self.request_limiter)
+        api_key = config
 
         results = set()
-        for search in searches:
-            data = json.dumps({'method': 'getTorrents', 'params': [api_key, search], 'id': 1})
-            try:
-                r = task.requests.post('http://api.btnapps.net/',
-                                       data=data, headers={'Content-type': 'application/json'})
-            except requests.RequestException as e:
-                log.error('Error searching btn: %s' % e)
-                continue
-            content = r.json()
-            if not content or not content['result']:
-                log.debug('No results from btn')
-                if content and content.get('error'):
-                    if content['error'].get('code') == -32002:
-                        log.error('btn api call limit exceeded, throttling connection rate')
-                        self.request_limiter.tokens = -1
-                    else:
-                        log.error('Error searching btn: %s' % content['error'].get('message', content['error']))
-                continue
-            if 'torrents' in content['result']:
-                for item in content['result']['torrents'].itervalues():
-                    entry = Entry()
-                    entry['title'] = item['ReleaseName']
-                    entry['title'] += ' '.join(['', item['Resolution'], item['Source'], item['Codec']])
-                    entry['url'] = item['DownloadURL']
-                    entry['torrent_seeds'] = int(item['Seeders'])
-                    entry['torrent_leeches'] = int(item['Leechers'])
-                    entry['torrent_info_hash'] = item['InfoHash']
-                    entry['search_sort'] = torrent_availability(entry['torrent_seeds'], entry['torrent_leeches'])
-                    if item['TvdbID'] and int(item['TvdbID']):
-                        entry['tvdb_id'] = int(item['TvdbID'])
-                    if item['TvrageID'] and int(item['TvrageID']):
-                        entry['tvrage_id'] = int(item['TvrageID'])
-                    results.add(entry)
+        for search in self.build_searches(entry):
+            content = self.call(task, {'method': 'getTorrents', 'params': [api_key, search], 'id': 1})
+            results = self.parse_response(content)
+            if results:
                 # Don't continue searching if this search yielded results
                 break
         return results
 
+    def search_batch(self, task, entries, config):
+        """Sends the searches for many entries in each request, as a json-rpc batch."""
+        task.requests.add_domain_limiter(self.request_limiter)
+        api_key = config
+
+        searches = [self.build_searches(entry) for entry in entries]
+        results = [set() for entry in entries]
+        attempt = 0
+        pending = [index for index in range(len(entries)) if searches[index]]
+        while pending:
+            for start in range(0, len(pending), BATCH_SIZE):
+                batch = [{'method': 'getTorrents', 'params': [api_key, searches[index][attempt]], 'id': index}
+                         for index in pending[start:start + BATCH_SIZE]]
+                # Each call in the batch counts against the api limit, the request itself takes the token of one
+                for _ in range(len(batch) - 1):
+                    self.request_limiter()
+                content = self.call(task, batch)
+                if not isinstance(content, list):
+                    # The whole request failed
+                    self.parse_response(content)
+                    return results
+                for response in content:
+                    if response.get('id') in pending:
+                        results[response['id']] = self.parse_response(response)
+            attempt += 1
+            # Entries without results try their next search
+            pending = [index for index in pending if not results[index] and len(searches[index]) > attempt]
+        return results
+
 
 @event('plugin.register')
 def register_plugin():
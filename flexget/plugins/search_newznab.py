@@ -1,5 +1,6 @@
 import logging
 import urllib
+from collections import OrderedDict
 
 from flexget import plugin
 from flexget.entry import Entry
@@ -10,6 +11,10 @@ __author__ = 'deksan'
 
 log = logging.getLogger('newznab')
 
+# Results requested per page, and most pages fetched, when searching for a whole season
+PAGE_SIZE = 100
+SEASON_PAGES = 5
+
 
 class Newznab(object):
     """
@@ -64,6 +69,7 @@ class Newznab(object):
             r = task.requests.get(url)
         except task.requests.RequestException as e:
             log.error("Failed fetching '%s': %s" % (url, e))
+            return entries
 
         rss = feedparser.parse(r.content)
         log.debug("Raw RSS: %s" % rss)
@@ -94,18 +100,80 @@ class Newznab(object):
             log.warning("Not done yet...")
             return entries
 
+    def search_batch(self, task, entries, config=None):
+        """
+        Episodes of the same season of a show are searched for with a single request for the season, which is then
+        split by episode. Episodes not found in the season results are only searched for on their own when the
+        results may be incomplete.
+        """
+        config = self.build_config(config)
+        if config['category'] != 'tvsearch':
+            return [self.search(task, entry, config) for entry in entries]
+        results = [[] for entry in entries]
+        seasons = OrderedDict()
+        for index, entry in enumerate(entries):
+            params = self.tvsearch_params(entry)
+            if params is None or entry.get('series_id_type') == 'sequence':
+                results[index] = self.do_search_tvsearch(entry, task, config)
+                continue
+            params.append(('season', entry['series_season']))
+            seasons.setdefault(tuple(params), []).append(index)
+        for params, indexes in seasons.iteritems():
+            if len(indexes) == 1:
+                results[indexes[0]] = self.do_search_tvsearch(entries[indexes[0]], task, config)
+                continue
+            log.info('Searching for %s episodes of %s season %s' %
+                     (len(indexes), entries[indexes[0]]['series_name'], entries[indexes[0]]['series_season']))
+            season_entries, complete = self.fill_season_entries(config['url'] + '&' + urllib.urlencode(params), task)
+            parsing = plugin.get_plugin_by_name('parsing').instance
+            episodes = {}
+            for season_entry in season_entries:
+                parsed = parsing.parse_series(data=season_entry['title'], name=entries[indexes[0]]['series_name'])
+                if parsed.valid and parsed.season is not None:
+                    episodes.setdefault((parsed.season, parsed.episode), []).append(season_entry)
+                else:
+                    # The missing episodes might be among the releases named differently than the show
+                    complete = False
+            for index in indexes:
+                entry = entries[index]
+                results[index] = episodes.get((entry['series_season'], entry['series_episode']), [])
+                if not results[index] and not complete:
+                    results[index] = self.do_search_tvsearch(entry, task, config)
+        return results
+
+    def fill_season_entries(self, url, task):
+        """
+        Fetches the results of a season search `url`, page by page.
+
+        :return: Tuple of the entries, and whether they are all the results (False when there were more pages)
+        """
+        entries = []
+        for page in range(SEASON_PAGES):
+            page_entries = self.fill_entries_for_url(
+                url + '&' + urllib.urlencode([('limit', PAGE_SIZE), ('offset', page * PAGE_SIZE)]), task)
+            entries.extend(page_entries)
+            if len(page_entries) < PAGE_SIZE:
+                return entries, True
+        return entries, False
+
+    def tvsearch_params(self, entry):
+        """Query parameters identifying the show of `entry`, None if it can't be searched for."""
+        # normally this should be used with emit_series who has provided season and episodenumber
+        if 'series_name' not in entry or 'series_season' not in entry or 'series_episode' not in entry:
+            return None
+        if entry.get('tvdb_id'):
+            return [('tvdbid', entry['tvdb_id'])]
+        if entry.get('tvrage_id'):
+            return [('rid', entry['tvrage_id'])]
+        return [('q', entry['series_name'].encode('utf-8'))]
+
     def do_search_tvsearch(self, arg_entry, task, config=None):
         log.info('Searching for %s' % (arg_entry['title']))
-        # normally this should be used with emit_series who has provided season and episodenumber
-        if 'series_name' not in arg_entry or 'series_season' not in arg_entry or 'series_episode' not in arg_entry:
+        params = self.tvsearch_params(arg_entry)
+        if params is None:
             return []
-        if 'tvrage_id' not in arg_entry:
-            # TODO: Is newznab replacing tvrage with something else? Update this.
-            log.warning('tvrage lookup support is gone, someone needs to update this plugin!')
-            return []
-
-        url = (config['url'] + '&rid=%s&season=%s&ep=%s' %
-               (arg_entry['tvrage_id'], arg_entry['series_season'], arg_entry['series_episode']))
+        params += [('season', arg_entry['series_season']), ('ep', arg_entry['series_episode'])]
+        url = config['url'] + '&' + urllib.urlencode(params)
         return self.fill_entries_for_url(url, task)
 
     def do_search_movie(self, arg_entry, task, config=None):
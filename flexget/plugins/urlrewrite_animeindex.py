@@ -14,6 +14,8 @@ log = logging.getLogger('animeindex')
 class UrlRewriteAnimeIndex(object):
     """AnimeIndex urlrewriter."""
 
+    url_rewrite_hosts = ['anime-index.org']
+
     def url_rewritable(self, task, entry):
         return entry['url'].startswith('http://tracker.anime-index.org/index.php?page=torrent-details&id=')
 
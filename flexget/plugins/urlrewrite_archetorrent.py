@@ -10,6 +10,8 @@ log = logging.getLogger("archetorrent")
 class UrlRewriteArchetorrent(object):
     """Archetorrent urlrewriter."""
 
+    url_rewrite_hosts = ['archetorrent.com']
+
 #   urlrewriter API
     def url_rewritable(self, task, entry):
         url = entry['url']
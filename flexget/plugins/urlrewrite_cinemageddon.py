@@ -11,6 +11,8 @@ log = logging.getLogger('cinemageddon')
 class UrlRewriteCinemageddon(object):
     """Cinemageddon urlrewriter."""
 
+    url_rewrite_hosts = ['cinemageddon.net']
+
     def url_rewritable(self, task, entry):
         return entry['url'].startswith('http://cinemageddon.net/details.php?id=')
 
@@ -27,6 +27,8 @@ class UrlRewriteDivxATope(object):
         'default': False
     }
 
+    url_rewrite_hosts = ['divxatope.com']
+
     # urlrewriter API
     def url_rewritable(self, task, entry):
         url = entry['url']
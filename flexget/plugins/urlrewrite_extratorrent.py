@@ -48,6 +48,8 @@ class UrlRewriteExtraTorrent(object):
         'additionalProperties': False
     }
 
+    url_rewrite_hosts = ['extratorrent.cc']
+
     def url_rewritable(self, task, entry):
         return REGEXP.match(entry['url']) is not None
 
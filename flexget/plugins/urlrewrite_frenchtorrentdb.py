@@ -14,6 +14,8 @@ log = logging.getLogger('FTDB')
 class UrlRewriteFTDB(object):
     """FTDB RSS url_rewrite"""
 
+    url_rewrite_hosts = ['frenchtorrentdb.com']
+
     def url_rewritable(self, task, entry):
         # url = entry['url']
         if re.match(r'^http://www\.frenchtorrentdb\.com/[^/]+(?!/)[^/]+&rss=1', entry['url']):
@@ -21,6 +21,8 @@ requests.add_domain_limiter(TimedLimiter('imdb.com', '2 seconds'))
 class UrlRewriteGoogleCse(object):
     """Google custom query urlrewriter."""
 
+    url_rewrite_hosts = ['google.com']
+
     # urlrewriter API
     def url_rewritable(self, task, entry):
         if entry['url'].startswith('http://www.google.com/cse?'):
@@ -56,6 +58,8 @@ class UrlRewriteGoogleCse(object):
 
 class UrlRewriteGoogle(object):
 
+    url_rewrite_hosts = ['google.com']
+
     # urlrewriter API
     def url_rewritable(self, task, entry):
         if entry['url'].startswith('https://www.google.com/search?q='):
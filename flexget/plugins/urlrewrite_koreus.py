@@ -15,6 +15,8 @@ log = logging.getLogger('koreus')
 class UrlRewriteKoreus(object):
     """Koreus urlrewriter."""
 
+    url_rewrite_hosts = ['koreus.com']
+
     # urlrewriter API
     def url_rewritable(self, task, entry):
         url = entry['url']
@@ -18,6 +18,8 @@ requests.add_domain_limiter(TimedLimiter('imdb.com', '2 seconds'))
 class UrlRewriteNewPCT(object):
     """NewPCT urlrewriter."""
 
+    url_rewrite_hosts = ['newpct.com', 'newpct1.com']
+
     # urlrewriter API
     def url_rewritable(self, task, entry):
         url = entry['url']
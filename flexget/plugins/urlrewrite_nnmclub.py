@@ -13,6 +13,8 @@ log = logging.getLogger('nnm-club')
 class UrlRewriteNnmClub(object):
     """Nnm-club.me urlrewriter."""
 
+    url_rewrite_hosts = ['nnm-club.me']
+
     def url_rewritable(self, task, entry):
         return entry['url'].startswith('http://nnm-club.me/forum/viewtopic.php?t=')
 
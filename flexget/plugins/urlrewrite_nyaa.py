@@ -73,6 +73,8 @@ class UrlRewriteNyaa(object):
 
         return entries
 
+    url_rewrite_hosts = ['nyaa.eu']
+
     def url_rewritable(self, task, entry):
         return entry['url'].startswith('http://www.nyaa.eu/?page=torrentinfo&tid=')
 
@@ -63,6 +63,8 @@ class UrlRewritePirateBay(object):
         ]
     }
 
+    url_rewrite_hosts = ['thepiratebay.%s' % tld for tld in TLDS.split('|')]
+
     # urlrewriter API
     def url_rewritable(self, task, entry):
         url = entry['url']
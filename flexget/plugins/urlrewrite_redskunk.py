@@ -10,6 +10,8 @@ log = logging.getLogger("redskunk")
 class UrlRewriteRedskunk(object):
     """Redskunk urlrewriter."""
 
+    url_rewrite_hosts = ['redskunk.org']
+
     def url_rewritable(self, task, entry):
         url = entry['url']
         return url.startswith('http://redskunk.org') and url.find('download') == -1
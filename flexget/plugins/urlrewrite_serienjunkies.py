@@ -54,6 +54,8 @@ class UrlRewriteSerienjunkies(object):
         'additionalProperties': False
     }
 
+    url_rewrite_hosts = ['serienjunkies.org']
+
     # urlrewriter API
     def url_rewritable(self, task, entry):
         url = entry['url']
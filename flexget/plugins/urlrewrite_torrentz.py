@@ -48,6 +48,8 @@ class UrlRewriteTorrentz(object):
             config['extra_terms'] = ' ' + config['extra_terms']
         return config
 
+    url_rewrite_hosts = ['torrentz.eu', 'torrentz.me', 'torrentz.ch', 'torrentz.in']
+
     def url_rewritable(self, task, entry):
         return REGEXP.match(entry['url'])
 
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, division, unicode_literals
 
+import contextlib
 import copy
 import hashlib
 import itertools
@@ -16,12 +17,14 @@ from flexget.entry import EntryUnicodeError
 from flexget.event import event, fire_event
 from flexget.logger import capture_output
 from flexget.manager import Session
+from flexget import plugin as plugin_module
 from flexget.plugin import plugins as all_plugins
 from flexget.plugin import (
     DependencyError, get_plugins, phase_methods, plugin_schemas, PluginError, PluginWarning, task_phases)
 from flexget.utils import requests
 from flexget.utils.database import with_session
 from flexget.utils.simple_persistence import SimpleTaskPersistence
+from flexget.utils.sqlalchemy_utils import UnitOfWork
 
 log = logging.getLogger('task')
 Base = db_schema.versioned_base('feed', 0)
@@ -55,13 +58,41 @@ def config_changed(task=None, session=None):
     task_hash.delete()
 
 
+# Plugins handling each phase
+_phase_plugins = {}
+# Execution plans, keyed by phase, plugin names in task config, names of builtin plugins and handler priorities
+_plans = {}
+
+
+@event('manager.config_updated')
+def clear_plans(manager):
+    """Plugins may have been loaded or their handlers changed, the plans will be compiled again when needed."""
+    _phase_plugins.clear()
+    _plans.clear()
+
+
+class PhasePlan(object):
+    """
+    Plugins to execute for a phase of a task, in execution order.
+
+    :ivar steps: List of (position, plugin, handler, pass_config) tuples. `position` is the place of the plugin in the
+        priority order of all plugins handling the phase. When `pass_config` is True the handler is called with a
+        copy of the plugin config in addition to the task.
+    :ivar has_configured: True if at least one non builtin plugin is configured for this phase.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.has_configured = any(not plugin.builtin for _, plugin, _, _ in steps)
+
+
 def use_task_logging(func):
 
     @wraps(func)
     def wrapper(self, *args, **kw):
         # Set the task name in the logger and capture output
         from flexget import logger
-        with logger.task_logging(self.name):
+        with logger.task_logging(self.name, self.id):
             if self.output:
                 with capture_output(self.output, loglevel=self.loglevel):
                     return func(self, *args, **kw)
@@ -179,6 +210,8 @@ class Task(object):
     """
 
     max_reruns = 5
+    # Run filter to learn phases in a single database transaction, see `_begin_deferred_commit`
+    deferred_commit = False
     # Used to determine task order, when priority is the same
     _counter = itertools.count()
 
@@ -233,7 +266,11 @@ class Task(object):
         self.abort_reason = None
         self.silent_abort = False
 
-        self.session = None
+        self._session = None
+        self._session_allowed = False
+        self._unit_of_work = None
+        # Sessions of plugin code running in worker threads, see worker_session
+        self._worker = threading.local()
 
         self.requests = requests.Session()
 
@@ -353,10 +390,82 @@ class Task(object):
           An iterator over configured :class:`flexget.plugin.PluginInfo` instances enabled on this task.
         """
         if phase:
-            plugins = sorted(get_plugins(phase=phase), key=lambda p: p.phase_handlers[phase], reverse=True)
-        else:
-            plugins = all_plugins.itervalues()
-        return (p for p in plugins if p.name in self.config or p.builtin)
+            return (plugin for _, plugin, _, _ in self._phase_steps(phase))
+        return (p for p in all_plugins.itervalues() if p.name in self.config or p.builtin)
+
+    def _plan_key(self, phase):
+        """
+        Key of the plan for `phase` in `_plans`, made of the plugins configured on this task right now and the
+        priorities of the plugins handling the phase, which may be changed for a task (eg. by plugin_priority).
+        """
+        if phase not in _phase_plugins:
+            _phase_plugins[phase] = list(get_plugins(phase=phase))
+        priorities = tuple(p.phase_handlers[phase].priority for p in _phase_plugins[phase])
+        return phase, frozenset(self.config), plugin_module.builtin_plugins, priorities
+
+    def _phase_plan(self, phase, key=None):
+        """
+        Get the :class:`PhasePlan` for `phase`, compiled from the plugins configured on this task right now.
+
+        Plans are shared between tasks with the same configured plugins, and are only compiled again when the
+        configured or builtin plugins, or the handler priorities change.
+
+        :param key: Plan key from :meth:`_plan_key`, if already known
+        """
+        if key is None:
+            key = self._plan_key(phase)
+        plan = _plans.get(key)
+        if plan is None:
+            handlers = sorted(_phase_plugins[phase], key=lambda p: p.phase_handlers[phase], reverse=True)
+            plan = PhasePlan([(position, p, p.phase_handlers[phase], p.api_ver != 1)
+                              for position, p in enumerate(handlers)
+                              if p.name in self.config or p.builtin])
+            _plans[key] = plan
+        return plan
+
+    def _phase_steps(self, phase):
+        """
+        Yields the steps of the plan for `phase`. Plugins may change the configured or builtin plugins while the
+        phase is running (eg. template and disable on start phase), the remaining steps follow those changes.
+        """
+        key = self._plan_key(phase)
+        plan = self._phase_plan(phase, key)
+        position = -1
+        while True:
+            for step in plan.steps:
+                if step[0] <= position:
+                    continue
+                yield step
+                position = step[0]
+                if plugin_module.builtin_plugins is key[2] and self.config.viewkeys() == key[1]:
+                    continue
+                key = self._plan_key(phase)
+                current_plan = self._phase_plan(phase, key)
+                if current_plan is not plan:
+                    plan = current_plan
+                    break
+            else:
+                return
+
+    @property
+    def session(self):
+        """
+        Database session for the plugin currently being executed, None outside of plugin execution.
+
+        The session is only created once it is used, so plugins which do not touch the database don't pay for it.
+        """
+        worker = self._worker
+        if getattr(worker, 'active', False):
+            if worker.session is None:
+                worker.session = Session()
+            return worker.session
+        if self._session is None and self._session_allowed:
+            self._session = Session()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
 
     def __run_task_phase(self, phase):
         """Executes task phase, ie. call all enabled plugins on the task.
@@ -370,21 +479,18 @@ class Task(object):
         """
         if phase not in phase_methods:
             raise Exception('%s is not a valid task phase' % phase)
+        plan = self._phase_plan(phase)
         # warn if no inputs, filters or outputs in the task
         if phase in ['input', 'filter', 'output']:
-            if not self.manager.unit_test:
-                # Check that there is at least one manually configured plugin for these phases
-                for p in self.plugins(phase):
-                    if not p.builtin:
-                        break
+            # Check that there is at least one manually configured plugin for these phases
+            if not self.manager.unit_test and not plan.has_configured:
+                if phase == 'filter':
+                    log.warning('Task does not have any filter plugins to accept entries. '
+                                'You need at least one to accept the entries you  want.')
                 else:
-                    if phase == 'filter':
-                        log.warning('Task does not have any filter plugins to accept entries. '
-                                    'You need at least one to accept the entries you  want.')
-                    else:
-                        log.warning('Task doesn\'t have any %s plugins, you should add (at least) one!' % phase)
+                    log.warning('Task doesn\'t have any %s plugins, you should add (at least) one!' % phase)
 
-        for plugin in self.plugins(phase):
+        for _, plugin, handler, pass_config in self._phase_steps(phase):
             # Abort this phase if one of the plugins disables it
             if phase in self.disabled_phases:
                 return
@@ -392,20 +498,19 @@ class Task(object):
             self.current_phase = phase
             self.current_plugin = plugin.name
 
-            if plugin.api_ver == 1:
+            if pass_config:
+                # pass method task, copy of config (so plugin cannot modify it)
+                args = (self, copy.copy(self.config.get(plugin.name)))
+            else:
                 # backwards compatibility
                 # pass method only task (old behaviour)
                 args = (self,)
-            else:
-                # pass method task, copy of config (so plugin cannot modify it)
-                args = (self, copy.copy(self.config.get(plugin.name)))
 
             # Hack to make task.session only active for a single plugin
-            with Session() as session:
-                self.session = session
+            with self._plugin_session():
                 try:
                     fire_event('task.execute.before_plugin', self, plugin.name)
-                    response = self.__run_plugin(plugin, phase, args)
+                    response = self.__run_plugin(plugin, phase, args, handler=handler)
                     if phase == 'input' and response:
                         # add entries returned by input to self.all_entries
                         for e in response:
@@ -413,9 +518,81 @@ class Task(object):
                         self.all_entries.extend(response)
                 finally:
                     fire_event('task.execute.after_plugin', self, plugin.name)
-                self.session = None
 
-    def __run_plugin(self, plugin, phase, args=None, kwargs=None):
+    @contextlib.contextmanager
+    def _plugin_session(self):
+        """
+        Allows :attr:`session` to be used while in scope, commits it at the end if it was used.
+
+        In deferred commit mode the plugin runs in a savepoint, so only its own work is rolled back if it fails.
+        """
+        savepoint = self._unit_of_work.begin_savepoint() if self._unit_of_work else None
+        self._session_allowed = True
+        try:
+            yield
+        except:
+            if self._session is not None:
+                self._session.rollback()
+            if savepoint is not None and savepoint.is_active:
+                savepoint.rollback()
+            raise
+        else:
+            if self._session is not None:
+                self._session.commit()
+            if savepoint is not None and savepoint.is_active:
+                savepoint.commit()
+        finally:
+            self._session_allowed = False
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    @contextlib.contextmanager
+    def worker_session(self, commit=None):
+        """
+        Gives plugin code running in a worker thread a :attr:`session` of its own while in scope, sessions must not be
+        shared between threads. It's committed at the end if it was used, unless `commit` returns False.
+
+        :param commit: Function called at the end, deciding whether the work in the session is kept.
+        """
+        worker = self._worker
+        worker.active = True
+        worker.session = None
+        try:
+            yield
+        except:
+            if worker.session is not None:
+                worker.session.rollback()
+            raise
+        else:
+            if worker.session is not None:
+                if commit is None or commit():
+                    worker.session.commit()
+                else:
+                    worker.session.rollback()
+        finally:
+            worker.active = False
+            if worker.session is not None:
+                worker.session.close()
+                worker.session = None
+
+    def _begin_deferred_commit(self):
+        """
+        Start a single transaction which the database work of all plugins, including sessions they create
+        themselves, takes part in until :meth:`_end_deferred_commit`. Saves a commit per plugin on the phases
+        which write most.
+        """
+        if self._unit_of_work is None:
+            log.debug('Deferring database commits')
+            self._unit_of_work = UnitOfWork(self.manager.engine)
+
+    def _end_deferred_commit(self):
+        if self._unit_of_work is not None:
+            log.debug('Committing deferred database work')
+            unit_of_work, self._unit_of_work = self._unit_of_work, None
+            unit_of_work.end()
+
+    def __run_plugin(self, plugin, phase, args=None, kwargs=None, handler=None):
         """
         Execute given plugins phase method, with supplied args and kwargs.
         If plugin throws unexpected exceptions :meth:`abort` will be called.
@@ -424,9 +601,10 @@ class Task(object):
         :param string phase: Name of the phase to be executed
         :param args: Passed to the plugin
         :param kwargs: Passed to the plugin
+        :param handler: Phase handler of the plugin, looked up from the plugin if not given
         """
         keyword = plugin.name
-        method = plugin.phase_handlers[phase]
+        method = handler or plugin.phase_handlers[phase]
         if args is None:
             args = []
         if kwargs is None:
@@ -527,8 +705,13 @@ class Task(object):
                 self.config_modified = False
 
         # run phases
+        deferred_phases = task_phases[task_phases.index('filter'):task_phases.index('learn') + 1]
         try:
             for phase in task_phases:
+                if self.deferred_commit and phase in deferred_phases:
+                    self._begin_deferred_commit()
+                else:
+                    self._end_deferred_commit()
                 if phase in self.disabled_phases:
                     # log keywords not executed
                     for plugin in self.plugins(phase):
@@ -547,6 +730,7 @@ class Task(object):
                         # Store a copy of the config state after start phase to restore for reruns
                         self.prepared_config = copy.deepcopy(self.config)
         except TaskAbort:
+            self._end_deferred_commit()
             try:
                 self.__run_task_phase('abort')
             except TaskAbort as e:
@@ -555,6 +739,8 @@ class Task(object):
         else:
             for entry in self.all_entries:
                 entry.complete()
+        finally:
+            self._end_deferred_commit()
 
     @use_task_logging
     def execute(self):
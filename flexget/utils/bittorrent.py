@@ -2,8 +2,9 @@
 # Torrent decoding is a short fragment from effbot.org. Site copyright says:
 # Test scripts and other short code fragments can be considered as being in the public domain.
 from __future__ import unicode_literals, division, absolute_import
-import re
+import hashlib
 import logging
+import re
 
 log = logging.getLogger('torrent')
 
@@ -86,101 +87,128 @@ def is_torrent_file(metafilepath):
     return bool(magic_marker)
 
 
-def tokenize(text, match=re.compile("([idel])|(\d+):|(-?\d+)").match):
-    i = 0
-    while i < len(text):
-        m = match(text, i)
-        s = m.group(m.lastindex)
-        i = m.end()
-        if m.lastindex == 2:
-            yield b"s"
-            yield text[i:i + int(s)]
-            i += int(s)
-        else:
-            yield s
+# Values of these keys are binary blobs, there is no point in trying to decode them as text
+RAW_KEYS = frozenset([b'pieces'])
 
 
-def decode_item(next, token):
-    if token == b"i":
-        # integer: "i" value "e"
-        data = int(next())
-        if next() != b"e":
-            raise ValueError
-    elif token == b"s":
-        # string: "s" value (virtual tokens)
-        data = next()
+def _decode_string(text, i, raw=False):
+    colon = text.index(b':', i)
+    length = int(text[i:colon])
+    if length < 0:
+        raise ValueError('negative string length')
+    end = colon + 1 + length
+    data = text[colon + 1:end]
+    if len(data) != length:
+        raise ValueError('string extends past end of data')
+    if not raw:
         # Strings in torrent file are defined as utf-8 encoded
         try:
             data = data.decode('utf-8')
-        except UnicodeDecodeError as e:
-            # The pieces field is a byte string, and should be left as such.
+        except UnicodeDecodeError:
+            # Binary strings, like the pieces field, should be left as such.
             pass
-    elif token == b"l" or token == b"d":
-        # container: "l" (or "d") values "e"
+    return data, end
+
+
+def _decode_item(text, i):
+    """Decodes the item starting at index `i` of `text`, returns the item and the index following it."""
+    token = text[i]
+    if token == b'i':
+        # integer: "i" value "e"
+        end = text.index(b'e', i)
+        return int(text[i + 1:end]), end + 1
+    elif token == b'l':
+        # list: "l" values "e"
         data = []
-        tok = next()
-        while tok != b"e":
-            data.append(decode_item(next, tok))
-            tok = next()
-        if token == b"d":
-            data = dict(zip(data[0::2], data[1::2]))
-    else:
-        raise ValueError
-    return data
+        i += 1
+        while text[i] != b'e':
+            item, i = _decode_item(text, i)
+            data.append(item)
+        return data, i + 1
+    elif token == b'd':
+        # dictionary: "d" (key, value) pairs "e"
+        data = {}
+        i += 1
+        while text[i] != b'e':
+            key, i = _decode_string(text, i)
+            if text[i].isdigit():
+                value, i = _decode_string(text, i, raw=key in RAW_KEYS)
+            else:
+                value, i = _decode_item(text, i)
+            data[key] = value
+        return data, i + 1
+    elif token.isdigit():
+        return _decode_string(text, i)
+    raise ValueError('unexpected %r at position %d' % (token, i))
 
 
 def bdecode(text):
     try:
-        src = tokenize(text)
-        data = decode_item(src.next, src.next()) # pylint:disable=E1101
-        for token in src: # look for more tokens
-            raise SyntaxError("trailing junk")
-    except (AttributeError, ValueError, StopIteration) as e:
+        data, end = _decode_item(text, 0)
+    except (IndexError, ValueError) as e:
         raise SyntaxError("syntax error: %s" % e)
+    if end != len(text):
+        raise SyntaxError("trailing junk")
     return data
 
 
-# encoding implementation by d0b
-def encode_string(data):
-    return b"%d:%s" % (len(data), data)
+# encoding implementation by d0b, parts are collected into a list and joined once to avoid quadratic concatenation
+def _encode_string(data, parts):
+    parts.append(b"%d:" % len(data))
+    parts.append(data)
 
 
-def encode_unicode(data):
-    return encode_string(data.encode('utf8'))
+def _encode_unicode(data, parts):
+    _encode_string(data.encode('utf8'), parts)
 
 
-def encode_integer(data):
-    return b"i%de" % data
+def _encode_integer(data, parts):
+    parts.append(b"i%de" % data)
 
 
-def encode_list(data):
-    encoded = b"l"
+def _encode_list(data, parts):
+    parts.append(b"l")
     for item in data:
-        encoded += bencode(item)
-    encoded += b"e"
-    return encoded
+        _encoders[type(item)](item, parts)
+    parts.append(b"e")
+
+
+def _encode_dictionary(data, parts):
+    parts.append(b"d")
+    for key, value in sorted(data.items()):
+        _encoders[type(key)](key, parts)
+        _encoders[type(value)](value, parts)
+    parts.append(b"e")
 
 
-def encode_dictionary(data):
-    encoded = b"d"
-    items = data.items()
-    items.sort()
-    for (key, value) in items:
-        encoded += bencode(key)
-        encoded += bencode(value)
-    encoded += b"e"
-    return encoded
+_encoders = {
+    str: _encode_string,
+    unicode: _encode_unicode,
+    int: _encode_integer,
+    long: _encode_integer,
+    list: _encode_list,
+    dict: _encode_dictionary}
+
+
+def _join_encoded(func):
+    def encode(data):
+        parts = []
+        func(data, parts)
+        return b"".join(parts)
+    return encode
+
+
+encode_string = _join_encoded(_encode_string)
+encode_unicode = _join_encoded(_encode_unicode)
+encode_integer = _join_encoded(_encode_integer)
+encode_list = _join_encoded(_encode_list)
+encode_dictionary = _join_encoded(_encode_dictionary)
 
 
 def bencode(data):
-    encode_func = {
-        str: encode_string,
-        unicode: encode_unicode,
-        int: encode_integer,
-        long: encode_integer,
-        list: encode_list,
-        dict: encode_dictionary}
-    return encode_func[type(data)](data)
+    parts = []
+    _encoders[type(data)](data, parts)
+    return b"".join(parts)
 
 
 class Torrent(object):
@@ -203,6 +231,26 @@ class Torrent(object):
         self.content = bdecode(content)
         self.modified = False
 
+    # Info hash is cached until the content is replaced or marked as modified. Code changing the info dictionary in
+    # place must set `modified` afterwards.
+    @property
+    def content(self):
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self._info_hash = None
+
+    @property
+    def modified(self):
+        return self._modified
+
+    @modified.setter
+    def modified(self, modified):
+        self._modified = modified
+        self._info_hash = None
+
     def __repr__(self):
         return "%s(%s, %s)" % (self.__class__.__name__,
             ", ".join("%s=%r" % (key, self.content["info"].get(key))
@@ -279,11 +327,10 @@ class Torrent(object):
     @property
     def info_hash(self):
         """Return Torrent info hash"""
-        import hashlib
-        hash = hashlib.sha1()
-        info_data = encode_dictionary(self.content['info'])
-        hash.update(info_data)
-        return hash.hexdigest().upper()
+        if self._info_hash is None:
+            info_data = encode_dictionary(self.content['info'])
+            self._info_hash = hashlib.sha1(info_data).hexdigest().upper()
+        return self._info_hash
 
     @property
     def comment(self):
@@ -7,7 +7,7 @@ from sqlalchemy import extract, func
 from sqlalchemy.orm import synonym
 from sqlalchemy.ext.hybrid import Comparator, hybrid_property
 
-from flexget.manager import Session
+from flexget.manager import Session, ReadSession
 from flexget.utils import qualities, json
 
 
@@ -18,7 +18,8 @@ def with_session(*args, **kwargs):
     Automatically commits and closes the session if one was created, caller is responsible for commit if passed in.
 
     If arguments are given when used as a decorator, they will automatically be passed to the created Session when
-    one is not supplied.
+    one is not supplied. The `read_only` argument creates a :data:`flexget.manager.ReadSession` instead, for functions
+    which never write.
     """
 
     def decorator(func):
@@ -37,7 +38,8 @@ def with_session(*args, **kwargs):
         return decorator(args[0])
     else:
         # Arguments were specified, turn them into arguments for Session creation e.g. @with_session(autocommit=True)
-        _Session = functools.partial(Session, *args, **kwargs)
+        session_class = ReadSession if kwargs.pop('read_only', False) else Session
+        _Session = functools.partial(session_class, *args, **kwargs)
         return decorator
 
 
@@ -77,51 +79,52 @@ def text_date_synonym(name):
     return synonym(name, descriptor=property(getter, setter))
 
 
-def safe_pickle_synonym(name):
-    """Used to store Entry instances into a PickleType column in the database.
+def only_builtins(item):
+    """Casts all subclasses of builtin types to their builtin python type. Works recursively on iterables.
 
-    In order to ensure everything can be loaded after code changes, makes sure no custom python classes are pickled.
+    Raises ValueError if passed an object that doesn't subclass a builtin type.
     """
 
-    def only_builtins(item):
-        """Casts all subclasses of builtin types to their builtin python type. Works recursively on iterables.
-
-        Raises ValueError if passed an object that doesn't subclass a builtin type.
-        """
+    supported_types = [str, unicode, int, float, long, bool, datetime]
+    # dict, list, tuple and set are also supported, but handled separately
 
-        supported_types = [str, unicode, int, float, long, bool, datetime]
-        # dict, list, tuple and set are also supported, but handled separately
-
-        if type(item) in supported_types:
-            return item
-        elif isinstance(item, Mapping):
-            result = {}
-            for key, value in item.iteritems():
-                try:
-                    result[key] = only_builtins(value)
-                except TypeError:
-                    continue
+    if type(item) in supported_types:
+        return item
+    elif isinstance(item, Mapping):
+        result = {}
+        for key, value in item.iteritems():
+            try:
+                result[key] = only_builtins(value)
+            except TypeError:
+                continue
+        return result
+    elif isinstance(item, (list, tuple, set)):
+        result = []
+        for value in item:
+            try:
+                result.append(only_builtins(value))
+            except ValueError:
+                continue
+        if isinstance(item, list):
             return result
-        elif isinstance(item, (list, tuple, set)):
-            result = []
-            for value in item:
-                try:
-                    result.append(only_builtins(value))
-                except ValueError:
-                    continue
-            if isinstance(item, list):
-                return result
-            elif isinstance(item, tuple):
-                return tuple(result)
-            else:
-                return set(result)
+        elif isinstance(item, tuple):
+            return tuple(result)
         else:
-            for s_type in supported_types:
-                if isinstance(item, s_type):
-                    return s_type(item)
+            return set(result)
+    else:
+        for s_type in supported_types:
+            if isinstance(item, s_type):
+                return s_type(item)
+
+    # If item isn't a subclass of a builtin python type, raise ValueError.
+    raise TypeError('%r is not a subclass of a builtin python type.' % type(item))
+
+
+def safe_pickle_synonym(name):
+    """Used to store Entry instances into a PickleType column in the database.
 
-        # If item isn't a subclass of a builtin python type, raise ValueError.
-        raise TypeError('%r is not a subclass of a builtin python type.' % type(item))
+    In order to ensure everything can be loaded after code changes, makes sure no custom python classes are pickled.
+    """
 
     def getter(self):
         return getattr(self, name)
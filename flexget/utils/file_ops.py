@@ -0,0 +1,264 @@
+"""
+Copying and moving files with the fastest method the platform and filesystems allow.
+
+Moves on the same filesystem are renames. Copies on filesystems supporting it (btrfs, xfs, ...) are reflinks, which
+share the data blocks instead of copying them. Otherwise the data is copied by the kernel with `copy_file_range` or
+`sendfile` on linux, and by reading and writing large chunks elsewhere.
+"""
+from __future__ import unicode_literals, division, absolute_import
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import shutil
+import stat
+import sys
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+log = logging.getLogger('file_ops')
+
+# ioctl which makes the destination file share the data blocks of the source file, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# Amount of data copied with each system call
+CHUNK_SIZE = 8 * 1024 * 1024
+# Errors which mean a copy method isn't supported for the files, rather than the copy failing
+UNSUPPORTED_ERRORS = set(getattr(errno, name) for name in
+                         ('ENOSYS', 'ENOTSUP', 'EOPNOTSUPP', 'ENOTTY', 'EXDEV', 'EINVAL', 'EBADF', 'ETXTBSY')
+                         if hasattr(errno, name))
+
+#: Result of a copy or move. `method` is how the data got to the destination, `size` is the amount of data copied in
+#: bytes, None for renames.
+Transfer = namedtuple('Transfer', ['method', 'size'])
+
+
+def _libc_function(name, restype, argtypes):
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        func = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+    func.restype = restype
+    func.argtypes = argtypes
+    return func
+
+
+# Offsets are passed as NULL, so the file positions are used and updated, like with read and write
+_copy_file_range = _libc_function('copy_file_range', ctypes.c_ssize_t, [
+    ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint])
+_sendfile = _libc_function('sendfile64', ctypes.c_ssize_t, [ctypes.c_int, ctypes.c_int, ctypes.c_void_p,
+                                                            ctypes.c_size_t])
+
+
+def _check(result):
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+
+def _copy_file_range_chunk(src_fd, dst_fd):
+    return _check(_copy_file_range(src_fd, None, dst_fd, None, CHUNK_SIZE, 0))
+
+
+def _sendfile_chunk(src_fd, dst_fd):
+    return _check(_sendfile(dst_fd, src_fd, None, CHUNK_SIZE))
+
+
+def _read_write_chunk(src_fd, dst_fd):
+    data = os.read(src_fd, CHUNK_SIZE)
+    written = 0
+    while written < len(data):
+        written += os.write(dst_fd, data[written:])
+    return len(data)
+
+
+_methods = [(name, func) for name, func in (
+    ('copy_file_range', _copy_file_range and _copy_file_range_chunk),
+    ('sendfile', _sendfile and _sendfile_chunk),
+) if func] + [('read/write', _read_write_chunk)]
+
+
+def reflink(src_fd, dst_fd):
+    """Makes `dst_fd` share the data of `src_fd`. Returns False if the filesystem(s) don't support it."""
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except (IOError, OSError) as e:
+        if e.errno in UNSUPPORTED_ERRORS:
+            return False
+        raise
+    return True
+
+
+def copy_data(src_fd, dst_fd, size):
+    """
+    Copies the data of a file to another one, both given as file descriptors positioned at their start.
+
+    :param size: Size of the source file
+    :return: Tuple of the name of the method which was used and the amount of bytes copied
+    """
+    if reflink(src_fd, dst_fd):
+        return 'reflink', size
+    for name, copy_chunk in _methods:
+        copied = 0
+        try:
+            while True:
+                count = copy_chunk(src_fd, dst_fd)
+                if not count:
+                    break
+                copied += count
+        except OSError as e:
+            # Only try the next method when this one couldn't copy anything at all
+            if copied or e.errno not in UNSUPPORTED_ERRORS or name == 'read/write':
+                raise
+            log.debug('Copying with %s is not supported (%s)' % (name, e))
+            continue
+        # Some filesystems (fuse, network, proc, ...) report the end of file right away to the kernel copies
+        if copied or not size or name == 'read/write':
+            return name, copied
+        log.debug('Copying with %s copied nothing from a file of %s bytes' % (name, size))
+
+
+def copy_file(src, dst, metadata=False, verify=False):
+    """
+    Copies file `src` to `dst` (a file or directory), like :func:`shutil.copy`, or :func:`shutil.copy2` when
+    `metadata` is True.
+
+    :param verify: Raise :class:`shutil.Error` and remove the copy when less or more data was copied than the size of
+        `src`
+    :return: :class:`Transfer`
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.Error('`%s` and `%s` are the same file' % (src, dst))
+    with open(src, 'rb') as fsrc:
+        st = os.fstat(fsrc.fileno())
+        if stat.S_ISFIFO(st.st_mode):
+            raise shutil.SpecialFileError('`%s` is a named pipe' % src)
+        with open(dst, 'wb') as fdst:
+            method, copied = copy_data(fsrc.fileno(), fdst.fileno(), st.st_size)
+    if verify and copied != st.st_size:
+        os.unlink(dst)
+        raise shutil.Error('Copied %s bytes of `%s` to `%s`, but it has %s bytes' % (copied, src, dst, st.st_size))
+    if metadata:
+        shutil.copystat(src, dst)
+    else:
+        shutil.copymode(src, dst)
+    return Transfer(method, copied)
+
+
+def _run(func, jobs, workers):
+    """Runs `func` on each of `jobs` in `workers` threads, returns the results in order."""
+    if workers <= 1 or len(jobs) <= 1:
+        return [func(*job) for job in jobs]
+    pool = ThreadPool(min(workers, len(jobs)))
+    try:
+        return pool.map(lambda job: func(*job), jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def copy_tree(src, dst, symlinks=False, metadata=True, workers=1, verify=False):
+    """
+    Copies directory `src` to `dst`, which must not exist yet, like :func:`shutil.copytree`. The files are copied by
+    `workers` threads at the same time.
+
+    :param verify: Fail the copy of files which didn't get all their data copied, see :func:`copy_file`
+
+    :return: :class:`Transfer`, with the methods used joined by a comma
+    """
+    files = []
+    dirs = []
+    errors = []
+    for path, dir_names, file_names in os.walk(src):
+        dst_path = os.path.join(dst, os.path.relpath(path, src))
+        os.makedirs(dst_path)
+        dirs.append((path, dst_path))
+        for name in dir_names + file_names:
+            src_name = os.path.join(path, name)
+            dst_name = os.path.join(dst_path, name)
+            if symlinks and os.path.islink(src_name):
+                os.symlink(os.readlink(src_name), dst_name)
+            elif name in file_names or os.path.islink(src_name):
+                # os.walk doesn't go into symlinked directories, they are copied as trees of their own
+                files.append((src_name, dst_name))
+
+    def copy(src_name, dst_name):
+        try:
+            if os.path.isdir(src_name):
+                return copy_tree(src_name, dst_name, symlinks, metadata, verify=verify)
+            return copy_file(src_name, dst_name, metadata=True, verify=verify)
+        except (IOError, OSError, shutil.Error) as e:
+            errors.append((src_name, dst_name, str(e)))
+
+    transfers = [transfer for transfer in _run(copy, files, workers) if transfer]
+    for path, dst_path in reversed(dirs):
+        try:
+            shutil.copystat(path, dst_path)
+        except OSError as e:
+            errors.append((path, dst_path, str(e)))
+    if errors:
+        raise shutil.Error(errors)
+    methods = sorted(set(method for transfer in transfers for method in transfer.method.split(',')))
+    return Transfer(','.join(methods) or 'none', sum(transfer.size for transfer in transfers))
+
+
+def move(src, dst, workers=1):
+    """
+    Moves file or directory `src` to `dst`, like :func:`shutil.move`. It's renamed if it stays on the same filesystem,
+    otherwise it's copied and then removed.
+
+    :param workers: Amount of files which are copied at the same time when moving a directory to another filesystem
+    :return: :class:`Transfer`
+    """
+    real_dst = dst
+    if os.path.isdir(dst):
+        if os.path.exists(src) and os.path.samefile(src, dst):
+            # Renaming the case of a directory on a case insensitive filesystem
+            os.rename(src, dst)
+            return Transfer('rename', None)
+        real_dst = os.path.join(dst, os.path.basename(src.rstrip(os.sep)))
+        if os.path.exists(real_dst):
+            raise shutil.Error('Destination path `%s` already exists' % real_dst)
+    try:
+        os.rename(src, real_dst)
+        return Transfer('rename', None)
+    except OSError as e:
+        log.debug('Cannot rename `%s` to `%s` (%s), copying' % (src, real_dst, e))
+    if os.path.isdir(src) and not os.path.islink(src):
+        abs_src = os.path.abspath(src).rstrip(os.sep) + os.sep
+        if os.path.abspath(real_dst).startswith(abs_src):
+            raise shutil.Error('Cannot move a directory `%s` into itself `%s`' % (src, dst))
+        # The source is only removed once all of its data is known to be at the destination
+        transfer = copy_tree(src, real_dst, symlinks=True, workers=workers, verify=True)
+        shutil.rmtree(src)
+    elif os.path.islink(src):
+        os.symlink(os.readlink(src), real_dst)
+        os.unlink(src)
+        transfer = Transfer('symlink', None)
+    else:
+        transfer = copy_file(src, real_dst, metadata=True, verify=True)
+        os.unlink(src)
+    return transfer
+
+
+def format_throughput(transfer, seconds):
+    """Human readable description of `transfer`, taking `seconds`."""
+    if transfer.size is None:
+        return transfer.method
+    size = transfer.size / 1024 / 1024
+    if transfer.method == 'reflink' or seconds <= 0:
+        return '%.1f MiB, %s' % (size, transfer.method)
+    return '%.1f MiB in %.1f s, %.1f MiB/s, %s' % (size, seconds, size / seconds, transfer.method)
@@ -0,0 +1,310 @@
+"""
+Private HTTP cache for :class:`flexget.utils.requests.Session`, following the Cache-Control, Expires, ETag and
+Last-Modified headers of the responses. Bodies are stored on disk, the least recently used ones are removed when the
+cache grows over its size limit.
+"""
+from __future__ import unicode_literals, division, absolute_import
+from collections import OrderedDict
+from email.utils import parsedate_tz, mktime_tz
+from urlparse import urlparse
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger('http_cache')
+
+# Responses larger than this are never stored
+MAX_ENTRY_SIZE = 5 * 1024 * 1024
+# Status codes of responses which are stored
+CACHEABLE_STATUS = (200, 203, 300, 301, 410)
+# Heuristic freshness of responses with only Last-Modified is a fraction of their age, up to a day
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX = 24 * 60 * 60
+# Feeds get new items without notice no matter how long ago they last changed, they don't get heuristic freshness
+FEED_TYPES = ('rss', 'atom', 'xml')
+# Headers describing the body as sent, which don't apply to the decoded body in the cache
+BODY_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+def parse_cache_control(value):
+    """Returns the directives of a Cache-Control header as dict, directives without a value map to True."""
+    directives = {}
+    for part in (value or '').split(','):
+        name, sep, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if sep else True
+    return directives
+
+
+def parse_date(value):
+    """Timestamp of a HTTP date header, None if it's missing or invalid."""
+    parsed = parsedate_tz(value) if value else None
+    if not parsed:
+        return None
+    try:
+        return mktime_tz(parsed)
+    except (ValueError, OverflowError):
+        return None
+
+
+def freshness_lifetime(headers, fetched):
+    """Seconds a response with `headers` fetched at `fetched` may be used without revalidating, None if unknown."""
+    cache_control = parse_cache_control(headers.get('cache-control'))
+    if 'max-age' in cache_control:
+        try:
+            return int(cache_control['max-age'])
+        except ValueError:
+            return 0
+    expires = headers.get('expires')
+    if expires is not None:
+        expires = parse_date(expires)
+        # Invalid dates, like 0, mean already expired
+        return expires - (parse_date(headers.get('date')) or fetched) if expires else 0
+    last_modified = parse_date(headers.get('last-modified'))
+    if last_modified and not any(feed_type in headers.get('content-type', '').lower() for feed_type in FEED_TYPES):
+        age = (parse_date(headers.get('date')) or fetched) - last_modified
+        return min(max(age, 0) * HEURISTIC_FRACTION, HEURISTIC_MAX)
+    return None
+
+
+class DiskStore(object):
+    """
+    Stores cache entries as files in `path`, removing the least recently used ones when their total size exceeds
+    `max_size` bytes. The modification time of the files keeps the order of use between runs.
+    """
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        # File name -> size, from least to most recently used
+        self.files = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        found = []
+        for name in os.listdir(path):
+            if name.endswith('.tmp'):
+                # Left behind by an interrupted write
+                self._remove(name)
+                continue
+            try:
+                st = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+            found.append((st.st_mtime, name, st.st_size))
+        for mtime, name, size in sorted(found):
+            self.files[name] = size
+            self.size += size
+        self.evict()
+
+    def _name(self, key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns the (meta, body) stored for `key`, or None."""
+        name = self._name(key)
+        with self.lock:
+            if name not in self.files:
+                return None
+            self.files[name] = self.files.pop(name)
+        filename = os.path.join(self.path, name)
+        try:
+            with io.open(filename, 'rb') as f:
+                meta = json.loads(f.readline().decode('utf-8'))
+                body = f.read()
+            os.utime(filename, None)
+        except (IOError, OSError, ValueError) as e:
+            log.debug('Could not read cache entry %s: %s' % (name, e))
+            self.delete(key)
+            return None
+        if meta.get('key') != key:
+            return None
+        return meta, body
+
+    def set(self, key, meta, body):
+        name = self._name(key)
+        meta = dict(meta, key=key)
+        data = json.dumps(meta).encode('utf-8') + b'\n' + body
+        filename = os.path.join(self.path, name)
+        # Written under another name first, so readers never see partial entries
+        temp = '%s.%s.tmp' % (filename, threading.current_thread().ident)
+        try:
+            with io.open(temp, 'wb') as f:
+                f.write(data)
+            os.rename(temp, filename)
+        except (IOError, OSError) as e:
+            log.debug('Could not write cache entry %s: %s' % (name, e))
+            return
+        with self.lock:
+            self.size += len(data) - self.files.pop(name, 0)
+            self.files[name] = len(data)
+            self.evict()
+
+    def __contains__(self, key):
+        return self._name(key) in self.files
+
+    def delete(self, key):
+        self._remove(self._name(key))
+
+    def _remove(self, name):
+        with self.lock:
+            self.size -= self.files.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.path, name))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Removes the least recently used entries until the store fits in `max_size`."""
+        with self.lock:
+            while self.size > self.max_size and self.files:
+                name = next(iter(self.files))
+                self._remove(name)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            for name in list(self.files):
+                self._remove(name)
+
+
+class HTTPCache(object):
+    """
+    Decides which responses can be stored, and whether stored responses are fresh or need revalidating.
+
+    :param store: :class:`DiskStore` for the entries.
+    :param dict domain_ttls: Domain -> seconds. Responses from these domains (or their subdomains) are used for this
+        long regardless of their headers.
+    """
+
+    def __init__(self, store, domain_ttls=None):
+        self.store = store
+        self.domain_ttls = domain_ttls or {}
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stored': 0}
+        # Key -> (timestamp until which it's fresh, vary) of the entries looked up or stored by this process
+        self.fresh_until = {}
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats['entries'] = len(self.store.files)
+        stats['size'] = self.store.size
+        stats['evicted'] = self.store.evictions
+        return stats
+
+    def domain_ttl(self, url):
+        host = urlparse(url).hostname or ''
+        for domain, ttl in self.domain_ttls.iteritems():
+            if host == domain or host.endswith('.' + domain):
+                return ttl
+        return None
+
+    def key(self, request):
+        # Only GET responses are stored, HEAD requests can use their headers
+        return request.url
+
+    def usable(self, request):
+        """Whether the response to `request` may come from, or go to, the cache."""
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        cache_control = parse_cache_control(request.headers.get('Cache-Control'))
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            return False
+        # Responses for logged in users are only cached when explicitly configured for the domain
+        if 'Authorization' in request.headers or 'Cookie' in request.headers:
+            return self.domain_ttl(request.url) is not None
+        # Conditional requests made by the caller get the server's answer
+        return 'If-None-Match' not in request.headers and 'If-Modified-Since' not in request.headers
+
+    def lookup(self, request):
+        """
+        Returns (meta, body, fresh) for the stored response matching `request`, or None. When not fresh, the stored
+        response may only be used after the server has confirmed it is still valid.
+        """
+        found = self.store.get(self.key(request))
+        if not found:
+            return None
+        meta, body = found
+        for name, value in meta['vary'].iteritems():
+            if request.headers.get(name) != value:
+                return None
+        expires = self._remember(request, meta)
+        return meta, body, time.time() < expires
+
+    def is_fresh(self, request):
+        """
+        Whether `request` will be answered from the cache without asking the server. Entries which were looked up or
+        stored before are checked in memory.
+        """
+        if not self.usable(request):
+            return False
+        key = self.key(request)
+        known = self.fresh_until.get(key)
+        if known is None or key not in self.store:
+            found = self.lookup(request)
+            return bool(found and found[2])
+        expires, vary = known
+        return time.time() < expires and all(request.headers.get(name) == value for name, value in vary.iteritems())
+
+    def _remember(self, request, meta):
+        """Remembers until when the stored response `meta` is fresh, and returns that timestamp."""
+        lifetime = self.domain_ttl(request.url)
+        if lifetime is None:
+            if 'no-cache' in parse_cache_control(meta['headers'].get('cache-control')):
+                lifetime = 0
+            else:
+                lifetime = freshness_lifetime(meta['headers'], meta['fetched']) or 0
+        expires = meta['fetched'] + lifetime
+        self.fresh_until[self.key(request)] = expires, meta['vary']
+        return expires
+
+    def storable(self, request, status, headers):
+        """Whether a response with `status` and `headers` to `request` may be stored."""
+        if status not in CACHEABLE_STATUS:
+            return False
+        if request.method != 'GET':
+            return False
+        if self.domain_ttl(request.url) is not None:
+            return True
+        cache_control = parse_cache_control(headers.get('cache-control'))
+        if 'no-store' in cache_control or headers.get('vary', '').strip() == '*' or 'set-cookie' in headers:
+            return False
+        # Without any of these, the response would have to be fetched again anyway
+        return bool(freshness_lifetime(headers, time.time()) or 'etag' in headers or 'last-modified' in headers or
+                    'no-cache' in cache_control)
+
+    def _meta(self, request, status, reason, headers):
+        headers = dict((name.lower(), value) for name, value in headers.items() if name.lower() not in BODY_HEADERS)
+        vary = {}
+        for name in headers.get('vary', '').split(','):
+            name = name.strip()
+            if name:
+                vary[name] = request.headers.get(name)
+        return {'status': status, 'reason': reason, 'headers': headers, 'vary': vary, 'fetched': time.time()}
+
+    def save(self, request, status, reason, headers, body):
+        """Stores the response to `request`, `body` is the decoded content."""
+        meta = self._meta(request, status, reason, headers)
+        self.store.set(self.key(request), meta, body)
+        self._remember(request, meta)
+        self.count('stored')
+
+    def refresh(self, request, meta, body, headers):
+        """Updates a stored response after the server answered 304 Not Modified with `headers`, returns new meta."""
+        updated = dict(meta['headers'])
+        updated.update((name.lower(), value) for name, value in headers.items())
+        meta = self._meta(request, meta['status'], meta['reason'], updated)
+        self.store.set(self.key(request), meta, body)
+        self._remember(request, meta)
+        return meta
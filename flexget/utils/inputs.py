@@ -0,0 +1,167 @@
+"""
+Running several input plugins for the plugins combining their entries, such as inputs, discover and crossmatch.
+
+The inputs run at the same time in a bounded amount of threads, so combining many feeds takes about as long as the
+slowest one instead of all of them added up. Inputs which fail or don't finish in time are logged and skipped without
+affecting the others.
+"""
+from __future__ import unicode_literals, division, absolute_import
+from collections import deque
+from Queue import Queue, Empty
+import logging
+import threading
+import time
+
+from flexget import logger, plugin
+from flexget.utils.sqlalchemy_utils import threads_share_database
+
+log = logging.getLogger('run_inputs')
+
+# Amount of inputs running at the same time
+MAX_WORKERS = 8
+# Seconds an input may run before its entries are given up on
+INPUT_TIMEOUT = 10 * 60
+
+
+def get_input_handler(name):
+    """Returns the input phase handler of plugin `name`."""
+    input = plugin.get_plugin_by_name(name)
+    if input.api_ver == 1:
+        raise plugin.PluginError('Plugin %s does not support API v2' % name)
+    return input.phase_handlers['input']
+
+
+def threads_usable(task):
+    """Whether inputs can run in other threads, they may use the database too."""
+    return threads_share_database(getattr(task.manager, 'engine', None))
+
+
+class InputRun(object):
+    """Result of running a single input."""
+
+    def __init__(self, task, name, config):
+        self.task = task
+        self.name = name
+        self.config = config
+        self.method = get_input_handler(name)
+        self.entries = None
+        self.error = None
+        self.started = None
+        self.done = False
+        # Set when the input didn't finish in time, its work is thrown away when it does finish
+        self.abandoned = False
+
+    def run(self):
+        with logger.task_logging(self.task.name, self.task.id):
+            try:
+                self.entries = self.method(self.task, self.config)
+            except (plugin.PluginError, plugin.PluginWarning) as e:
+                self.error = e
+            except Exception as e:
+                log.exception('BUG: Unhandled error in input %s' % self.name)
+                self.error = e
+
+    def __call__(self, finished=None):
+        if finished is None:
+            self.run()
+            self.done = True
+            return
+        # The task session belongs to the calling thread, inputs in worker threads get a session of their own
+        with self.task.worker_session(commit=lambda: self.error is None and not self.abandoned):
+            self.run()
+        if self.abandoned:
+            log.debug('Input %s finished after its timeout, its entries are discarded' % self.name)
+        finished.put(self)
+
+
+def _run_threaded(runs, workers, timeout):
+    pending = deque(runs)
+    running = set()
+    finished = Queue()
+    while pending or running:
+        while pending and len(running) < workers:
+            run = pending.popleft()
+            run.started = time.time()
+            thread = threading.Thread(target=run, args=(finished,), name='input-%s' % run.name)
+            # Inputs which time out are left running, they must not keep the process alive
+            thread.daemon = True
+            thread.start()
+            running.add(run)
+        deadline = min(run.started for run in running) + timeout
+        try:
+            run = finished.get(timeout=max(deadline - time.time(), 0))
+        except Empty:
+            now = time.time()
+            for run in list(running):
+                if now >= run.started + timeout:
+                    run.abandoned = True
+                    running.discard(run)
+        else:
+            run.done = True
+            running.discard(run)
+
+
+def run_inputs(task, inputs, workers=None, timeout=None):
+    """
+    Runs input plugins and returns their results in the order they were given. Inputs which fail, time out or don't
+    produce anything are logged and left out.
+
+    :param task: Current task
+    :param inputs: List of (input plugin name, config) pairs
+    :param int workers: Amount of inputs running at the same time, :data:`MAX_WORKERS` by default
+    :param timeout: Seconds an input may run, :data:`INPUT_TIMEOUT` by default. Only enforced when the inputs run in
+        threads.
+    :return: List of (input plugin name, list of entries) pairs
+    """
+    workers = workers or MAX_WORKERS
+    timeout = timeout or INPUT_TIMEOUT
+    # Unknown plugins are configuration errors which fail the whole task, before anything is run
+    runs = [InputRun(task, name, config) for name, config in inputs]
+    if workers > 1 and len(runs) > 1 and threads_usable(task):
+        _run_threaded(runs, workers, timeout)
+    else:
+        for run in runs:
+            run()
+    results = []
+    for run in runs:
+        if not run.done:
+            log.warning('Input %s did not finish in %s seconds, skipping its entries' % (run.name, timeout))
+        elif run.error is not None:
+            log.warning('Error during input plugin %s: %s' % (run.name, run.error))
+        elif not run.entries:
+            msg = 'Input %s did not return anything' % run.name
+            if getattr(task, 'no_entries_ok', False):
+                log.verbose(msg)
+            else:
+                log.warning(msg)
+        else:
+            results.append((run.name, run.entries))
+    return results
+
+
+def merge_entries(results):
+    """
+    Combines the entries of :func:`run_inputs` results into a single list, leaving out entries with the title or one
+    of the urls of an entry before them.
+    """
+    entries = []
+    entry_titles = set()
+    entry_urls = set()
+    for name, result in results:
+        for entry in result:
+            if entry['title'] in entry_titles:
+                log.debug('Title `%s` already in entry list, skipping.' % entry['title'])
+                continue
+            urls = ([entry['url']] if entry.get('url') else []) + entry.get('urls', [])
+            if any(url in entry_urls for url in urls):
+                log.debug('URL for `%s` already in entry list, skipping.' % entry['title'])
+                continue
+            entries.append(entry)
+            entry_titles.add(entry['title'])
+            entry_urls.update(urls)
+    return entries
+
+
+def aggregate_inputs(task, inputs, **kwargs):
+    """Runs `inputs` like :func:`run_inputs`, and returns their entries without duplicates."""
+    return merge_entries(run_inputs(task, inputs, **kwargs))
@@ -0,0 +1,208 @@
+"""Byte offset index of log files, used to quickly find the last lines or a time range of the log."""
+from __future__ import unicode_literals, division, absolute_import
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+log = logging.getLogger('log_index')
+
+# Every n-th line of a log file gets its byte offset stored in the index
+LINES_PER_BLOCK = 500
+# Matches the timestamp at the start of lines written by FlexGetFormatter
+TIMESTAMP_RE = re.compile(br'^(\d{4}-\d\d-\d\d \d\d:\d\d)')
+
+
+def line_timestamp(line):
+    match = TIMESTAMP_RE.match(line)
+    return match.group(1) if match else None
+
+
+class LogFileIndex(object):
+    """
+    Byte offset and timestamp of every `LINES_PER_BLOCK`th line of a log file. Allows reading the last N lines or a
+    time range without scanning the whole file.
+    """
+
+    def __init__(self, size=0, lines=0, offsets=None, timestamps=None, last_timestamp=None):
+        self.size = size
+        self.lines = lines
+        self.offsets = offsets or []
+        self.timestamps = timestamps or []
+        self.last_timestamp = last_timestamp
+
+    def update(self, fh):
+        """
+        Index complete lines added to the file since last update.
+
+        :return: True if the index changed
+        """
+        fh.seek(0, os.SEEK_END)
+        file_size = fh.tell()
+        if file_size < self.size:
+            # File was truncated or replaced, start over
+            self.__init__()
+        if file_size == self.size:
+            return False
+        fh.seek(self.size)
+        position = self.size
+        for line in iter(fh.readline, b''):
+            if not line.endswith(b'\n'):
+                # Line is still being written, index it next time
+                break
+            timestamp = line_timestamp(line)
+            if self.lines % LINES_PER_BLOCK == 0:
+                self.offsets.append(position)
+                self.timestamps.append(timestamp or self.last_timestamp)
+            elif self.timestamps[-1] is None:
+                self.timestamps[-1] = timestamp
+            if timestamp:
+                self.last_timestamp = timestamp
+            position += len(line)
+            self.lines += 1
+        changed = position != self.size
+        self.size = position
+        return changed
+
+    def blocks(self):
+        """Yields (start byte, end byte, first timestamp, last timestamp) for each block, newest first."""
+        for i in range(len(self.offsets) - 1, -1, -1):
+            if i + 1 < len(self.offsets):
+                end, last_timestamp = self.offsets[i + 1], self.timestamps[i + 1]
+            else:
+                end, last_timestamp = self.size, self.last_timestamp
+            yield self.offsets[i], end, self.timestamps[i], last_timestamp
+
+    def to_dict(self):
+        return {'size': self.size, 'lines': self.lines, 'offsets': self.offsets, 'timestamps': self.timestamps,
+                'last_timestamp': self.last_timestamp}
+
+
+class LogIndexStore(object):
+    """
+    Keeps a `LogFileIndex` for the log file and each of its rotated backups, keyed by inode so they follow the files
+    through rotation. Indexes of rotated files are saved to a sidecar file next to the log to survive restarts.
+    """
+
+    def __init__(self, base_log_file):
+        self.base_log_file = base_log_file
+        self.sidecar = base_log_file + '.index'
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.saved = set()
+        try:
+            with open(self.sidecar, 'rb') as f:
+                for inode, data in json.load(f).iteritems():
+                    self.indexes[int(inode)] = LogFileIndex(**data)
+                    self.saved.add(int(inode))
+        except (IOError, ValueError, TypeError) as e:
+            log.debug('Not using log index sidecar %s: %s', self.sidecar, e)
+
+    def get(self, filename, fh):
+        """Returns an up to date index for the open log file `fh`."""
+        inode = os.fstat(fh.fileno()).st_ino
+        with self.lock:
+            index = self.indexes.setdefault(inode, LogFileIndex())
+            if index.update(fh):
+                self.saved.discard(inode)
+            if filename != self.base_log_file and inode not in self.saved:
+                # Rotated files do not change anymore, worth saving the index
+                self._save()
+            return index
+
+    def _save(self):
+        inodes = set()
+        for i in range(1, 10):
+            try:
+                inodes.add(os.stat('%s.%s' % (self.base_log_file, i)).st_ino)
+            except OSError:
+                break
+        # Forget about files that have been rotated out
+        for inode in list(self.indexes):
+            if inode not in inodes and inode != file_inode(self.base_log_file):
+                del self.indexes[inode]
+        try:
+            with open(self.sidecar, 'wb') as f:
+                json.dump(dict((str(inode), self.indexes[inode].to_dict()) for inode in inodes
+                               if inode in self.indexes), f)
+            self.saved = inodes
+        except IOError as e:
+            log.debug('Unable to save log index to %s: %s', self.sidecar, e)
+
+
+_index_stores = {}
+_index_stores_lock = threading.Lock()
+
+
+def get_index_store(base_log_file):
+    with _index_stores_lock:
+        if base_log_file not in _index_stores:
+            _index_stores[base_log_file] = LogIndexStore(base_log_file)
+        return _index_stores[base_log_file]
+
+
+def line_in_range(line, since=None, until=None):
+    if not (since or until):
+        return True
+    timestamp = line_timestamp(line)
+    if not timestamp:
+        # Continuation lines (tracebacks) have no timestamp of their own
+        return True
+    return (not since or timestamp >= since) and (not until or timestamp <= until)
+
+
+def range_ended(until):
+    """Whether the clock is past `until`, so no line logged from now on can be in the time range."""
+    return bool(until) and time.strftime('%Y-%m-%d %H:%M').encode('ascii') > until
+
+
+def read_log_lines(base_log_file, lines, log_parser, since=None, until=None):
+    """
+    Finds the last `lines` lines matching `log_parser` and the time range from the log file and its rotated backups.
+    Only the index blocks needed to satisfy the query are read.
+
+    :param log_parser: Filter for the lines, object with a `matches(line)` method
+
+    :return: Tuple of matching lines (oldest first) and the byte offset in the log file to continue streaming from
+    """
+    store = get_index_store(base_log_file)
+    found = []
+    stream_from_byte = 0
+    for i in range(0, 10):
+        log_file = '%s.%s' % (base_log_file, i) if i else base_log_file  # 1st log file has no number
+        if not os.path.isfile(log_file):
+            break
+        done = False
+        with open(log_file, 'rb') as fh:
+            index = store.get(log_file, fh)
+            if i == 0:
+                stream_from_byte = index.size  # Stream from this point later on
+            for start, end, first_timestamp, last_timestamp in index.blocks():
+                if len(found) >= lines:
+                    break
+                if until and first_timestamp and first_timestamp > until:
+                    continue
+                if since and last_timestamp and last_timestamp < since:
+                    # Everything from here back is older than requested
+                    done = True
+                    break
+                fh.seek(start)
+                for line in reversed(fh.read(end - start).splitlines()):
+                    if len(found) >= lines:
+                        break
+                    if line_in_range(line, since, until) and log_parser.matches(line):
+                        found.append(line)
+        if done or len(found) >= lines:
+            break
+    found.reverse()
+    return found, stream_from_byte
+
+
+def file_inode(filename):
+    try:
+        return os.stat(filename).st_ino
+    except OSError:
+        return 0
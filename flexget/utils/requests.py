@@ -1,16 +1,27 @@
 from __future__ import unicode_literals, division, absolute_import
+import io
+import json
+import os
 import urllib2
 import time
 import logging
-from datetime import timedelta, datetime
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
 from urlparse import urlparse
 
 import requests
 # Allow some request objects to be imported from here instead of requests
 import warnings
 from requests import RequestException, HTTPError
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import select_proxy, get_encoding_from_headers
+from requests.packages.urllib3.poolmanager import PoolManager
 
 from flexget import __version__ as version
+from flexget.event import event
+from flexget.utils.http_cache import MAX_ENTRY_SIZE
 from flexget.utils.tools import parse_timedelta, TimedDict, timedelta_total_seconds
 
 # If we use just 'requests' here, we'll get the logger created by requests, rather than our own
@@ -21,10 +32,21 @@ logging.getLogger('requests.packages.urllib3').setLevel(logging.WARNING)
 # same as above, but for systems where urllib3 isn't part of the requests pacakge (i.e., Ubuntu)
 logging.getLogger('urllib3').setLevel(logging.WARNING)
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # Time to wait before trying an unresponsive site again
 WAIT_TIME = timedelta(seconds=60)
 # Remembers sites that have timed out
 unresponsive_hosts = TimedDict(WAIT_TIME)
+# Maximum amount of hosts with kept alive connections, the least recently used host's connections are closed first
+MAX_POOLS = 50
+# Maximum amount of kept alive connections per host
+POOL_MAXSIZE = 10
+# Connections to hosts which haven't been used for this long are closed
+POOL_IDLE_TIME = 300
 
 
 def is_unresponsive(url):
@@ -52,24 +74,120 @@ def set_unresponsive(url):
     unresponsive_hosts[host] = True
 
 
+class DomainLimitExceeded(RequestException):
+    """Raised instead of waiting when a request to a limited domain can't be made yet."""
+
+    def __init__(self, message, wait):
+        super(DomainLimitExceeded, self).__init__(message)
+        #: Seconds until the request can be made
+        self.wait = wait
+
+
+class MemoryLimiterState(object):
+    """Token bucket states of the domain limiters, kept in memory. Shared by the threads of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states = {}
+
+    @contextmanager
+    def _states(self):
+        """Yields the states dict, changes to it are saved afterwards."""
+        with self.lock:
+            yield self.states
+
+    def _tokens(self, states, domain, max_tokens, rate, now):
+        state = states.get(domain) or {'tokens': max_tokens, 'last_update': now}
+        return min(max_tokens, state['tokens'] + max(now - state['last_update'], 0) / rate)
+
+    def tokens(self, domain, max_tokens, rate):
+        """Tokens in the bucket of `domain`, which gains a token every `rate` seconds up to `max_tokens`."""
+        with self._states() as states:
+            return self._tokens(states, domain, max_tokens, rate, time.time())
+
+    def take(self, domain, max_tokens, rate, consume=True):
+        """
+        Takes a token from the bucket of `domain`, which gains a token every `rate` seconds up to `max_tokens`.
+
+        :param bool consume: If False, only check whether a token is available.
+        :return: 0 when a token is available, otherwise the seconds until there is one.
+        """
+        with self._states() as states:
+            now = time.time()
+            tokens = self._tokens(states, domain, max_tokens, rate, now)
+            if tokens < 1:
+                return rate * (1 - tokens)
+            if consume:
+                states[domain] = {'tokens': tokens - 1, 'last_update': now}
+            return 0
+
+    def set_tokens(self, domain, tokens):
+        """Sets the amount of tokens in the bucket of `domain`, which may be negative to pause requests longer."""
+        with self._states() as states:
+            states[domain] = {'tokens': tokens, 'last_update': time.time()}
+
+
+class FileLimiterState(MemoryLimiterState):
+    """
+    Token bucket states of the domain limiters, stored in a JSON file and shared by all the processes using it. The
+    file is locked while a state is read and updated.
+    """
+
+    def __init__(self, path):
+        super(FileLimiterState, self).__init__()
+        self.path = path
+
+    @contextmanager
+    def _states(self):
+        with self.lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                data = b''.join(iter(lambda: os.read(fd, 65536), b''))
+                try:
+                    states = json.loads(data.decode('utf-8')) if data else {}
+                except ValueError:
+                    log.debug('Invalid domain limiter states in %s, starting over' % self.path)
+                    states = {}
+                original = json.dumps(states, sort_keys=True)
+                yield states
+                updated = json.dumps(states, sort_keys=True)
+                if updated != original:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    os.ftruncate(fd, 0)
+                    os.write(fd, updated.encode('utf-8'))
+            finally:
+                # Closing releases the lock
+                os.close(fd)
+
+
 class DomainLimiter(object):
     def __init__(self, domain):
         self.domain = domain
 
-    def __call__(self):
-        """This method will be called once before every request to the domain."""
+    def __call__(self, wait=True):
+        """
+        This method will be called once before every request to the domain.
+
+        :param bool wait: If False, raise :class:`DomainLimitExceeded` rather than waiting until the request can be
+            made.
+        """
         raise NotImplementedError
 
+    def wait_time(self):
+        """Seconds until a request to the domain can be made without waiting."""
+        return 0
+
 
 class TokenBucketLimiter(DomainLimiter):
     """
     A token bucket rate limiter for domains.
     
-    New instances for the same domain will restore previous values.
+    New instances for the same domain share their state. The state is kept in :attr:`state_store`, which is replaced
+    with a :class:`FileLimiterState` next to the database when the manager starts, so that all the executions using
+    the same database (daemon, cron runs) respect the same limits.
     """
-    # This is just an in memory cache right now, it works for the daemon, and across tasks in a single execution
-    # but not for multiple executions via cron. Do we need to store this to db?
-    state_cache = {}
+    state_store = MemoryLimiterState()
     
     def __init__(self, domain, tokens, rate, wait=True):
         """
@@ -81,39 +199,30 @@ class TokenBucketLimiter(DomainLimiter):
         self.max_tokens = tokens
         self.rate = parse_timedelta(rate)
         self.wait = wait
-        # Restore previous state for this domain, or establish new state cache
-        self.state = self.state_cache.setdefault(domain, {'tokens': self.max_tokens, 'last_update': datetime.now()})
 
     @property
     def tokens(self):
-        return min(self.max_tokens, self.state['tokens'])
+        """Tokens currently available, setting it makes the bucket start refilling from that amount."""
+        return self.state_store.tokens(self.domain, self.max_tokens, timedelta_total_seconds(self.rate))
 
     @tokens.setter
     def tokens(self, value):
-        self.state['tokens'] = value
+        self.state_store.set_tokens(self.domain, value)
 
-    @property
-    def last_update(self):
-        return self.state['last_update']
-
-    @last_update.setter
-    def last_update(self, value):
-        self.state['last_update'] = value
-
-    def __call__(self):
-        if self.tokens < self.max_tokens:
-            regen = (timedelta_total_seconds(datetime.now() - self.last_update) /
-                     timedelta_total_seconds(self.rate))
-            self.tokens += regen
-        self.last_update = datetime.now()
-        if self.tokens < 1:
-            if not self.wait:
-                raise RequestException('Requests to %s have exceeded their limit.' % self.domain)
-            wait = timedelta_total_seconds(self.rate) * (1 - self.tokens)
-            log.verbose('Waiting %.2f seconds until next request to %s' % (wait, self.domain))
-            # Sleep until it is time for the next request
-            time.sleep(wait)
-        self.tokens -= 1
+    def wait_time(self):
+        return self.state_store.take(self.domain, self.max_tokens, timedelta_total_seconds(self.rate), consume=False)
+
+    def __call__(self, wait=True):
+        seconds = timedelta_total_seconds(self.rate)
+        while True:
+            wait_time = self.state_store.take(self.domain, self.max_tokens, seconds)
+            if not wait_time:
+                return
+            if not (wait and self.wait):
+                raise DomainLimitExceeded('Requests to %s have exceeded their limit.' % self.domain, wait_time)
+            log.verbose('Waiting %.2f seconds until next request to %s' % (wait_time, self.domain))
+            # Sleep until it is time for the next request, other processes may take the token in the meantime
+            time.sleep(wait_time)
 
 
 class TimedLimiter(TokenBucketLimiter):
@@ -122,6 +231,230 @@ class TimedLimiter(TokenBucketLimiter):
         super(TimedLimiter, self).__init__(domain, 1, interval)
 
 
+class ConnectionPools(object):
+    """
+    Keep alive connection pools per host, shared by all the :class:`Session` instances of the process. Only the
+    connections are shared, cookies, auth and headers stay with each session. Requests with different certificate
+    settings don't share connections.
+    """
+
+    def __init__(self, num_pools=MAX_POOLS, maxsize=POOL_MAXSIZE, idle_time=POOL_IDLE_TIME):
+        self.num_pools = num_pools
+        self.maxsize = maxsize
+        self.idle_time = idle_time
+        self.lock = threading.Lock()
+        # PoolManagers keyed by the certificate settings of the requests
+        self.managers = {}
+        # Time each pool was last used
+        self.last_used = {}
+        self.last_eviction = time.time()
+        self.counters = {'requests': 0, 'hits': 0, 'misses': 0, 'evicted': 0}
+
+    def connection_from_url(self, url, verify=True, cert=None):
+        """Returns the connection pool for the host of `url`, closes idle ones every now and then."""
+        now = time.time()
+        if now - self.last_eviction > self.idle_time / 10:
+            self.evict_idle(now)
+        key = verify, cert if not isinstance(cert, list) else tuple(cert)
+        with self.lock:
+            if key not in self.managers:
+                self.managers[key] = PoolManager(num_pools=self.num_pools, maxsize=self.maxsize, strict=True)
+            manager = self.managers[key]
+        pool = manager.connection_from_url(url)
+        with self.lock:
+            self.last_used[pool] = now
+        return pool
+
+    def _pools(self):
+        for manager in self.managers.values():
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool:
+                    yield manager, key, pool
+
+    def evict_idle(self, now=None):
+        """Closes the connections of hosts which haven't been used for `idle_time` seconds."""
+        now = now or time.time()
+        with self.lock:
+            self.last_eviction = now
+            for manager, key, pool in list(self._pools()):
+                if now - self.last_used.get(pool, 0) > self.idle_time:
+                    log.debug('Closing idle connections to %s' % pool.host)
+                    # Removing the pool from the manager closes its connections
+                    del manager.pools[key]
+                    self.last_used.pop(pool, None)
+                    self.counters['evicted'] += 1
+            # Pools the managers have dropped by themselves, because of the size limit
+            for pool in list(self.last_used):
+                if pool.pool is None:
+                    del self.last_used[pool]
+
+    def record(self, reused):
+        """Counts a request, `reused` tells whether it was sent on an already open connection."""
+        with self.lock:
+            self.counters['requests'] += 1
+            self.counters['hits' if reused else 'misses'] += 1
+
+    def stats(self):
+        """Request and connection counters, for monitoring."""
+        with self.lock:
+            stats = dict(self.counters)
+            pools = [pool for manager, key, pool in self._pools()]
+        stats['hosts'] = len(pools)
+        # The queues of the pools are filled up with None for the slots without a connection
+        stats['idle_connections'] = sum(1 for pool in pools if pool.pool for conn in list(pool.pool.queue) if conn)
+        stats['opened_connections'] = sum(pool.num_connections for pool in pools)
+        return stats
+
+    def clear(self):
+        """Closes all the connections."""
+        with self.lock:
+            for manager in self.managers.values():
+                manager.clear()
+            self.managers.clear()
+            self.last_used.clear()
+
+
+#: The connection pools of the process
+connection_pools = ConnectionPools()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter using the process wide :data:`connection_pools` instead of connections of its own."""
+
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        super(PooledHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def get_connection(self, url, proxies=None):
+        if select_proxy(url, proxies):
+            return super(PooledHTTPAdapter, self).get_connection(url, proxies)
+        pool = connection_pools.connection_from_url(urlparse(url).geturl(), *self._local.tls)
+        self._local.pool = pool, pool.num_connections
+        return pool
+
+    def send(self, request, **kwargs):
+        self._local.tls = kwargs.get('verify', True), kwargs.get('cert')
+        self._local.pool = None
+        try:
+            return super(PooledHTTPAdapter, self).send(request, **kwargs)
+        finally:
+            if self._local.pool:
+                pool, opened = self._local.pool
+                connection_pools.record(pool.num_connections == opened)
+
+    def close(self):
+        # The shared pools outlive the sessions, only close connections through proxies, which are per adapter
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
+
+
+#: :class:`flexget.utils.http_cache.HTTPCache` used by new sessions, set up from the `http_cache` config section
+response_cache = None
+
+
+class _PrefixedRaw(object):
+    """Raw response stream which starts with data that has already been read from it."""
+
+    def __init__(self, prefix, raw):
+        self.prefix = prefix
+        self.raw = raw
+
+    def read(self, amt=None, **kwargs):
+        if not self.prefix:
+            return self.raw.read(amt, decode_content=True)
+        if amt is None:
+            data, self.prefix = self.prefix + self.raw.read(decode_content=True), b''
+        else:
+            data, self.prefix = self.prefix[:amt], self.prefix[amt:]
+        return data
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        while True:
+            data = self.read(amt)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        self.raw.close()
+
+    def release_conn(self):
+        self.raw.release_conn()
+
+
+class CachingHTTPAdapter(PooledHTTPAdapter):
+    """
+    PooledHTTPAdapter which answers requests from a :class:`flexget.utils.http_cache.HTTPCache` when the stored
+    response is fresh, revalidates it with the server when it isn't, and stores new cacheable responses.
+    """
+
+    def __init__(self, cache, *args, **kwargs):
+        self.cache = cache
+        super(CachingHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if not self.cache.usable(request):
+            return super(CachingHTTPAdapter, self).send(request, **kwargs)
+        cached = self.cache.lookup(request)
+        if cached:
+            meta, body, fresh = cached
+            if fresh:
+                self.cache.count('hits')
+                return self.cached_response(request, meta, body)
+            if 'etag' in meta['headers']:
+                request.headers['If-None-Match'] = meta['headers']['etag']
+            if 'last-modified' in meta['headers']:
+                request.headers['If-Modified-Since'] = meta['headers']['last-modified']
+        response = super(CachingHTTPAdapter, self).send(request, **kwargs)
+        if cached and response.status_code == 304:
+            self.cache.count('revalidated')
+            response.close()
+            return self.cached_response(request, self.cache.refresh(request, meta, body, response.headers), body)
+        self.cache.count('misses')
+        if self.cache.storable(request, response.status_code, response.headers):
+            self.store(request, response)
+        return response
+
+    def store(self, request, response):
+        """Reads the body of `response` and stores it, unless it's too big."""
+        length = response.headers.get('content-length', '')
+        if length.isdigit() and int(length) > MAX_ENTRY_SIZE:
+            return
+        chunks = []
+        size = 0
+        while size <= MAX_ENTRY_SIZE:
+            chunk = response.raw.read(2 ** 16, decode_content=True)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        body = b''.join(chunks)
+        if size > MAX_ENTRY_SIZE:
+            # Give the caller what has been read so far, followed by the rest of the body
+            response.raw = _PrefixedRaw(body, response.raw)
+            return
+        response.raw.release_conn()
+        response._content = body
+        response._content_consumed = True
+        self.cache.save(request, response.status_code, response.reason, response.headers, body)
+
+    def cached_response(self, request, meta, body):
+        response = requests.Response()
+        response.status_code = meta['status']
+        response.reason = meta['reason']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.raw = io.BytesIO(body)
+        response._content = body if request.method != 'HEAD' else b''
+        response._content_consumed = True
+        response.from_cache = True
+        return response
+
+
 def _wrap_urlopen(url, timeout=None):
     """
     Handles alternate schemes using urllib, wraps the response in a requests.Response
@@ -146,16 +479,62 @@ def _wrap_urlopen(url, timeout=None):
     return resp
 
 
-def limit_domains(url, limit_dict):
+class DomainLimiters(dict):
+    """
+    Limiters by domain. Keys which aren't a domain name, like `torrentleech` from a domain_delay config, are also kept
+    in `partial` when they are added, so only those have to be searched for in urls.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(DomainLimiters, self).__init__()
+        self.partial = {}
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key, limiter):
+        super(DomainLimiters, self).__setitem__(key, limiter)
+        if '.' in key and '/' not in key:
+            self.partial.pop(key, None)
+        else:
+            self.partial[key] = limiter
+
+    def __delitem__(self, key):
+        super(DomainLimiters, self).__delitem__(key)
+        self.partial.pop(key, None)
+
+    def update(self, *args, **kwargs):
+        for key, limiter in dict(*args, **kwargs).iteritems():
+            self[key] = limiter
+
+
+def find_limiter(url, limit_dict):
+    """
+    Returns the limiter in `limit_dict` for the host of `url`, or one of its parent domains. Limiters are looked up by
+    host, going up a label at a time, so the lookup doesn't depend on the amount of limiters. Keys which aren't a
+    domain name, like `torrentleech` from a domain_delay config, are matched anywhere in the url when no host matches.
+
+    :param limit_dict: :class:`DomainLimiters`, or a plain dict whose keys are all searched for in the url
+    """
+    host = urlparse(url).hostname or ''
+    while host:
+        if host in limit_dict:
+            return limit_dict[host]
+        host = host.partition('.')[2]
+    for domain, limiter in getattr(limit_dict, 'partial', limit_dict).iteritems():
+        if domain in url:
+            return limiter
+
+
+def limit_domains(url, limit_dict, wait=True):
     """
     If this url matches a domain in `limit_dict`, run the limiter.
 
     This is separated in to its own function so that limits can be disabled during unit tests with VCR.
+
+    :param bool wait: If False, raise :class:`DomainLimitExceeded` instead of waiting.
     """
-    for domain, limiter in limit_dict.iteritems():
-        if domain in url:
-            limiter()
-            break
+    limiter = find_limiter(url, limit_dict)
+    if limiter:
+        limiter(wait=wait)
 
 
 class Session(requests.Session):
@@ -165,14 +544,23 @@ class Session(requests.Session):
 
     """
 
-    def __init__(self, timeout=30, max_retries=1):
-        """Set some defaults for our session if not explicitly defined."""
+    def __init__(self, timeout=30, max_retries=1, cache=True):
+        """
+        Set some defaults for our session if not explicitly defined.
+
+        :param bool cache: Use the HTTP cache for responses, when it's enabled in the config
+        """
         requests.Session.__init__(self)
         self.timeout = timeout
         self.stream = True
-        self.adapters['http://'].max_retries = max_retries
+        if cache and response_cache:
+            self.mount('https://', CachingHTTPAdapter(response_cache))
+            self.mount('http://', CachingHTTPAdapter(response_cache, max_retries=max_retries))
+        else:
+            self.mount('https://', PooledHTTPAdapter())
+            self.mount('http://', PooledHTTPAdapter(max_retries=max_retries))
         # Stores min intervals between requests for certain sites
-        self.domain_limiters = {}
+        self.domain_limiters = DomainLimiters()
         self.headers.update({'User-Agent': 'FlexGet/%s (www.flexget.com)' % version})
 
     def add_cookiejar(self, cookiejar):
@@ -203,12 +591,31 @@ class Session(requests.Session):
         """
         self.domain_limiters[limiter.domain] = limiter
 
+    def limiter_wait_time(self, url):
+        """Seconds until a request to `url` can be made without waiting for its domain limiter."""
+        limiter = find_limiter(url, self.domain_limiters)
+        return limiter.wait_time() if limiter else 0
+
+    def fresh_in_cache(self, method, url, kwargs):
+        """Whether a request with `kwargs` will be answered from the http cache, without asking the server."""
+        if method.upper() not in ('GET', 'HEAD') or not url.startswith(('http://', 'https://')):
+            return False
+        adapter = self.get_adapter(url)
+        if not isinstance(adapter, CachingHTTPAdapter):
+            return False
+        request = self.prepare_request(requests.Request(method.upper(), url, headers=kwargs.get('headers'),
+                                                        params=kwargs.get('params'), auth=kwargs.get('auth'),
+                                                        cookies=kwargs.get('cookies')))
+        return adapter.cache.is_fresh(request)
+
     def request(self, method, url, *args, **kwargs):
         """
         Does a request, but raises Timeout immediately if site is known to timeout, and records sites that timeout.
         Also raises errors getting the content by default.
 
         :param bool raise_status: If True, non-success status code responses will be raised as errors (True by default)
+        :param bool limiter_wait: If False, raise :class:`DomainLimitExceeded` instead of waiting when the request
+            would exceed a domain limit, so the caller can do something else in the meantime (True by default)
         """
 
         # Raise Timeout right away if site is known to timeout
@@ -216,8 +623,10 @@ class Session(requests.Session):
             raise requests.Timeout('Requests to this site (%s) have timed out recently. Waiting before trying again.' %
                 urlparse(url).hostname)
 
-        # Run domain limiters for this url
-        limit_domains(url, self.domain_limiters)
+        # Run domain limiters for this url, responses coming from the cache don't count against the limits
+        limiter_wait = kwargs.pop('limiter_wait', True)
+        if not self.fresh_in_cache(method, url, kwargs):
+            limit_domains(url, self.domain_limiters, wait=limiter_wait)
 
         kwargs.setdefault('timeout', self.timeout)
         raise_status = kwargs.pop('raise_status', True)
@@ -243,7 +652,8 @@ class Session(requests.Session):
 
 # Define some module level functions that use our Session, so this module can be used like main requests module
 def request(method, url, **kwargs):
-    s = kwargs.pop('session', Session())
+    # Fresh session for the cookies, connections come from the shared pools
+    s = kwargs.pop('session', None) or Session()
     return s.request(method=method, url=url, **kwargs)
 
 
@@ -275,3 +685,14 @@ def post(url, data=None, **kwargs):
     :param kwargs: Optional arguments that ``request`` takes.
     """
     return request('post', url, data=data, **kwargs)
+
+
+@event('manager.initialize')
+def setup_limiter_state(manager):
+    """Shares the domain limiter states with the other FlexGet processes using the same database."""
+    if not manager.db_filename or fcntl is None:
+        TokenBucketLimiter.state_store = MemoryLimiterState()
+        return
+    path = os.path.splitext(manager.db_filename)[0] + '-limits.json'
+    log.debug('Storing domain limiter states in %s' % path)
+    TokenBucketLimiter.state_store = FileLimiterState(path)
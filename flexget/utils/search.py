@@ -1,10 +1,14 @@
 """ Common tools used by plugins implementing search plugin api """
 from __future__ import unicode_literals, division, absolute_import
+import logging
 import re
 from unicodedata import normalize
 
+from flexget import plugin
 from flexget.utils.titles.parser import TitleParser
 
+log = logging.getLogger('search')
+
 
 def clean_symbols(text):
     """Replaces common symbols with spaces. Also normalize unicode strings in decomposed form."""
@@ -61,3 +65,40 @@ def torrent_availability(seeds, leeches):
     """
 
     return seeds * 2 + leeches
+
+
+def search_batch(search, task, entries, config, name=None):
+    """
+    Searches for all `entries` with a search plugin. Plugins able to search for many entries at once implement
+    ``search_batch(task, entries, config)``, which returns the results for each entry in order. For other plugins
+    ``search(task, entry, config)`` is called for each entry.
+
+    :param search: Instance of the search plugin
+    :param name: Name of the search plugin, for logging
+    :return: List of (results, error) pairs, in the order of `entries`. `error` is the
+        :class:`~flexget.plugin.PluginWarning` or :class:`~flexget.plugin.PluginError` raised while searching for the
+        entry, None otherwise.
+    """
+    name = name or search.__class__.__name__
+    if callable(getattr(search, 'search_batch', None)):
+        log.verbose('Searching for %i entries with plugin `%s`' % (len(entries), name))
+        try:
+            results = search.search_batch(task=task, entries=entries, config=config)
+        except (plugin.PluginWarning, plugin.PluginError) as e:
+            return [([], e) for entry in entries]
+        return [(result or [], None) for result in results]
+    results = []
+    for index, entry in enumerate(entries):
+        log.verbose('Searching for `%s` with plugin `%s` (%i of %i)' % (entry['title'], name, index + 1, len(entries)))
+        try:
+            try:
+                result = search.search(task=task, entry=entry, config=config)
+            except TypeError:
+                # Old search api did not take task argument
+                log.warning('Search plugin %s does not support latest search api.' % name)
+                result = search.search(entry, config)
+        except (plugin.PluginWarning, plugin.PluginError) as e:
+            results.append(([], e))
+        else:
+            results.append((result or [], None))
+    return results
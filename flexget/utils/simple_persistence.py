@@ -12,7 +12,7 @@ from collections import MutableMapping, defaultdict
 from datetime import datetime
 import logging
 import pickle
-from sqlalchemy import Column, Integer, String, DateTime, Unicode, select, Index
+from sqlalchemy import Column, Integer, String, DateTime, Unicode, select, Index, and_, bindparam
 from flexget import db_schema
 from flexget.event import event
 from flexget.manager import Session
@@ -100,6 +100,12 @@ class SimplePersistence(MutableMapping):
     """
     # Stores values in store[taskname][pluginname][key] format
     class_store = defaultdict(lambda: defaultdict(dict))
+    # (pluginname, key) pairs per task which have been set or deleted since the last flush
+    class_dirty = defaultdict(set)
+    # JSON of the values as they are in the database, in snapshot[taskname][(pluginname, key)] format
+    class_snapshot = defaultdict(dict)
+    # Tasks whose values have been loaded from the database
+    loaded_tasks = set()
 
     def __init__(self, plugin=None):
         self.taskname = None
@@ -112,6 +118,7 @@ class SimplePersistence(MutableMapping):
     def __setitem__(self, key, value):
         log.debug('setting key %s value %s' % (key, repr(value)))
         self.store[key] = value
+        self.class_dirty[self.taskname].add((self.plugin, key))
 
     def __getitem__(self, key):
         if key not in self.store or self.store[key] == DELETE:
@@ -120,6 +127,7 @@ class SimplePersistence(MutableMapping):
 
     def __delitem__(self, key):
         self.store[key] = DELETE
+        self.class_dirty[self.taskname].add((self.plugin, key))
 
     def __iter__(self):
         return iter(self.store)
@@ -128,32 +136,96 @@ class SimplePersistence(MutableMapping):
         return len(self.store)
 
     @classmethod
-    def load(cls, task=None):
-        """Load all key/values from `task` into memory from database."""
+    def reset(cls):
+        """Forget about all in memory key/values, they will be loaded again from the database when needed."""
+        cls.class_store.clear()
+        cls.class_dirty.clear()
+        cls.class_snapshot.clear()
+        cls.loaded_tasks.clear()
+
+    @classmethod
+    def unload(cls):
+        """
+        Forget what is known about the database, but keep the in memory key/values. They are loaded again when needed,
+        and the values which aren't in the database are written on the next flush.
+        """
+        for taskname, plugins in cls.class_store.iteritems():
+            for pluginname, values in plugins.iteritems():
+                cls.class_dirty[taskname].update((pluginname, key) for key in values)
+        cls.class_snapshot.clear()
+        cls.loaded_tasks.clear()
+
+    @classmethod
+    def load(cls, task=None, tasks=None):
+        """
+        Load all key/values from `task` into memory from database.
+
+        :param tasks: Instead of only `task`, load key/values of all these tasks which are not loaded yet with a single
+            query.
+        """
+        if tasks:
+            loaded = set(tasks) - cls.loaded_tasks
+            if not loaded:
+                return
+        else:
+            loaded = set([task])
         with Session() as session:
-            for skv in session.query(SimpleKeyValue).filter(SimpleKeyValue.task == task).all():
-                cls.class_store[task][skv.plugin][skv.key] = skv.value
+            query = session.query(SimpleKeyValue.task, SimpleKeyValue.plugin, SimpleKeyValue.key,
+                                  SimpleKeyValue._json)
+            if tasks:
+                query = query.filter(SimpleKeyValue.task.in_(loaded))
+            else:
+                query = query.filter(SimpleKeyValue.task == task)
+            for taskname, plugin, key, value in query:
+                cls.class_store[taskname][plugin][key] = json.loads(value, decode_datetime=True)
+                cls.class_snapshot[taskname][(plugin, key)] = value
+        cls.loaded_tasks.update(loaded)
 
     @classmethod
     def flush(cls, task=None):
-        """Flush all in memory key/values to database."""
-        log.debug('Flushing simple persistence for task %s to db.' % task)
+        """Flush in memory key/values which have changed to database."""
+        updates = []
+        inserts = []
+        deletes = defaultdict(list)
+        snapshot = cls.class_snapshot[task]
+        dirty = cls.class_dirty.pop(task, set())
+        for pluginname, values in cls.class_store[task].iteritems():
+            for key, value in values.items():
+                if value == DELETE:
+                    if (pluginname, key) in snapshot:
+                        deletes[pluginname].append(key)
+                        del snapshot[(pluginname, key)]
+                    del values[key]
+                    continue
+                # Containers can be changed in place without us noticing, so compare those to what was stored
+                if (pluginname, key) not in dirty and not isinstance(value, (list, dict)):
+                    continue
+                value = unicode(json.dumps(value, encode_datetime=True))
+                if (pluginname, key) not in snapshot:
+                    inserts.append({'feed': task, 'plugin': pluginname, 'key': key, 'json': value,
+                                    'added': datetime.now()})
+                elif snapshot[(pluginname, key)] != value:
+                    updates.append({'b_plugin': pluginname, 'b_key': key, 'json': value})
+                else:
+                    continue
+                snapshot[(pluginname, key)] = value
+        if not (updates or inserts or deletes):
+            return
+        log.debug('Flushing simple persistence for task %s to db. %s updated, %s added, %s deleted' %
+                  (task, len(updates), len(inserts), sum(len(keys) for keys in deletes.itervalues())))
+        table = SimpleKeyValue.__table__
         with Session() as session:
-            for pluginname in cls.class_store[task]:
-                for key, value in cls.class_store[task][pluginname].iteritems():
-                    query = (session.query(SimpleKeyValue).
-                             filter(SimpleKeyValue.task == task).
-                             filter(SimpleKeyValue.plugin == pluginname).
-                             filter(SimpleKeyValue.key == key))
-                    if value == DELETE:
-                        query.delete()
-                    else:
-                        updated = query.update(
-                            {'value': unicode(json.dumps(value, encode_datetime=True))},
-                            synchronize_session=False
-                        )
-                        if not updated:
-                            session.add(SimpleKeyValue(task, pluginname, key, value))
+            for pluginname, keys in deletes.iteritems():
+                session.execute(table.delete().where(and_(table.c.feed == task, table.c.plugin == pluginname,
+                                                          table.c.key.in_(keys))))
+            if updates:
+                session.execute(
+                    table.update().where(and_(table.c.feed == task,
+                                              table.c.plugin == bindparam('b_plugin'),
+                                              table.c.key == bindparam('b_key'))).values(json=bindparam('json')),
+                    updates)
+            if inserts:
+                session.execute(table.insert(), inserts)
 
 
 class SimpleTaskPersistence(SimplePersistence):
@@ -169,6 +241,8 @@ class SimpleTaskPersistence(SimplePersistence):
 @event('manager.startup')
 def load_taskless(manager):
     """Loads all key/value pairs into memory which aren't associated with a specific task."""
+    # The database may be another one than in a previous startup of this process
+    SimplePersistence.unload()
     SimplePersistence.load()
 
 
@@ -180,13 +254,14 @@ def flush_taskless(manager):
 @event('task.execute.started')
 def load_task(task):
     """Loads all key/value pairs into memory before a task starts."""
-    if not SimplePersistence.class_store[task.name]:
-        SimplePersistence.load(task.name)
+    if task.name not in SimplePersistence.loaded_tasks:
+        # Load values of all the tasks at once, rather than querying again for each task of the run
+        SimplePersistence.load(tasks=list(task.manager.tasks) + [task.name])
 
 
 @event('task.execute.completed')
 def flush_task(task):
-    """Stores all in memory key/value pairs to database when a task has completed."""
+    """Stores all changed in memory key/value pairs to database when a task has completed."""
     SimplePersistence.flush(task.name)
     # In daemon mode, we don't want to wait until shutdown to flush taskless
     if task.manager.is_daemon:
@@ -1,5 +1,5 @@
 from __future__ import unicode_literals, division, absolute_import
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 # Hack, hide DataLossWarnings
 # Based on html5lib code namespaceHTMLElements=False should do it, but nope ...
@@ -8,6 +8,29 @@ import warnings
 from html5lib.constants import DataLossWarning
 warnings.simplefilter('ignore', DataLossWarning)
 
+try:
+    import lxml  # noqa
+except ImportError:
+    lxml = None
 
-def get_soup(obj, parser='html5lib'):
-    return BeautifulSoup(obj, parser)
+#: Parser used when none is given, lxml is many times faster than the pure python html5lib
+DEFAULT_PARSER = 'lxml' if lxml else 'html5lib'
+
+
+def get_soup(obj, parser=None, parse_only=None):
+    """
+    Parses html into a BeautifulSoup tree.
+
+    :param obj: Html as a string or file-like object.
+    :param parser: Name of the parser, by default lxml when it's installed, html5lib otherwise.
+    :param parse_only: Only build the tree for the matching elements (and everything inside them). Either a
+        :class:`bs4.SoupStrainer`, or the arguments for one: a tag name, or a list of them.
+    """
+    parser = parser or DEFAULT_PARSER
+    if parse_only is not None:
+        if not isinstance(parse_only, SoupStrainer):
+            parse_only = SoupStrainer(parse_only)
+        if parser == 'html5lib':
+            # html5lib can't parse partially, the standard library parser can
+            parser = 'html.parser'
+    return BeautifulSoup(obj, parser, parse_only=parse_only)
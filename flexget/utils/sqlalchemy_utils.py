@@ -3,12 +3,14 @@ Miscellaneous SQLAlchemy helpers.
 """
 from __future__ import unicode_literals, division, absolute_import
 import logging
+import threading
 
 import sqlalchemy
 from sqlalchemy import ColumnDefault, Sequence, Index
 from sqlalchemy.types import TypeEngine
 from sqlalchemy.schema import Table, MetaData
 from sqlalchemy.exc import NoSuchTableError, OperationalError
+from sqlalchemy.pool import SingletonThreadPool
 
 log = logging.getLogger('sql_utils')
 
@@ -126,8 +128,22 @@ def create_index(table_name, session, *column_names):
         log.debug('Error creating index.', exc_info=True)
 
 
+# Holds the connection of the `UnitOfWork` active in each thread
+_unit_of_work = threading.local()
+
+
 class ContextSession(sqlalchemy.orm.Session):
-    """:class:`sqlalchemy.orm.Session` which can be used as context manager"""
+    """
+    :class:`sqlalchemy.orm.Session` which can be used as context manager
+
+    While a :class:`UnitOfWork` is active in the thread, new sessions are bound to its connection.
+    """
+    def __init__(self, *args, **kwargs):
+        connection = getattr(_unit_of_work, 'connection', None)
+        if connection is not None:
+            kwargs['bind'] = connection
+        super(ContextSession, self).__init__(*args, **kwargs)
+
     def __enter__(self):
         return self
 
@@ -139,3 +155,61 @@ class ContextSession(sqlalchemy.orm.Session):
                 self.rollback()
         finally:
             self.close()
+
+
+def in_unit_of_work():
+    """Whether sessions created in this thread are part of a :class:`UnitOfWork`."""
+    return getattr(_unit_of_work, 'connection', None) is not None
+
+
+def threads_share_database(engine):
+    """
+    Whether sessions created in other threads see the same database as sessions created in this thread. They don't
+    while this thread has a :class:`UnitOfWork` pending, or when each thread gets a database of its own (in memory
+    sqlite).
+    """
+    if in_unit_of_work():
+        return False
+    return engine is None or not isinstance(engine.pool, SingletonThreadPool)
+
+
+class UnitOfWork(object):
+    """
+    A single database transaction which all sessions created in this thread take part in until :meth:`end` is called.
+
+    Committing those sessions only flushes their changes to the shared transaction, everything is committed to the
+    database at once at the end. Use savepoints from :meth:`begin_savepoint` to be able to roll back only part of the
+    work, rolling back a session rolls back to the savepoint it was created in.
+    """
+
+    def __init__(self, engine):
+        self.connection = engine.connect()
+        self._sqlite = engine.dialect.name == 'sqlite'
+        if self._sqlite:
+            # pysqlite commits before statements it doesn't know, such as SAVEPOINT, so we start the transaction
+            # ourselves instead
+            self._dbapi_connection = self.connection.connection.connection
+            self._isolation_level = self._dbapi_connection.isolation_level
+            self._dbapi_connection.isolation_level = None
+        self.transaction = self.connection.begin()
+        if self._sqlite:
+            self.connection.execute('BEGIN')
+        self._previous = getattr(_unit_of_work, 'connection', None)
+        _unit_of_work.connection = self.connection
+
+    def begin_savepoint(self):
+        """:return: A :class:`sqlalchemy.engine.NestedTransaction`"""
+        return self.connection.begin_nested()
+
+    def end(self):
+        """Commits all the work, or rolls it back if the transaction can no longer be committed."""
+        _unit_of_work.connection = self._previous
+        try:
+            if self.transaction.is_active:
+                self.transaction.commit()
+            else:
+                self.transaction.rollback()
+        finally:
+            if self._sqlite:
+                self._dbapi_connection.isolation_level = self._isolation_level
+            self.connection.close()
@@ -2,13 +2,15 @@ from __future__ import unicode_literals, division, absolute_import
 import logging
 import os
 import re
-from copy import copy
+import threading
+from collections import Mapping, OrderedDict
 from datetime import datetime, date, time
 import locale
 from email.utils import parsedate
 from time import mktime
 
 import jinja2.filters
+from jinja2.defaults import BLOCK_START_STRING, VARIABLE_START_STRING, COMMENT_START_STRING, LINE_STATEMENT_PREFIX
 from jinja2 import (Environment, StrictUndefined, ChoiceLoader, FileSystemLoader, PackageLoader, Template,
                     TemplateNotFound, TemplateSyntaxError, Undefined)
 
@@ -21,6 +23,11 @@ log = logging.getLogger('utils.template')
 # The environment will be created after the manager has started
 environment = None
 
+# Compiled templates for template strings, least recently used first
+_template_cache = OrderedDict()
+_template_cache_lock = threading.Lock()
+TEMPLATE_CACHE_SIZE = 500
+
 
 class RenderError(Exception):
     """Error raised when there is a problem with jinja rendering."""
@@ -126,14 +133,49 @@ def filter_default(value, default_value='', boolean=True):
 filter_d = filter_default
 
 
+class EntryContext(Mapping):
+    """
+    Read only view of an entry used as template context, with some extra variables on top. Avoids copying the entry
+    for each render, lazy fields are only evaluated when the template uses them.
+    """
+
+    def __init__(self, entry, extra, template_globals):
+        self.entry = entry
+        self.extra = extra
+        self.template_globals = template_globals
+
+    def __getitem__(self, key):
+        if key in self.extra:
+            return self.extra[key]
+        if key in self.entry.store:
+            return self.entry[key]
+        return self.template_globals[key]
+
+    def __contains__(self, key):
+        # Don't evaluate lazy fields just to check if they exist
+        return key in self.extra or key in self.entry.store or key in self.template_globals
+
+    def __iter__(self):
+        return iter(set(self.extra).union(self.entry.store, self.template_globals))
+
+    def __len__(self):
+        return len(set(self.extra).union(self.entry.store, self.template_globals))
+
+
 # TODO: In Jinja 2.8 we will be able to override the Context class to be used explicitly
 class FlexGetTemplate(Template):
     """Adds lazy lookup support when rendering templates."""
     def new_context(self, vars=None, shared=False, locals=None):
         context = super(FlexGetTemplate, self).new_context(vars, shared, locals)
-        context.parent = LazyDict(context.parent)
+        if not isinstance(context.parent, EntryContext):
+            context.parent = LazyDict(context.parent)
         return context
 
+    def render_entry(self, entry, extra):
+        """Renders the template with `entry` and `extra` variables as context, without copying the entry."""
+        context = self.new_context(EntryContext(entry, extra, self.globals), shared=True)
+        return ''.join(self.root_render_func(context))
+
 
 @event('manager.initialize')
 def make_environment(manager):
@@ -144,6 +186,9 @@ def make_environment(manager):
                              FileSystemLoader(os.path.join(manager.config_base, 'templates'))]),
         extensions=['jinja2.ext.loopcontrols'])
     environment.template_class = FlexGetTemplate
+    # Templates compiled by the old environment should not be used anymore
+    with _template_cache_lock:
+        _template_cache.clear()
     for name, filt in globals().items():
         if name.startswith('filter_'):
             environment.filters[name.split('_', 1)[1]] = filt
@@ -174,6 +219,37 @@ def get_template(templatename, pluginname=None):
         raise ValueError('Template not found: %s (%s)' % (templatename, pluginname))
 
 
+def has_template_syntax(template_string):
+    """Returns False if rendering `template_string` with jinja would always give back the same string."""
+    if template_string.endswith('\n') or '\r' in template_string:
+        # Jinja strips a trailing newline and normalizes line endings
+        return True
+    return any(start in template_string for start in
+               (BLOCK_START_STRING, VARIABLE_START_STRING, COMMENT_START_STRING, LINE_STATEMENT_PREFIX or '\0'))
+
+
+def compile_template(template_string):
+    """
+    Returns a compiled Template for `template_string`. Templates are cached, so each string only gets compiled once.
+
+    :raises RenderError: If the template has a syntax error
+    """
+    with _template_cache_lock:
+        template = _template_cache.pop(template_string, None)
+        if template is not None:
+            _template_cache[template_string] = template
+            return template
+    try:
+        template = environment.from_string(template_string)
+    except TemplateSyntaxError as e:
+        raise RenderError('Error in template syntax: ' + e.message)
+    with _template_cache_lock:
+        _template_cache[template_string] = template
+        while len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return template
+
+
 def render(template, context):
     """
     Renders a Template with `context` as its context.
@@ -183,10 +259,9 @@ def render(template, context):
     :return: The rendered template text.
     """
     if isinstance(template, basestring):
-        try:
-            template = environment.from_string(template)
-        except TemplateSyntaxError as e:
-            raise RenderError('Error in template syntax: ' + e.message)
+        if not has_template_syntax(template):
+            return template
+        template = compile_template(template)
     try:
         result = template.render(context)
     except Exception as e:
@@ -200,28 +275,46 @@ def render(template, context):
 def render_from_entry(template_string, entry):
     """Renders a Template or template string with an Entry as its context."""
 
-    # Make a copy of the Entry so we can add some more fields
-    variables = copy(entry.store)
-    variables['now'] = datetime.now()
+    if isinstance(template_string, basestring):
+        if not has_template_syntax(template_string):
+            # Nothing for jinja to do, go straight to string replacement
+            return _string_replace(template_string, entry)
+        template = compile_template(template_string)
+    else:
+        template = template_string
+
+    # Add some more fields on top of the entry
+    variables = {'now': datetime.now()}
     # Add task name to variables, usually it's there because metainfo_task plugin, but not always
-    if 'task' not in variables and hasattr(entry, 'task'):
+    if 'task' not in entry.store and getattr(entry, 'task', None):
         variables['task'] = entry.task.name
-    result = render(template_string, variables)
+    try:
+        result = template.render_entry(entry, variables)
+    except Exception as e:
+        error = RenderError('(%s) %s' % (type(e).__name__, e))
+        log.debug('Error during rendering: %s' % error)
+        raise error
 
     # Only try string replacement if jinja didn't do anything
     if result == template_string:
-        try:
-            result = template_string % entry
-        except KeyError as e:
-            raise RenderError('Does not contain the field `%s` for string replacement.' % e)
-        except ValueError as e:
-            raise RenderError('Invalid string replacement template: %s (%s)' % (template_string, e))
-        except TypeError as e:
-            raise RenderError('Error during string replacement: %s' % e.message)
+        result = _string_replace(template_string, entry)
 
     return result
 
 
+def _string_replace(template_string, entry):
+    if '%' not in template_string:
+        return template_string
+    try:
+        return template_string % entry
+    except KeyError as e:
+        raise RenderError('Does not contain the field `%s` for string replacement.' % e)
+    except ValueError as e:
+        raise RenderError('Invalid string replacement template: %s (%s)' % (template_string, e))
+    except TypeError as e:
+        raise RenderError('Error during string replacement: %s' % e.message)
+
+
 def render_from_task(template, task):
     """
     Renders a Template with a task as its context.
@@ -20,6 +20,7 @@ from flexget.task import Task, TaskAbort
 from flexget.webserver import User
 from flexget.manager import Session
 from flexget.api import app
+from flexget.utils.requests import connection_pools
 
 log = logging.getLogger('tests')
 
@@ -115,8 +116,11 @@ def use_vcr(request, monkeypatch):
         if not online:
             log.debug('Disabling domain limiters during VCR playback.')
             monkeypatch.setattr('flexget.utils.requests.limit_domains', mock.Mock())
+        # Pooled connections are bound to the cassette which was used when they were opened
+        connection_pools.clear()
         with vcr.use_cassette(path=cassette_path) as cassette:
             yield cassette
+        connection_pools.clear()
 
 
 @pytest.fixture()
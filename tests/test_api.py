@@ -77,6 +77,39 @@ class TestServerAPI(object):
             }
         }
 
+    def test_log_records(self, api_client):
+        from flexget.logger import record_buffer
+        record_buffer.add({'timestamp': '2016-01-01 10:00:00', 'levelno': 20, 'level': 'INFO', 'plugin': 'test',
+                           'task': 'test', 'task_id': '123456', 'message': 'hello'})
+        rsp = api_client.get('/server/log/records/?task_id=123456')
+        assert rsp.status_code == 200
+        records = json.loads(rsp.data)['records']
+        assert [r['message'] for r in records] == ['hello']
+
+    def follow_log(self, api_client, manager, tmpdir, monkeypatch, query):
+        import cherrypy
+        log_file = tmpdir.join('flexget.log')
+        log_file.write(b'2016-01-01 10:00 INFO     test          task            first\n'
+                       b'2016-01-05 10:00 INFO     test          task            second\n')
+        monkeypatch.setattr(manager.options, 'logfile', log_file.strpath)
+        monkeypatch.setattr(cherrypy.engine, 'state', cherrypy.engine.states.STARTED)
+        rsp = api_client.get('/server/log/?' + query)
+        assert rsp.status_code == 200
+        return [line['message'] for line in json.loads(rsp.data)['stream'] if line]
+
+    def test_log_follow_until(self, api_client, manager, tmpdir, monkeypatch):
+        # The stream ends instead of waiting for lines which can't be in the range
+        assert self.follow_log(api_client, manager, tmpdir, monkeypatch, 'until=2016-01-02') == ['first']
+
+    def test_log_follow_past_until(self, api_client, manager, tmpdir, monkeypatch):
+        from flexget.api import app
+        # API modules are loaded outside of the flexget package, patch the globals of the view instead
+        view_globals = app.view_functions['server_server_log_api'].view_class.get.__func__.__globals__
+        # Stream the whole file as new lines
+        monkeypatch.setitem(view_globals, 'read_log_lines', lambda *args: ([], 0))
+        monkeypatch.setitem(view_globals, 'range_ended', lambda until: False)
+        assert self.follow_log(api_client, manager, tmpdir, monkeypatch, 'until=2016-01-02') == ['first']
+
     def test_version(self, api_client):
         rsp = api_client.get('/server/version/')
         assert rsp.status_code == 200
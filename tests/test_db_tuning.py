@@ -0,0 +1,55 @@
+from __future__ import unicode_literals, division, absolute_import
+import sqlite3
+
+from flexget.plugins.generic import db_tuning
+
+
+class TestDatabaseTuning(object):
+    config = """
+        database:
+          synchronous: full
+          cache_size: 4 MiB
+          busy_timeout: 2
+        tasks: {}
+    """
+
+    def test_settings(self, manager):
+        assert db_tuning.get_setting('synchronous') == 'full'
+        assert db_tuning.get_setting('cache_size') == 4 * 1024 * 1024
+        # Not configured
+        assert db_tuning.get_setting('journal_mode') == 'wal'
+
+    def test_pragmas(self, manager, tmpdir):
+        connection = sqlite3.connect(tmpdir.join('test.sqlite').strpath)
+        try:
+            db_tuning.on_connect(connection, None)
+            pragma = lambda name: connection.execute('PRAGMA %s' % name).fetchone()[0]
+            assert pragma('journal_mode') == 'wal'
+            assert pragma('synchronous') == 2
+            assert pragma('cache_size') == -4096
+            assert pragma('busy_timeout') == 2000
+        finally:
+            connection.close()
+
+
+class TestAnalyzeInterval(object):
+    config = """
+        database:
+          analyze_interval: 1 hour
+        tasks:
+          test:
+            mock:
+              - title: entry 1
+    """
+
+    def test_analyze_between_cleanups(self, execute_task):
+        from datetime import datetime, timedelta
+        from flexget.utils.simple_persistence import SimplePersistence
+        persistence = SimplePersistence('db_analyze')
+        last_analyze = datetime.now() - timedelta(minutes=30)
+        persistence['last_analyze'] = last_analyze
+        execute_task('test')
+        assert persistence['last_analyze'] == last_analyze, 'should not analyze before the interval has passed'
+        persistence['last_analyze'] = last_analyze = datetime.now() - timedelta(hours=2)
+        execute_task('test')
+        assert persistence['last_analyze'] > last_analyze
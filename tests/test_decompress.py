@@ -48,6 +48,19 @@ class TestExtract(object):
                     to: '__tmp__'
                     keep_dirs: no
                     delete_archive: yes
+            test_zip_again:
+                template: zip_file
+                disable: seen
+                decompress:
+                    to: '__tmp__'
+                    keep_dirs: no
+            test_two_zips:
+                mock:
+                    - {title: 'test', location: '__tmp__/test.zip'}
+                    - {title: 'other', location: '__tmp__/other/test.zip'}
+                decompress:
+                    to: '__tmp__/{{title}}'
+                    workers: 2
                     
         """
 
@@ -90,3 +103,29 @@ class TestExtract(object):
         """Test Zip deletion after extraction"""
         execute_task('test_delete_zip')
         assert not tmpdir.join(self.zip_name).exists(), 'Zip archive was not deleted.'
+
+    @pytest.mark.filecopy(zip_name, '__tmp__')
+    def test_skip_extracted(self, execute_task, tmpdir):
+        """Test files are only extracted again when they differ from the archive"""
+        execute_task('test_zip_again')
+        out_file = tmpdir.join(self.out_file)
+        mtime = out_file.mtime()
+        assert out_file.size() == 18
+
+        out_file.write('already extracted!')
+        out_file.setmtime(mtime)
+        execute_task('test_zip_again')
+        assert out_file.read() == 'already extracted!', 'File with same size and time should not be extracted again.'
+
+        out_file.write('partial')
+        out_file.setmtime(mtime)
+        execute_task('test_zip_again')
+        assert out_file.size() == 18, 'Partially extracted file should be extracted again.'
+
+    @pytest.mark.filecopy(zip_name, '__tmp__')
+    def test_two_zips(self, execute_task, tmpdir):
+        """Test extracting several archives at the same time"""
+        tmpdir.join(self.zip_name).copy(tmpdir.mkdir('other'))
+        execute_task('test_two_zips')
+        assert tmpdir.join('test', self.out_dir, self.out_file).exists()
+        assert tmpdir.join('other', self.out_dir, self.out_file).exists()
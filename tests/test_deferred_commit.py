@@ -0,0 +1,52 @@
+from __future__ import unicode_literals, division, absolute_import
+
+from flexget.manager import Session
+from flexget.plugins.filter.seen import SeenEntry
+from flexget.utils.sqlalchemy_utils import UnitOfWork
+
+
+class TestDeferredCommit(object):
+    config = """
+        templates:
+          global:
+            accept_all: yes
+            deferred_commit: yes
+
+        tasks:
+          test:
+            mock:
+              - {title: 'Title 1', url: 'http://localhost/1'}
+              - {title: 'Title 2', url: 'http://localhost/2'}
+
+          test2:
+            mock:
+              - {title: 'Title 1', url: 'http://localhost/1'}
+              - {title: 'Title 3', url: 'http://localhost/3'}
+    """
+
+    def test_committed(self, execute_task):
+        task = execute_task('test')
+        assert len(task.accepted) == 2
+        assert task._unit_of_work is None
+        with Session() as session:
+            assert session.query(SeenEntry).count() == 2
+        task = execute_task('test2')
+        assert task.find_entry('rejected', title='Title 1')
+        assert task.find_entry('accepted', title='Title 3')
+
+    def test_savepoint_rollback(self, manager):
+        unit_of_work = UnitOfWork(manager.engine)
+        try:
+            with Session() as session:
+                session.add(SeenEntry('kept', 'test'))
+            savepoint = unit_of_work.begin_savepoint()
+            session = Session()
+            session.add(SeenEntry('rolled back', 'test'))
+            session.flush()
+            session.rollback()
+            session.close()
+            assert not savepoint.is_active
+        finally:
+            unit_of_work.end()
+        with Session() as session:
+            assert [se.title for se in session.query(SeenEntry).all()] == ['kept']
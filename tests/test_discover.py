@@ -25,6 +25,21 @@ class SearchPlugin(object):
 plugin.register(SearchPlugin, 'test_search', groups=['search'], api_ver=2)
 
 
+class BatchSearchPlugin(SearchPlugin):
+    """Fake search plugin searching for all entries at once, counting its calls."""
+
+    calls = 0
+
+    def search(self, task, entry, config=None):
+        raise AssertionError('search_batch should be used')
+
+    def search_batch(self, task, entries, config=None):
+        BatchSearchPlugin.calls += 1
+        return [SearchPlugin.search(self, task, entry, config) for entry in entries]
+
+plugin.register(BatchSearchPlugin, 'test_batch_search', groups=['search'], api_ver=2)
+
+
 class EstRelease(object):
     """Fake release estimate plugin. Just returns 'est_release' entry field."""
 
@@ -50,6 +65,16 @@ class TestDiscover(object):
                   search_sort: 2
               from:
               - test_search: yes
+          test_batch:
+            discover:
+              release_estimations: ignore
+              what:
+              - mock:
+                - title: Foo
+                - title: Bar
+              from:
+              - test_batch_search: yes
+              - test_search: fail
           test_interval:
             discover:
               release_estimations: ignore
@@ -103,6 +128,12 @@ class TestDiscover(object):
         order = list(e.get('search_sort') for e in task.entries)
         assert order == sorted(order, reverse=True)
 
+    def test_batch(self, execute_task):
+        BatchSearchPlugin.calls = 0
+        task = execute_task('test_batch')
+        assert len(task.entries) == 2
+        assert BatchSearchPlugin.calls == 1, 'all entries should be searched with a single call'
+
     def test_interval(self, execute_task, manager):
         task = execute_task('test_interval')
         assert len(task.entries) == 1
@@ -1,4 +1,7 @@
 from __future__ import unicode_literals, division, absolute_import
+import os
+
+import mock
 from path import Path
 
 
@@ -71,6 +74,12 @@ class TestFilesystem(object):
               path: """ + test1 + """
               recursive: yes
               retrieve: dirs
+          overlapping:
+            filesystem:
+              path:
+                - """ + test1 + """
+                - """ + test1 + """/dir1
+              recursive: yes
           non_ascii:
             filesystem:
               path: """ + test3 + """
@@ -206,3 +215,17 @@ class TestFilesystem(object):
         task = execute_task(task_name)
 
         self.assert_check(task, task_name, 'positive', should_exist)
+
+    def test_overlapping(self, execute_task):
+        task = execute_task('overlapping')
+        locations = [entry['location'] for entry in task.all_entries]
+        assert len(locations) == len(set(locations)), 'Same object was added more than once'
+        assert len(locations) == 12
+
+    def test_depth_pruned(self, execute_task):
+        with mock.patch('flexget.plugins.input.filesystem.os.listdir', wraps=os.listdir) as listdir, \
+                mock.patch('flexget.plugins.input.filesystem.scandir', None):
+            execute_task('recursive_2_levels')
+        listed = [Path(call[0][0]).name for call in listdir.call_args_list]
+        # Contents of dir4 would be too deep, so it isn't listed at all
+        assert sorted(listed) == ['Test1', 'dir1', 'dir2']
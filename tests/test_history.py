@@ -0,0 +1,73 @@
+from __future__ import unicode_literals, division, absolute_import
+from StringIO import StringIO
+import warnings
+
+import mock
+
+from flexget.logger import capture_output
+from flexget.manager import Session
+from flexget.utils import json
+from flexget.plugins.output.history import History, do_cli, get_history
+
+
+class TestHistory(object):
+    config = """
+        tasks:
+          test:
+            mock:
+              - {title: 'entry 1', url: 'http://localhost/1'}
+              - {title: 'entry 2', url: 'http://localhost/2'}
+              - {title: 'entry 3', url: 'http://localhost/3'}
+            accept_all: yes
+          other:
+            mock:
+              - {title: 'other entry', url: 'http://localhost/other'}
+            accept_all: yes
+    """
+
+    def test_learn(self, execute_task):
+        execute_task('test')
+        with Session() as session:
+            items = session.query(History).order_by(History.id).all()
+            assert [item.title for item in items] == ['entry 1', 'entry 2', 'entry 3']
+            assert all(item.task == 'test' for item in items)
+            assert items[0].details == 'Accepted by accept_all'
+            assert items[0].time
+
+    def test_pages(self, execute_task):
+        execute_task('test')
+        execute_task('other')
+        with Session() as session:
+            first = get_history(session, tasks=['test'], limit=2)
+            assert len(first) == 2
+            rest = get_history(session, tasks=['test'], before=first[-1].id, limit=2)
+            titles = [item.title for item in first + rest]
+            assert sorted(titles) == ['entry 1', 'entry 2', 'entry 3'], 'pages should not overlap or skip items'
+            assert not get_history(session, tasks=['test'], before=rest[-1].id)
+            assert [item.title for item in get_history(session, search='other')] == ['other entry']
+
+    def test_cli_task(self, execute_task, manager):
+        execute_task('test')
+        execute_task('other')
+        for task, titles in [('OTH', ['other entry']), ('nomatch', [])]:
+            output = StringIO()
+            with warnings.catch_warnings():
+                # No task matching should not get an empty `in` to the database
+                warnings.simplefilter('error')
+                with capture_output(output):
+                    do_cli(manager, mock.Mock(task=task, search=None, limit=50))
+            assert [line.split(':', 1)[1].strip() for line in output.getvalue().splitlines()
+                    if line.startswith(' Title')] == titles
+
+    def test_api_pages(self, execute_task, api_client):
+        execute_task('test')
+        rsp = api_client.get('/history/?max=2')
+        assert rsp.status_code == 200, 'Response code is %s' % rsp.status_code
+        data = json.loads(rsp.data)
+        assert data['pages'] == 2
+        assert len(data['entries']) == 2
+        rsp = api_client.get('/history/?max=2&before=%s' % data['next'])
+        assert rsp.status_code == 200, 'Response code is %s' % rsp.status_code
+        data = json.loads(rsp.data)
+        assert [entry['title'] for entry in data['entries']] == ['entry 1']
+        assert data['next'] is None
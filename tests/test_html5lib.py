@@ -24,3 +24,17 @@ class TestHtml5Lib(object):
         assert em.parent.name == 'p'
 
         assert soup.find('p', attrs={'class': 'foo'})
+
+    def test_parse_only(self, execute_task):
+        s = """<html><body>
+<p>Text <a href="/one">One</a></p>
+<div><a href="/two"><img src="two.png"></a></div>"""
+        soup = get_soup(s, parse_only='a')
+
+        assert not soup.find('p')
+        assert [a['href'] for a in soup.find_all('a')] == ['/one', '/two']
+        assert soup.find_all('a')[1].img['src'] == 'two.png'
+
+    def test_html5lib_parser(self, execute_task):
+        soup = get_soup('<p>Text', parser='html5lib')
+        assert soup.find('body').p.text == 'Text'
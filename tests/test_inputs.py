@@ -1,4 +1,11 @@
 from __future__ import unicode_literals, division, absolute_import
+import threading
+import time
+
+from mock import Mock
+
+from flexget import task as task_module
+from flexget.utils import inputs
 
 
 class TestInputs(object):
@@ -38,6 +45,73 @@ class TestInputs(object):
         assert task.find_entry(title='title1a'), 'title1a should be in entries'
         assert task.find_entry(title='title2'), 'title2 should be in entries'
 
+    def test_threaded(self, execute_task, monkeypatch):
+        monkeypatch.setattr(inputs, 'threads_usable', lambda task: True)
+        task = execute_task('test_no_dupes')
+        assert [e['title'] for e in task.entries] == ['title1a', 'title2'], 'entries should be in config order'
+
+    def test_timeout(self, execute_task, monkeypatch):
+        get_input_handler = inputs.get_input_handler
+        calls = []
+
+        def slow_handler(name):
+            handler = get_input_handler(name)
+            calls.append(name)
+            if len(calls) > 1:
+                return handler
+
+            def slow(task, config):
+                time.sleep(2)
+                return handler(task, config)
+            return slow
+
+        monkeypatch.setattr(inputs, 'threads_usable', lambda task: True)
+        monkeypatch.setattr(inputs, 'get_input_handler', slow_handler)
+        monkeypatch.setattr(inputs, 'INPUT_TIMEOUT', 0.5)
+        task = execute_task('test_inputs')
+        assert [e['title'] for e in task.entries] == ['title2'], 'only the input finishing in time should be used'
+
+    def test_worker_sessions(self, execute_task, monkeypatch):
+        get_input_handler = inputs.get_input_handler
+        main_thread = threading.current_thread()
+        real_session = task_module.Session
+        release = threading.Event()
+        sessions = []
+
+        def handler(name):
+            input_handler = get_input_handler(name)
+            slow = not sessions
+
+            def run(task, config):
+                if slow:
+                    release.wait(5)
+                session = task.session
+                sessions.append((slow, session))
+                return input_handler(task, config)
+            sessions.append(None)
+            return run
+
+        def session_factory():
+            # Sessions of the worker threads are only checked for what happens to them
+            return real_session() if threading.current_thread() is main_thread else Mock()
+
+        monkeypatch.setattr(inputs, 'threads_usable', lambda task: True)
+        monkeypatch.setattr(inputs, 'get_input_handler', handler)
+        monkeypatch.setattr(inputs, 'INPUT_TIMEOUT', 0.5)
+        monkeypatch.setattr(task_module, 'Session', session_factory)
+        task = execute_task('test_inputs')
+        assert [e['title'] for e in task.entries] == ['title2']
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name.startswith('input-'):
+                thread.join(5)
+        quick = [session for slow, session in sessions[2:] if not slow][0]
+        late = [session for slow, session in sessions[2:] if slow][0]
+        assert quick is not late, 'each input should have a session of its own'
+        assert quick.commit.called and quick.close.called
+        assert not late.commit.called, 'inputs which timed out should not change the database'
+        assert late.rollback.called and late.close.called
+
     """def test_no_url(self, execute_task):
         # Oops, this test doesn't do anything, as the mock plugin adds a fake url to entries
         # TODO: fix this
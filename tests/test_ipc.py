@@ -0,0 +1,41 @@
+from __future__ import unicode_literals, division, absolute_import
+import threading
+
+import mock
+
+from flexget import ipc
+from flexget.logger import LogRecordBuffer
+from flexget.utils import json
+
+
+class TestLogRecords(object):
+    def make_record(self, message, task=''):
+        return {'timestamp': '2016-01-01 10:00:00', 'levelno': 20, 'level': 'INFO', 'plugin': 'test',
+                'task': task, 'task_id': '', 'message': message}
+
+    def test_query(self, monkeypatch):
+        buffer = LogRecordBuffer()
+        monkeypatch.setattr(ipc, 'record_buffer', buffer)
+        buffer.add(self.make_record('a', task='task1'))
+        buffer.add(self.make_record('b', task='task2'))
+        service = ipc.DaemonService(mock.Mock())
+
+        assert [r['message'] for r in json.loads(service.exposed_log_records())] == ['a', 'b']
+        assert [r['message'] for r in json.loads(service.exposed_log_records(task='task2'))] == ['b']
+        assert [r['message'] for r in json.loads(service.exposed_log_records(limit=1))] == ['b']
+
+    def test_stream(self, monkeypatch):
+        buffer = LogRecordBuffer()
+        monkeypatch.setattr(ipc, 'record_buffer', buffer)
+        buffer.add(self.make_record('a'))
+        service = ipc.DaemonService(mock.Mock())
+
+        # Waits for the next record to be logged
+        timer = threading.Timer(0.1, buffer.add, [self.make_record('b')])
+        timer.start()
+        try:
+            records = json.loads(service.exposed_log_records(after=1, timeout=5))
+        finally:
+            timer.join()
+        assert [(r['id'], r['message']) for r in records] == [(2, 'b')]
+        assert json.loads(service.exposed_log_records(after=2, timeout=0.01)) == []
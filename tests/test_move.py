@@ -0,0 +1,53 @@
+from __future__ import unicode_literals, division, absolute_import
+
+
+class TestMove(object):
+
+    __tmp__ = True
+    config = """
+        templates:
+          global:
+            accept_all: yes
+        tasks:
+          copy:
+            mock:
+              - {title: 'a', location: '__tmp__/src/a.mkv'}
+              - {title: 'b', location: '__tmp__/src/b.mkv'}
+            copy:
+              to: '__tmp__/{{ "copied" }}'
+              unpack_safety: no
+              along: [srt]
+              workers: 2
+          move_dir:
+            mock:
+              - {title: 'src', location: '__tmp__/src'}
+            move:
+              to: '__tmp__/{{ "moved" }}'
+              allow_dir: yes
+              unpack_safety: no
+              workers: 4
+    """
+
+    def make_files(self, tmpdir):
+        src = tmpdir.mkdir('src')
+        src.join('a.mkv').write('a' * 1000)
+        src.join('a.srt').write('subtitles')
+        src.join('b.mkv').write('b' * 2000)
+        return src
+
+    def test_copy(self, execute_task, tmpdir):
+        self.make_files(tmpdir)
+        task = execute_task('copy')
+        assert task.find_entry('accepted', title='a')['output'] == tmpdir.join('copied', 'a.mkv').strpath
+        assert tmpdir.join('copied', 'a.mkv').read() == 'a' * 1000
+        assert tmpdir.join('copied', 'a.srt').read() == 'subtitles'
+        assert tmpdir.join('copied', 'b.mkv').read() == 'b' * 2000
+        assert tmpdir.join('src', 'a.mkv').exists()
+
+    def test_move_dir(self, execute_task, tmpdir):
+        self.make_files(tmpdir).mkdir('sub').join('c.nfo').write('c')
+        task = execute_task('move_dir')
+        assert task.find_entry('accepted', title='src')['output'] == tmpdir.join('moved', 'src').strpath
+        assert tmpdir.join('moved', 'src', 'sub', 'c.nfo').read() == 'c'
+        assert tmpdir.join('moved', 'src', 'b.mkv').size() == 2000
+        assert not tmpdir.join('src').exists()
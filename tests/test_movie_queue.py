@@ -33,6 +33,12 @@ class TestMovieQueue(object):
            movie_queue_forget:
              movie_queue: forget
 
+           movie_queue_prescreen:
+             mock:
+               - {title: 'Some.Other.Movie.2012.720p.BluRay.x264-GRP'}
+               - {title: 'The.Movie.In.Queue.1999.720p.BluRay.x264-GRP'}
+             movie_queue: accept
+
            movie_queue_different_queue_add:
              movie_queue:
                action: add
@@ -116,6 +122,28 @@ class TestMovieQueue(object):
         assert not queue_get(downloaded=True)
         assert len(queue_get()) == 1
 
+    def test_movie_queue_prescreen(self, execute_task):
+        queue_add(title=u'MovieInQueue', imdb_id=u'tt1931533', tmdb_id=603)
+        queue_add(title=u'Movie in Queue (1998)', imdb_id=u'tt1933533', tmdb_id=604)
+        with patch('flexget.plugins.metainfo.imdb_lookup.ImdbLookup.lookup') as imdb_lookup, \
+                patch('flexget.plugins.metainfo.tmdb_lookup.PluginTmdbLookup.lazy_loader'):
+            task = execute_task('movie_queue_prescreen')
+        looked_up = [call[0][0]['title'] for call in imdb_lookup.call_args_list]
+        assert looked_up == ['The.Movie.In.Queue.1999.720p.BluRay.x264-GRP'], \
+            'only entries like queued titles should be looked up'
+        assert task.find_entry('accepted', title='MovieInQueue'), 'entries with ids should be matched by id'
+
+    def test_prescreen_alike_titles(self, manager):
+        queue_add(title=u'Star Wars: Episode IV - A New Hope (1977)', imdb_id=u'tt0076759')
+        queue_add(title=u'Se7en (1995)', imdb_id=u'tt0114369')
+        queue_add(title=u'Spider-Man (2002)', imdb_id=u'tt0145487')
+        index = movie_queue.MovieQueueIndex(queue_get())
+        for title in ['Star.Wars.1977.720p.BluRay.x264-GRP', 'Seven.1995.1080p.BluRay.x264-GRP',
+                      'Spiderman.2002.720p.BluRay.x264-GRP']:
+            assert index.might_contain(title), '%s may be a queued movie' % title
+        assert not index.might_contain('Some.Other.Movie.2012.720p.BluRay.x264-GRP')
+        assert not index.might_contain('Seven.Pounds.2008.720p.BluRay.x264-GRP'), 'years should differ at most one'
+
     def test_movie_queue_different_queue_add(self, execute_task):
         task = execute_task('movie_queue_different_queue_add')
         queue = queue_get()
@@ -3,6 +3,9 @@ import mock
 import os
 import xmlrpclib
 
+import pytest
+
+from flexget.plugins import plugin_rtorrent
 from flexget.plugins.plugin_rtorrent import RTorrent
 
 torrent_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'private.torrent')
@@ -22,6 +25,12 @@ def compare_binary(obj1, obj2):
     return True
 
 
+@pytest.fixture(autouse=True)
+def clear_clients():
+    # Clients are kept between tasks, don't let the mocked ones leak into other tests
+    plugin_rtorrent._clients.clear()
+
+
 class Matcher(object):
     def __init__(self, compare, some_obj):
         self.compare = compare
@@ -101,7 +110,7 @@ class TestRTorrentClient(object):
         hash1 = '09977FE761AAAAAAAAAAAAAAAAAAAAAAAAAAAAAA'
         hash2 = '09977FE761BBBBBBBBBBBBBBBBBBBBBBBBBBBBBB'
 
-        mocked_proxy.d.multicall.return_value = (
+        mocked_proxy.d.multicall2.return_value = (
             ['/data/downloads', 'private.torrent', hash1, 'test_custom1'],
             ['/data/downloads', 'private.torrent', hash2, 'test_custom2'],
         )
@@ -110,6 +119,8 @@ class TestRTorrentClient(object):
         torrents = client.torrents(fields=['custom1'])  # Required fields should be added
 
         assert isinstance(torrents, list)
+        assert len(torrents) == 2
+        mocked_proxy.d.multicall2.assert_called_with('', 'main', 'd.base_path=', 'd.name=', 'd.hash=', 'd.custom1=')
 
         for torrent in torrents:
             assert torrent.get('base_path') == '/data/downloads'
@@ -122,9 +133,122 @@ class TestRTorrentClient(object):
             else:
                 assert False, 'Invalid hash returned'
 
-        assert mocked_proxy.system.multicall.called_with((
-            ['main', 'd.directory_base=', 'd.name=', 'd.hash=', u'd.custom1='],
-        ))
+    def test_torrents_multicall_fallback(self, mocked_proxy):
+        mocked_proxy = mocked_proxy()
+        mocked_proxy.d.multicall2.side_effect = xmlrpclib.Fault(-506, "Method 'd.multicall2' not defined")
+        mocked_proxy.d.multicall.return_value = (
+            ['/data/downloads', 'private.torrent', torrent_info_hash],
+        )
+
+        client = RTorrent('http://localhost/RPC2')
+        torrents = client.torrents(view='complete', fields=['hash'])
+
+        assert torrents == [{'base_path': '/data/downloads', 'name': 'private.torrent', 'hash': torrent_info_hash}]
+        mocked_proxy.d.multicall.assert_called_with(['complete', 'd.base_path=', 'd.name=', 'd.hash='])
+
+        # Not supported, so not tried again
+        client.torrents(view='complete', fields=['hash'])
+        assert mocked_proxy.d.multicall2.call_count == 1
+
+    def test_torrents_bad_view(self, mocked_proxy):
+        mocked_proxy = mocked_proxy()
+        mocked_proxy.d.multicall2.side_effect = [xmlrpclib.Fault(-503, 'Could not find view: nope'),
+                                                 [['/data/downloads', 'private.torrent', torrent_info_hash]]]
+
+        client = RTorrent('http://localhost/RPC2')
+        with pytest.raises(xmlrpclib.Fault):
+            client.torrents(view='nope', fields=['hash'])
+        assert not mocked_proxy.d.multicall.called
+
+        # A bad view doesn't mean d.multicall2 isn't supported
+        torrents = client.torrents(view='main', fields=['hash'])
+        assert torrents == [{'base_path': '/data/downloads', 'name': 'private.torrent', 'hash': torrent_info_hash}]
+        assert mocked_proxy.d.multicall2.call_count == 2
+        assert not mocked_proxy.d.multicall.called
+
+    def test_close_clients(self, mocked_proxy):
+        mocked_proxy = mocked_proxy()
+        mocked_proxy.side_effect = IOError('connection reset')
+        plugin_rtorrent._clients['first'] = RTorrent('http://localhost/RPC1')
+        plugin_rtorrent._clients['second'] = RTorrent('http://localhost/RPC2')
+
+        plugin_rtorrent.close_clients(None)
+        # A client failing to close should not keep the others open
+        assert mocked_proxy.call_args_list == [mock.call('close')] * 2
+        assert not plugin_rtorrent._clients
+
+    def test_torrents_info(self, mocked_proxy):
+        mocked_proxy = mocked_proxy()
+        hash1 = '09977FE761AAAAAAAAAAAAAAAAAAAAAAAAAAAAAA'
+        mocked_proxy.system.multicall.return_value = [
+            ['/data/downloads'], ['private.torrent'], [torrent_info_hash],
+            {'faultCode': -501, 'faultString': 'Could not find info-hash.'},
+            {'faultCode': -501, 'faultString': 'Could not find info-hash.'},
+            {'faultCode': -501, 'faultString': 'Could not find info-hash.'},
+        ]
+
+        client = RTorrent('http://localhost/RPC2')
+        torrents = client.torrents_info([torrent_info_hash, hash1], fields=['hash'])
+
+        assert torrents == {
+            torrent_info_hash: {'base_path': '/data/downloads', 'name': 'private.torrent', 'hash': torrent_info_hash}
+        }
+        mocked_proxy.system.multicall.assert_called_once_with([
+            {'methodName': 'd.base_path', 'params': [torrent_info_hash]},
+            {'methodName': 'd.name', 'params': [torrent_info_hash]},
+            {'methodName': 'd.hash', 'params': [torrent_info_hash]},
+            {'methodName': 'd.base_path', 'params': [hash1]},
+            {'methodName': 'd.name', 'params': [hash1]},
+            {'methodName': 'd.hash', 'params': [hash1]},
+        ])
+
+    def test_load_many(self, mocked_proxy):
+        mocked_proxy = mocked_proxy()
+        mocked_proxy.system.multicall.side_effect = [
+            # mkdir
+            [[0], {'faultCode': -503, 'faultString': 'Permission denied'}],
+            # loads
+            [[0], [0]],
+        ]
+
+        client = RTorrent('http://localhost/RPC2')
+        results = client.load_many([
+            (torrent_raw, {'directory': '/data/a'}),
+            (torrent_raw, {'directory': '/data/b'}),
+            (torrent_raw, {'directory': '/data/a', 'custom1': 'test'}),
+        ], start=True)
+
+        assert results[0] == 0
+        assert isinstance(results[1], xmlrpclib.Error)
+        assert results[2] == 0
+
+        mkdir_calls, load_calls = [c[0][0] for c in mocked_proxy.system.multicall.call_args_list]
+        assert mkdir_calls == [
+            {'methodName': 'execute.throw', 'params': ['', 'mkdir', '-p', '/data/a']},
+            {'methodName': 'execute.throw', 'params': ['', 'mkdir', '-p', '/data/b']},
+        ]
+        assert [c['methodName'] for c in load_calls] == ['load.raw_start', 'load.raw_start']
+        assert load_calls[1]['params'][2:] == ['d.directory.set=\\/data\\/a', 'd.custom1.set=test']
+
+    def test_update_many(self, mocked_proxy):
+        mocked_proxy = mocked_proxy()
+        hash1 = '09977FE761AAAAAAAAAAAAAAAAAAAAAAAAAAAAAA'
+
+        def multicall(calls):
+            return [{'faultCode': -501, 'faultString': 'Could not find info-hash.'}
+                    if call['params'][0] == hash1 else [0] for call in calls]
+
+        mocked_proxy.system.multicall.side_effect = multicall
+
+        client = RTorrent('http://localhost/RPC2')
+        results = client.update_many({
+            torrent_info_hash: {'custom1': 'test_custom1', 'priority': 1},
+            hash1: {'custom1': 'test_custom1', 'priority': 3},
+        })
+
+        assert results[torrent_info_hash] == 0
+        assert isinstance(results[hash1], xmlrpclib.Fault)
+        assert mocked_proxy.system.multicall.call_count == 1
 
     def test_update(self, mocked_proxy):
         mocked_proxy = mocked_proxy()
@@ -159,21 +283,23 @@ class TestRTorrentClient(object):
 
     def test_move(self, mocked_proxy):
         mocked_proxy = mocked_proxy()
-        mocked_proxy.system.multicall.return_value = [
-            ['private.torrent'], [torrent_info_hash], ['/data/downloads'],
+        mocked_proxy.system.multicall.side_effect = [
+            [[0], [0], ['/data/downloads'], [0]],
+            [[0], [0]],
         ]
-
-        mocked_proxy.move.return_value = 0
-        mocked_proxy.d.directory.set.return_value = 0
         mocked_proxy.execute.throw.return_value = 0
 
         client = RTorrent('http://localhost/RPC2')
         client.move(torrent_info_hash, '/new/folder')
 
-        mocked_proxy.execute.throw.assert_has_calls([
-            mock.call('', 'mkdir', '-p', '/new/folder'),
-            mock.call('', 'mv', '-u', '/data/downloads', '/new/folder'),
-        ])
+        assert mocked_proxy.system.multicall.call_args_list[0][0][0][3] == {
+            'methodName': 'execute.throw', 'params': ['', 'mkdir', '-p', '/new/folder']
+        }
+        mocked_proxy.execute.throw.assert_called_once_with('', 'mv', '-u', '/data/downloads', '/new/folder')
+        assert mocked_proxy.system.multicall.call_args_list[1][0][0] == [
+            {'methodName': 'd.directory.set', 'params': [torrent_info_hash, '/new/folder']},
+            {'methodName': 'd.start', 'params': [torrent_info_hash]},
+        ]
 
     def test_start(self, mocked_proxy):
         mocked_proxy = mocked_proxy()
@@ -261,35 +387,56 @@ class TestRTorrentOutputPlugin(object):
 
     def test_add(self, mocked_client, execute_task):
         mocked_client = mocked_client()
-        mocked_client.load.return_value = 0
+        mocked_client.load_many.return_value = [0]
         mocked_client.version = [0, 9, 4]
-        mocked_client.torrent.side_effect = [False, {'hash': torrent_info_hash}]
+        mocked_client.torrents_info.side_effect = [{}, {torrent_info_hash: {'hash': torrent_info_hash}}]
 
-        execute_task('test_add_torrent')
+        task = execute_task('test_add_torrent')
 
-        mocked_client.load.assert_called_with(
-            torrent_raw,
-            fields={'priority': 3, 'directory': '/data/downloads', 'custom1': 'test_custom1'},
+        mocked_client.load_many.assert_called_with(
+            [(torrent_raw, {'priority': 3, 'directory': '/data/downloads', 'custom1': 'test_custom1'})],
             start=True,
             mkdir=True,
         )
+        assert len(task.accepted) == 1
+
+    def test_add_existing(self, mocked_client, execute_task):
+        mocked_client = mocked_client()
+        mocked_client.version = [0, 9, 4]
+        mocked_client.torrents_info.return_value = {torrent_info_hash: {'hash': torrent_info_hash}}
+
+        execute_task('test_add_torrent')
+
+        assert not mocked_client.load_many.called
+
+    def test_add_not_verified(self, mocked_client, execute_task):
+        mocked_client = mocked_client()
+        mocked_client.load_many.return_value = [0]
+        mocked_client.version = [0, 9, 4]
+        mocked_client.torrents_info.return_value = {}
+
+        with mock.patch('flexget.plugins.plugin_rtorrent.sleep'):
+            execute_task('test_add_torrent')
+
+        # The existence check, then polling for the loaded torrent until giving up
+        assert mocked_client.torrents_info.call_count == 6
+        assert mocked_client.load_many.call_count == 1
 
     def test_add_set(self, mocked_client, execute_task):
         mocked_client = mocked_client()
-        mocked_client.load.return_value = 0
+        mocked_client.load_many.return_value = [0]
         mocked_client.version = [0, 9, 4]
-        mocked_client.torrent.side_effect = [False, {'hash': torrent_info_hash}]
+        mocked_client.torrents_info.side_effect = [{}, {torrent_info_hash: {'hash': torrent_info_hash}}]
 
         execute_task('test_add_torrent_set')
 
-        mocked_client.load.assert_called_with(
-            torrent_raw,
-            fields={
+        mocked_client.load_many.assert_called_with(
+            [(torrent_raw, {
                 'priority': 1,
                 'directory': '/data/downloads',
                 'custom1': 'test_custom1',
                 'custom2': 'test_custom2'
-            },
+            })],
             start=False,
             mkdir=False,
         )
@@ -297,29 +444,27 @@ class TestRTorrentOutputPlugin(object):
     def test_update(self, mocked_client, execute_task):
         mocked_client = mocked_client()
         mocked_client.version = [0, 9, 4]
-        mocked_client.update.return_value = 0
-        # ntpath complains on windows if base_path is a MagicMock
-        mocked_client.torrent.side_effect = [False, {'base_path': ''}]
+        mocked_client.update_many.return_value = {torrent_info_hash: 0}
+        mocked_client.torrents_info.return_value = {}
 
         execute_task('test_update')
 
-        mocked_client.update.assert_called_with(
-            torrent_info_hash,
-            {'priority': 1, 'custom1': 'test_custom1'}
+        mocked_client.update_many.assert_called_with(
+            {torrent_info_hash: {'priority': 1, 'custom1': 'test_custom1'}}
         )
+        assert not mocked_client.move.called
 
     def test_update_path(self, mocked_client, execute_task):
         mocked_client = mocked_client()
         mocked_client.version = [0, 9, 4]
-        mocked_client.update.return_value = 0
+        mocked_client.update_many.return_value = {torrent_info_hash: 0}
         mocked_client.move.return_value = 0
-        mocked_client.torrent.return_value = {'base_path': '/some/path'}
+        mocked_client.torrents_info.return_value = {torrent_info_hash: {'base_path': '/some/path'}}
 
         execute_task('test_update_path')
 
-        mocked_client.update.assert_called_with(
-            torrent_info_hash,
-            {'custom1': 'test_custom1'}
+        mocked_client.update_many.assert_called_with(
+            {torrent_info_hash: {'custom1': 'test_custom1'}}
         )
 
         mocked_client.move.assert_called_with(
@@ -329,13 +474,12 @@ class TestRTorrentOutputPlugin(object):
 
     def test_delete(self, mocked_client, execute_task):
         mocked_client = mocked_client()
-        mocked_client.load.return_value = 0
         mocked_client.version = [0, 9, 4]
-        mocked_client.delete.return_value = 0
+        mocked_client.delete_many.return_value = [0]
 
         execute_task('test_delete')
 
-        mocked_client.delete.assert_called_with(torrent_info_hash)
+        mocked_client.delete_many.assert_called_with([torrent_info_hash])
 
 
 @mock.patch('flexget.plugins.plugin_rtorrent.RTorrent')
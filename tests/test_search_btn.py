@@ -0,0 +1,62 @@
+from __future__ import unicode_literals, division, absolute_import
+
+import mock
+
+from flexget.entry import Entry
+from flexget.plugins import search_btn
+from flexget.plugins.search_btn import SearchBTN
+
+
+def torrent(name):
+    return {'ReleaseName': name, 'Resolution': '720p', 'Source': 'HDTV', 'Codec': 'x264',
+            'DownloadURL': 'http://btn/%s' % name, 'Seeders': '10', 'Leechers': '1', 'InfoHash': name,
+            'TvdbID': '0', 'TvrageID': '0'}
+
+
+class TestSearchBTNBatch(object):
+    def test_retry_pending(self, monkeypatch):
+        calls = []
+
+        def call(task, batch):
+            calls.append(batch)
+            content = []
+            for request in batch:
+                series = request['params'][1]['series']
+                result = {'torrents': {}}
+                # Only the name without the parenthetical and the plain show have results
+                if not series.endswith(')'):
+                    result['torrents']['1'] = torrent('%s.S01E01' % series)
+                content.append({'id': request['id'], 'result': result})
+            return content
+
+        limiter = mock.Mock()
+        monkeypatch.setattr(SearchBTN, 'call', staticmethod(call))
+        monkeypatch.setattr(SearchBTN, 'request_limiter', limiter)
+        entries = [Entry(title='Foo S01E01', series_name='Foo', series_id='S01E01'),
+                   Entry(title='Bar (2015) S01E01', series_name='Bar (2015)', series_id='S01E01'),
+                   Entry(title='Baz (US) S01E01', series_name='Baz (US)', series_id='S01E01')]
+        results = SearchBTN().search_batch(mock.Mock(), entries, 'apikey')
+
+        assert [len(batch) for batch in calls] == [3, 2], 'only entries without results should be searched again'
+        assert [request['params'][1]['series'] for request in calls[1]] == ['Bar', 'Baz']
+        assert [[e['title'] for e in result] for result in results] == [
+            ['Foo.S01E01 720p HDTV x264'], ['Bar.S01E01 720p HDTV x264'], ['Baz.S01E01 720p HDTV x264']]
+        assert limiter.call_count == 2 + 1, 'every call in a batch should take a token'
+
+    def test_batch_size(self, monkeypatch):
+        calls = []
+
+        def call(task, batch):
+            calls.append(batch)
+            return [{'id': request['id'], 'result': {'torrents': {}}} for request in batch]
+
+        limiter = mock.Mock()
+        monkeypatch.setattr(SearchBTN, 'call', staticmethod(call))
+        monkeypatch.setattr(SearchBTN, 'request_limiter', limiter)
+        entries = [Entry(title='Foo S01E%02d' % ep, series_name='Foo', series_id='S01E%02d' % ep)
+                   for ep in range(1, search_btn.BATCH_SIZE + 6)]
+        results = SearchBTN().search_batch(mock.Mock(), entries, 'apikey')
+
+        assert [len(batch) for batch in calls] == [search_btn.BATCH_SIZE, 5]
+        assert results == [set()] * len(entries)
+        assert limiter.call_count == len(entries) - len(calls)
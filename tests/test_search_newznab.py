@@ -0,0 +1,72 @@
+from __future__ import unicode_literals, division, absolute_import
+
+import urlparse
+
+import mock
+
+from flexget.entry import Entry
+from flexget.plugins import search_newznab
+from flexget.plugins.search_newznab import Newznab
+
+
+class TestNewznabBatch(object):
+    config = 'tasks: {}'
+
+    def search(self, monkeypatch, entries, season_results):
+        """Runs a batch search for `entries`, returns its results and the query parameters of each request made."""
+        requests = []
+
+        def fill_entries_for_url(url, task):
+            params = dict(urlparse.parse_qsl(urlparse.urlparse(url).query))
+            requests.append(params)
+            if 'ep' in params:
+                return [Entry(title='%s.S%02dE%02d.Single' % (params['q'], int(params['season']), int(params['ep'])))]
+            offset = int(params['offset'])
+            return [Entry(title=title) for title in season_results[offset:offset + int(params['limit'])]]
+
+        monkeypatch.setattr(Newznab, 'fill_entries_for_url', staticmethod(fill_entries_for_url))
+        config = {'category': 'tv', 'url': 'http://newznab/api?t=tvsearch'}
+        return Newznab().search_batch(mock.Mock(), entries, config), requests
+
+    def test_season_split(self, manager, monkeypatch):
+        entries = [Entry(title='Foo S01E%02d' % ep, series_name='Foo', series_season=1, series_episode=ep)
+                   for ep in (1, 2, 3)]
+        results, requests = self.search(monkeypatch, entries, [
+            'Foo.S01E01.720p.HDTV', 'Foo.S01E02.720p.HDTV', 'Foo.S01E01.1080p.HDTV', 'Foo.S02E01.720p.HDTV'])
+
+        assert [[e['title'] for e in result] for result in results] == [
+            ['Foo.S01E01.720p.HDTV', 'Foo.S01E01.1080p.HDTV'], ['Foo.S01E02.720p.HDTV'], []]
+        assert 'ep' not in requests[0]
+        assert len(requests) == 1, 'a complete season listing should not be followed by episode searches'
+
+    def test_unparsed_titles(self, manager, monkeypatch):
+        entries = [Entry(title='Foo S01E%02d' % ep, series_name='Foo', series_season=1, series_episode=ep)
+                   for ep in (1, 2)]
+        results, requests = self.search(monkeypatch, entries, ['Foo.S01E01.720p.HDTV', 'Foo.Complete.Season'])
+
+        assert [[e['title'] for e in result] for result in results] == [
+            ['Foo.S01E01.720p.HDTV'], ['Foo.S01E02.Single']]
+        assert requests[1]['ep'] == '2', 'missing episodes might be in releases which could not be parsed'
+        assert len(requests) == 2
+
+    def test_season_pages(self, manager, monkeypatch):
+        monkeypatch.setattr(search_newznab, 'PAGE_SIZE', 2)
+        entries = [Entry(title='Foo S01E%02d' % ep, series_name='Foo', series_season=1, series_episode=ep)
+                   for ep in (1, 5, 6)]
+        results, requests = self.search(monkeypatch, entries,
+                                        ['Foo.S01E%02d.HDTV' % ep for ep in range(1, 6)])
+
+        assert [[e['title'] for e in result] for result in results] == [['Foo.S01E01.HDTV'], ['Foo.S01E05.HDTV'], []]
+        assert [params['offset'] for params in requests] == ['0', '2', '4']
+
+    def test_season_cut_off(self, manager, monkeypatch):
+        monkeypatch.setattr(search_newznab, 'PAGE_SIZE', 2)
+        monkeypatch.setattr(search_newznab, 'SEASON_PAGES', 1)
+        entries = [Entry(title='Foo S01E%02d' % ep, series_name='Foo', series_season=1, series_episode=ep)
+                   for ep in (1, 5)]
+        results, requests = self.search(monkeypatch, entries,
+                                        ['Foo.S01E%02d.HDTV' % ep for ep in range(1, 6)])
+
+        assert [[e['title'] for e in result] for result in results] == [['Foo.S01E01.HDTV'], ['Foo.S01E05.Single']]
+        assert requests[1]['ep'] == '5', 'episodes beyond the pages fetched should be searched on their own'
+        assert len(requests) == 2
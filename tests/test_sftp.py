@@ -0,0 +1,160 @@
+from __future__ import unicode_literals, division, absolute_import
+
+import posixpath
+import stat
+import threading
+from StringIO import StringIO
+
+import mock
+import pytest
+
+from flexget.entry import Entry
+from flexget.plugins import plugin_sftp
+from flexget.plugins.plugin_sftp import ConnectionConfig, ConnectionPool, RemoteTree, SftpDownload, run_transfers
+
+
+class Attributes(object):
+    def __init__(self, filename, st_mode, st_size=0):
+        self.filename = filename
+        self.st_mode = st_mode
+        self.st_size = st_size
+
+
+class RemoteFile(StringIO):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def prefetch(self, size=None):
+        pass
+
+
+class FakeSftp(object):
+    """Fake sftp connection to a server with the files in `files`, a dict of path: content."""
+
+    def __init__(self, files):
+        self.files = files
+        self.closed = False
+        self.listings = []
+
+    def isdir(self, path):
+        path = path.rstrip('/') + '/'
+        return any(name.startswith(path) for name in self.files)
+
+    def stat(self, path):
+        if path in self.files:
+            return Attributes(posixpath.basename(path), stat.S_IFREG, len(self.files[path]))
+        if self.isdir(path):
+            return Attributes(posixpath.basename(path), stat.S_IFDIR)
+        raise IOError('No such file: %s' % path)
+
+    def listdir_attr(self, path):
+        self.listings.append(path)
+        prefix = path.rstrip('/') + '/'
+        names = set(name[len(prefix):].split('/')[0] for name in self.files if name.startswith(prefix))
+        return [self.stat(prefix + name) for name in sorted(names)]
+
+    def open(self, path, mode):
+        return RemoteFile(self.files[path])
+
+    def close(self):
+        self.closed = True
+
+
+conf = ConnectionConfig('example.com', 22, 'user', None, None, None)
+
+
+class TestConnectionPool(object):
+    def test_reuse(self, monkeypatch):
+        connect = mock.Mock(side_effect=lambda conf: FakeSftp({}))
+        monkeypatch.setattr(plugin_sftp, 'sftp_connect', connect)
+        pool = ConnectionPool()
+        with pool.connection(conf) as sftp:
+            pass
+        with pool.connection(conf) as other:
+            assert other is sftp, 'idle connections should be reused'
+            with pool.connection(conf) as concurrent:
+                assert concurrent is not sftp
+        assert connect.call_count == 2
+        pool.close()
+        assert sftp.closed and concurrent.closed
+
+    def test_discard_on_error(self, monkeypatch):
+        monkeypatch.setattr(plugin_sftp, 'sftp_connect', lambda conf: FakeSftp({}))
+        pool = ConnectionPool()
+        with pytest.raises(IOError):
+            with pool.connection(conf) as sftp:
+                raise IOError('connection lost')
+        assert sftp.closed
+        assert pool.get(conf) is not sftp, 'a failed connection should not be handed out again'
+
+
+class TestRemoteTree(object):
+    files = {'/dl/a.mkv': 'aaaa', '/dl/show/b.mkv': 'bb', '/dl/show/sub/c.srt': 'c'}
+
+    def test_walk(self):
+        sftp = FakeSftp(self.files)
+        tree = RemoteTree(sftp)
+        assert [path for path, attr in tree.walk('/dl')] == [
+            '/dl/a.mkv', '/dl/show', '/dl/show/b.mkv', '/dl/show/sub', '/dl/show/sub/c.srt']
+        assert [path for path, attr in tree.walk('/dl', recursive=False)] == ['/dl/a.mkv', '/dl/show']
+
+    def test_size(self):
+        sftp = FakeSftp(self.files)
+        tree = RemoteTree(sftp)
+        sizes = dict((path, tree.size(path, attr)) for path, attr in tree.walk('/dl'))
+        assert sizes == {'/dl/a.mkv': 4, '/dl/show': 3, '/dl/show/b.mkv': 2, '/dl/show/sub': 1,
+                         '/dl/show/sub/c.srt': 1}
+        assert sorted(sftp.listings) == ['/dl', '/dl/show', '/dl/show/sub'], 'each directory should be listed once'
+
+
+class TestRunTransfers(object):
+    def test_errors(self):
+        threads = set()
+
+        def transfer(name):
+            threads.add(threading.current_thread())
+            if name == 'bad':
+                raise IOError('failed')
+
+        results = dict(run_transfers(transfer, [('good',), ('bad',), ('other',)], 2))
+        assert results[('good',)] is None and results[('other',)] is None
+        assert isinstance(results[('bad',)], IOError)
+        assert threading.current_thread() not in threads
+
+    def test_no_jobs(self):
+        assert list(run_transfers(mock.Mock(), [], 4)) == []
+
+
+class TestSftpDownload(object):
+    files = {'/dl/show/b.mkv': 'bb', '/dl/show/sub/c.srt': 'c'}
+
+    def download(self, monkeypatch, connect, entries, tmpdir):
+        monkeypatch.setattr(plugin_sftp, 'pysftp', mock.Mock())
+        monkeypatch.setattr(plugin_sftp, 'sftp_connect', connect)
+        monkeypatch.setattr(plugin_sftp, 'pool', ConnectionPool())
+        config = {'to': tmpdir.strpath, 'recursive': True, 'delete_origin': False, 'workers': 2}
+        SftpDownload().on_task_download(mock.Mock(accepted=entries), config)
+
+    def test_download(self, monkeypatch, tmpdir):
+        self.download(monkeypatch, lambda conf: FakeSftp(self.files),
+                      [Entry(title='show', url='sftp://user@example.com/dl/show')], tmpdir)
+        assert tmpdir.join('show', 'b.mkv').read() == 'bb'
+        assert tmpdir.join('show', 'sub', 'c.srt').read() == 'c'
+
+    def test_broken_listing_connection(self, monkeypatch, tmpdir):
+        connections = []
+
+        def connect(conf):
+            sftp = FakeSftp(self.files)
+            sftp.stat = mock.Mock(side_effect=EOFError('connection lost'))
+            connections.append(sftp)
+            return sftp
+
+        with pytest.raises(EOFError):
+            self.download(monkeypatch, connect, [Entry(title='show', url='sftp://user@example.com/dl/show')], tmpdir)
+        assert connections[0].closed
+        assert not plugin_sftp.pool._idle[ConnectionConfig('example.com', 22, 'user', None, None, None)], \
+            'a broken connection should not go back to the pool'
@@ -1,7 +1,7 @@
 from __future__ import unicode_literals, division, absolute_import
 
 from flexget.manager import Session
-from flexget.utils.simple_persistence import SimplePersistence
+from flexget.utils.simple_persistence import SimplePersistence, SimpleKeyValue
 
 
 class TestSimplePersistence(object):
@@ -30,3 +30,60 @@ class TestSimplePersistence(object):
         # Make sure it commits and actually persists
         persist = SimplePersistence('testplugin')
         assert persist['aoeu'] == 'test'
+
+    def test_flush_only_changed(self, execute_task):
+        persist = SimplePersistence('testplugin')
+        persist['changed'] = 'a'
+        persist['unchanged'] = 'b'
+        persist['container'] = []
+        persist['deleted'] = 'c'
+        SimplePersistence.flush()
+
+        persist['changed'] = 'd'
+        persist['container'].append(1)
+        del persist['deleted']
+        SimplePersistence.flush()
+        # Nothing left to write
+        assert not SimplePersistence.class_dirty.get(None)
+
+        SimplePersistence.reset()
+        SimplePersistence.load()
+        persist = SimplePersistence('testplugin')
+        assert persist['changed'] == 'd'
+        assert persist['unchanged'] == 'b'
+        assert persist['container'] == [1]
+        assert 'deleted' not in persist
+        with Session() as session:
+            keys = session.query(SimpleKeyValue.key).filter(SimpleKeyValue.task == None).filter(
+                SimpleKeyValue.plugin == 'testplugin').all()
+            assert sorted(key for (key,) in keys if key != 'aoeu') == ['changed', 'container', 'unchanged']
+
+    def test_unload(self, execute_task):
+        persist = SimplePersistence('testplugin')
+        persist['kept'] = 'a'
+        SimplePersistence.flush()
+        with Session() as session:
+            session.query(SimpleKeyValue).delete()
+        # Like a startup with another database, values in memory are kept and written to it again
+        SimplePersistence.unload()
+        SimplePersistence.load()
+        assert persist['kept'] == 'a'
+        SimplePersistence.flush()
+        with Session() as session:
+            assert session.query(SimpleKeyValue).filter(SimpleKeyValue.key == 'kept').count() == 1
+
+    def test_load_tasks(self, execute_task, monkeypatch):
+        from flexget.utils import simple_persistence
+        with Session() as session:
+            session.add(SimpleKeyValue('a', 'testplugin', 'key', 'value a'))
+            session.add(SimpleKeyValue('b', 'testplugin', 'key', 'value b'))
+        SimplePersistence.reset()
+        SimplePersistence.load(tasks=['a'])
+        assert SimplePersistence.class_store['a']['testplugin']['key'] == 'value a'
+        assert 'b' not in SimplePersistence.class_store
+        SimplePersistence.load(tasks=['a', 'b'])
+        assert SimplePersistence.class_store['b']['testplugin']['key'] == 'value b'
+
+        # Tasks which are all loaded already don't need the database
+        monkeypatch.setattr(simple_persistence, 'Session', None)
+        SimplePersistence.load(tasks=['a', 'b'])
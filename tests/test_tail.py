@@ -0,0 +1,111 @@
+from __future__ import unicode_literals, division, absolute_import
+import io
+import os
+
+import pytest
+
+from flexget.plugins.input import tail
+
+
+@pytest.mark.filecopy('tail.log', '__tmp__/tail.log')
+class TestTail(object):
+    config = """
+        templates:
+          global:
+            accept_all: yes
+        tasks:
+          test:
+            tail:
+              file: __tmp__/tail.log
+              entry:
+                title: 'TITLE: (.*) URL:'
+                url: 'URL: (.*)'
+          test_limit:
+            tail:
+              file: __tmp__/tail.log
+              entry:
+                title: 'TITLE: (.*) URL:'
+                url: 'URL: (.*)'
+              max_entries: 2
+          test_encoding:
+            tail:
+              file: __tmp__/tail.log
+              entry:
+                title: 'TITLE: (.*) URL:'
+                url: 'URL: (.*)'
+              encoding: utf8
+              max_entries: 1
+          test_lines:
+            tail:
+              file: __tmp__/tail.log
+              entry:
+                title: 'TITLE: ([^|]+?)\s+URL'
+                url: 'URL: (\S+)'
+    """
+
+    def append(self, tmpdir, text):
+        with io.open(tmpdir.join('tail.log').strpath, 'ab') as f:
+            f.write(text)
+
+    def titles(self, task):
+        return [entry['title'] for entry in task.entries]
+
+    def test_resume(self, execute_task, tmpdir):
+        task = execute_task('test')
+        assert self.titles(task) == ['entry 1', 'entry 2', 'entry 3']
+        task = execute_task('test')
+        assert not task.entries, 'lines read before should not be read again'
+        self.append(tmpdir, b'TITLE: entry 4 URL: http://localhost/4\nTITLE: entry 5 URL: http://loc')
+        task = execute_task('test')
+        assert self.titles(task) == ['entry 4'], 'line being written should be left for next run'
+        self.append(tmpdir, b'alhost/5\n')
+        task = execute_task('test')
+        assert self.titles(task) == ['entry 5']
+        assert task.find_entry(title='entry 5')['url'] == 'http://localhost/5'
+
+    def test_max_entries(self, execute_task, tmpdir):
+        task = execute_task('test_limit')
+        assert self.titles(task) == ['entry 1', 'entry 2']
+        task = execute_task('test_limit')
+        assert self.titles(task) == ['entry 3'], 'remaining entries should be carried over to the next run'
+        task = execute_task('test_limit')
+        assert not task.entries
+
+    def test_encoding(self, execute_task, tmpdir):
+        with io.open(tmpdir.join('tail.log').strpath, 'wb') as f:
+            f.write('TITLE: caf\xe9 URL: http://localhost/1\nTITLE: na\xefve URL: http://localhost/2\n'.encode('utf8'))
+        task = execute_task('test_encoding')
+        assert self.titles(task) == ['caf\xe9']
+        task = execute_task('test_encoding')
+        assert self.titles(task) == ['na\xefve'], 'next run should continue from the byte offset of the next line'
+
+    def test_matches_in_line(self, execute_task, tmpdir):
+        with io.open(tmpdir.join('tail.log').strpath, 'wb') as f:
+            f.write(b'TITLE: Foo.S01E01\nURL: http://x/1\nTITLE: Bar.S01E01 URL: http://x/2\n')
+        task = execute_task('test_lines')
+        assert self.titles(task) == ['Bar.S01E01'], 'fields should not match across lines'
+
+    def test_rotation(self, execute_task, tmpdir):
+        execute_task('test')
+        path = tmpdir.join('tail.log').strpath
+        os.rename(path, path + '.1')
+        # Longer than what was read already, so only the inode shows it's a different file
+        with io.open(path, 'wb') as f:
+            for i in range(5):
+                f.write(b'TITLE: rotated %d URL: http://localhost/rotated/%d\n' % (i, i))
+        task = execute_task('test')
+        assert self.titles(task) == ['rotated %d' % i for i in range(5)]
+
+    def test_truncate(self, execute_task, tmpdir):
+        execute_task('test')
+        with io.open(tmpdir.join('tail.log').strpath, 'wb') as f:
+            f.write(b'TITLE: truncated URL: http://localhost/truncated\n')
+        task = execute_task('test')
+        assert self.titles(task) == ['truncated']
+
+    def test_chunks(self, execute_task, tmpdir, monkeypatch):
+        # Chunks smaller than a line, and lines spanning the allocation granularity
+        monkeypatch.setattr(tail, 'CHUNK_SIZE', 7)
+        self.append(tmpdir, b'x' * tail.mmap.ALLOCATIONGRANULARITY + b'\nTITLE: entry 4 URL: http://localhost/4\n')
+        task = execute_task('test')
+        assert self.titles(task) == ['entry 1', 'entry 2', 'entry 3', 'entry 4']
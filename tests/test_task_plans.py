@@ -0,0 +1,124 @@
+from __future__ import unicode_literals, division, absolute_import
+
+from flexget import plugin
+from flexget.event import fire_event
+from flexget.task import Task
+
+
+class OrderPlugin(object):
+    """Records the order its instances run in on the filter phase."""
+
+    schema = {'type': 'boolean'}
+    order = []
+
+    def __init__(self, name):
+        self.name = name
+
+    def on_task_filter(self, task, config):
+        OrderPlugin.order.append(self.name)
+
+
+class OrderA(OrderPlugin):
+    def __init__(self):
+        super(OrderA, self).__init__('a')
+
+    @plugin.priority(130)
+    def on_task_filter(self, task, config):
+        super(OrderA, self).on_task_filter(task, config)
+
+
+class OrderB(OrderPlugin):
+    def __init__(self):
+        super(OrderB, self).__init__('b')
+
+    @plugin.priority(120)
+    def on_task_filter(self, task, config):
+        super(OrderB, self).on_task_filter(task, config)
+
+plugin.register(OrderA, 'test_order_a', api_ver=2)
+plugin.register(OrderB, 'test_order_b', api_ver=2)
+
+
+class TestPhasePlans(object):
+    config = """
+        tasks:
+          test:
+            mock:
+              - {title: 'foo'}
+            accept_all: yes
+    """
+
+    def plugin_names(self, task, phase):
+        return [p.name for p in task.plugins(phase)]
+
+    def test_shared(self, manager):
+        task = Task(manager, 'test', config={'mock': [], 'accept_all': True})
+        other = Task(manager, 'other', config={'mock': [{'title': 'bar'}], 'accept_all': True})
+        assert task._phase_plan('filter') is other._phase_plan('filter')
+        assert task._phase_plan('filter') is not task._phase_plan('input')
+
+    def test_config_change(self, manager):
+        task = Task(manager, 'test', config={'mock': [], 'accept_all': True})
+        plan = task._phase_plan('filter')
+        assert 'accept_all' in self.plugin_names(task, 'filter')
+        task = Task(manager, 'test', config={'mock': []})
+        assert task._phase_plan('filter') is not plan
+        assert 'accept_all' not in self.plugin_names(task, 'filter')
+
+    def test_config_updated(self, manager):
+        task = Task(manager, 'test', config={'mock': [], 'accept_all': True})
+        plan = task._phase_plan('filter')
+        fire_event('manager.config_updated', manager)
+        assert task._phase_plan('filter') is not plan, 'plans should be compiled again after a config update'
+        assert self.plugin_names(task, 'filter') == [p.name for _, p, _, _ in plan.steps]
+
+    def test_builtin_toggle(self, manager, execute_task):
+        seen = plugin.get_plugin_by_name('seen')
+        task = execute_task('test')
+        assert len(task.accepted) == 1
+        plan = task._phase_plan('filter')
+        assert 'seen' in self.plugin_names(task, 'filter')
+        seen.builtin = False
+        try:
+            task = execute_task('test')
+            assert task._phase_plan('filter') is not plan
+            assert 'seen' not in self.plugin_names(task, 'filter')
+            assert len(task.accepted) == 1, 'seen is not builtin, the entry should be accepted again'
+        finally:
+            seen.builtin = True
+        task = execute_task('test')
+        assert task._phase_plan('filter') is plan
+        assert not task.accepted, 'seen is builtin again, the entry should be rejected'
+
+
+class TestPluginPriorityPlans(object):
+    config = """
+        templates:
+          global:
+            mock:
+              - {title: 'foo'}
+            test_order_a: yes
+            test_order_b: yes
+        tasks:
+          default: {}
+          a_first:
+            plugin_priority:
+              test_order_a: 200
+              test_order_b: 100
+          b_first:
+            plugin_priority:
+              test_order_a: 100
+              test_order_b: 200
+    """
+
+    def run_order(self, execute_task, name):
+        OrderPlugin.order = []
+        execute_task(name)
+        return OrderPlugin.order
+
+    def test_plugin_priority(self, execute_task):
+        assert self.run_order(execute_task, 'a_first') == ['a', 'b']
+        assert self.run_order(execute_task, 'b_first') == ['b', 'a']
+        assert self.run_order(execute_task, 'a_first') == ['a', 'b']
+        assert self.run_order(execute_task, 'default') == ['a', 'b'], 'priorities of a task should not leak'
+        assert self.run_order(execute_task, 'b_first') == ['b', 'a']
@@ -1,4 +1,5 @@
 from __future__ import unicode_literals, division, absolute_import
+import pytest
 
 
 class TestTemplate(object):
@@ -104,3 +105,32 @@ class TestTemplateRerun(object):
     def test_rerun(self, execute_task):
         task = execute_task('test_rerun')
         assert len(task.config['series']) == 1
+
+
+class TestRenderFromEntry(object):
+    config = '{tasks: {}}'
+
+    def test_render(self, manager):
+        from flexget.entry import Entry
+        from flexget.utils import template
+
+        entry = Entry(title='foo', url='http://foo', series_name='Foo')
+        entry.register_lazy_func(lambda e: e.update(lazy_field='lazy'), ['lazy_field'])
+        assert template.render_from_entry('{{title}} {{series_name|upper}}', entry) == 'foo FOO'
+        assert template.render_from_entry('{{lazy_field}}', entry) == 'lazy'
+        # Plain strings skip jinja, old style string replacement still works
+        assert template.render_from_entry('plain', entry) == 'plain'
+        assert template.render_from_entry('%(title)s.torrent', entry) == 'foo.torrent'
+        with pytest.raises(template.RenderError):
+            template.render_from_entry('{{missing}}', entry)
+
+    def test_compile_cache(self, manager, monkeypatch):
+        from flexget.utils import template
+
+        monkeypatch.setattr(template, 'TEMPLATE_CACHE_SIZE', 2)
+        first = template.compile_template('{{a}}')
+        assert template.compile_template('{{a}}') is first
+        template.compile_template('{{b}}')
+        template.compile_template('{{c}}')
+        assert len(template._template_cache) == 2
+        assert template.compile_template('{{a}}') is not first
@@ -2,7 +2,7 @@ from __future__ import unicode_literals, division, absolute_import
 import os
 import pytest
 
-from flexget.utils.bittorrent import Torrent
+from flexget.utils.bittorrent import Torrent, bdecode, bencode
 
 
 class TestInfoHash(object):
@@ -35,6 +35,35 @@ class TestInfoHash(object):
         assert task.all_entries[1]['torrent_info_hash'] == '2B3959BED2BE445BB0E3EA96F497D873D5FAED05'
 
 
+class TestBencode(object):
+    def test_round_trip(self):
+        with open('multi.torrent', 'rb') as f:
+            data = f.read().strip()
+        assert bencode(bdecode(data)) == data
+
+    def test_decode(self):
+        data = b'd3:foo3:bar4:infod4:name4:test6:pieces4:\xff\xfe\xfd\xfce4:listli-12ei3eee'
+        decoded = bdecode(data)
+        assert decoded['foo'] == 'bar'
+        assert decoded['info']['name'] == 'test'
+        # Binary blob is left as bytes
+        assert decoded['info']['pieces'] == b'\xff\xfe\xfd\xfc'
+        assert decoded['list'] == [-12, 3]
+        assert bencode(decoded) == data
+
+    @pytest.mark.parametrize('data', [b'', b'i12', b'd3:foo', b'5:abc', b'x', b'i1ei2e'])
+    def test_invalid(self, data):
+        with pytest.raises(SyntaxError):
+            bdecode(data)
+
+    def test_info_hash_cache(self):
+        torrent = Torrent.from_file('test.torrent')
+        assert torrent.info_hash == '14FFE5DD23188FD5CB53A1D47F1289DB70ABF31E'
+        torrent.content['info']['private'] = 1
+        torrent.modified = True
+        assert torrent.info_hash != '14FFE5DD23188FD5CB53A1D47F1289DB70ABF31E'
+
+
 class TestSeenInfoHash(object):
 
     config = """
@@ -309,6 +338,56 @@ class TestTorrentAlive(object):
         assert get_udp_seeds('udp://127.0.0.1:65536/announce','HASH') == 0
 
 
+class TestTorrentAliveScrape(object):
+    @pytest.fixture(autouse=True)
+    def clear_state(self):
+        from flexget.plugins.filter import torrent_alive
+        torrent_alive.scrape_cache.clear()
+        torrent_alive.tracker_backoff.clear()
+
+    def test_batched_scrape(self, monkeypatch):
+        from flexget.plugins.filter import torrent_alive
+        calls = []
+
+        def fake_scrape(url, info_hashes):
+            calls.append((url, sorted(info_hashes)))
+            if url == 'http://broken/announce':
+                raise torrent_alive.ScrapeError('broken')
+            return dict((h, 5 if url == 'http://a/announce' else 10) for h in info_hashes)
+
+        monkeypatch.setattr(torrent_alive, 'scrape_tracker', fake_scrape)
+        torrents = {
+            'AA': ['http://a/announce', 'http://broken/announce'],
+            'BB': ['http://a/announce', 'udp://b:80/announce'],
+        }
+        seeds = torrent_alive.scrape_torrents(torrents)
+        assert seeds == {'AA': 5, 'BB': 10}
+        # Each tracker gets a single request for all of its torrents
+        assert sorted(calls) == [('http://a/announce', ['AA', 'BB']),
+                                 ('http://broken/announce', ['AA']),
+                                 ('udp://b:80/announce', ['BB'])]
+
+        # Second run is served from cache, and the failing tracker is backed off
+        del calls[:]
+        assert torrent_alive.scrape_torrents(torrents) == seeds
+        assert not calls
+
+
+    def test_single_hash_response(self, monkeypatch):
+        from flexget.plugins.filter import torrent_alive
+        calls = []
+
+        def fake_scrape_http(url, info_hashes):
+            # Tracker only answers for the first info_hash of the query
+            calls.append(list(info_hashes))
+            return {info_hashes[0]: len(calls)}
+
+        monkeypatch.setattr(torrent_alive, 'scrape_http', fake_scrape_http)
+        seeds = torrent_alive.scrape_tracker('http://a/announce', ['AA', 'BB', 'CC'])
+        assert seeds == {'AA': 1, 'BB': 2, 'CC': 3}
+        assert calls == [['AA', 'BB', 'CC'], ['BB'], ['CC']]
+
+
 class TestRtorrentMagnet(object):
     __tmp__ = True
     config = """
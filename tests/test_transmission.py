@@ -0,0 +1,93 @@
+from __future__ import unicode_literals, division, absolute_import
+
+import mock
+
+from flexget.plugins import plugin_transmission
+from flexget.plugins.plugin_transmission import TransmissionSync
+
+
+class Torrent(object):
+    def __init__(self, id, name=None):
+        self.id = id
+        self.name = name
+
+
+class MockClient(object):
+    """Fake transmissionrpc client for a daemon with `torrents`, counting the requests made."""
+
+    def __init__(self, torrents):
+        self.torrents = torrents
+        self.active = []
+        self.requests = []
+
+    def get_torrents(self, ids=None, arguments=None):
+        self.requests.append(('get_torrents', ids, arguments))
+        return [t for t in self.torrents if ids is None or t.id in ids]
+
+    def _request(self, method, arguments):
+        self.requests.append((method, arguments['ids'], arguments['fields']))
+        return dict((t.id, t) for t in self.torrents if t.id in self.active)
+
+    def remove_torrent(self, ids, delete_data):
+        self.torrents = [t for t in self.torrents if t.id not in ids]
+
+
+class TestTransmissionSync(object):
+    def test_full_refresh(self):
+        client = MockClient([Torrent(1), Torrent(2)])
+        sync = TransmissionSync(client)
+        assert sorted(t.id for t in sync.get_torrents(['name'])) == [1, 2]
+        assert client.requests == [('get_torrents', None, mock.ANY)]
+        assert set(client.requests[0][2]) == set(['id', 'name'])
+
+        # New fields need everything to be fetched again
+        sync.get_torrents(['status'])
+        assert client.requests[-1][0] == 'get_torrents' and client.requests[-1][1] is None
+        assert set(client.requests[-1][2]) == set(['id', 'name', 'status'])
+
+    def test_delta_refresh(self):
+        client = MockClient([Torrent(1, 'a'), Torrent(2, 'b'), Torrent(3, 'c')])
+        sync = TransmissionSync(client)
+        sync.get_torrents(['name'])
+        del client.requests[:]
+
+        client.torrents = [Torrent(1, 'a'), Torrent(2, 'b changed'), Torrent(4, 'd')]
+        client.active = [2]
+        torrents = sync.get_torrents(['name'])
+        assert sorted((t.id, t.name) for t in torrents) == [(1, 'a'), (2, 'b changed'), (4, 'd')]
+        assert client.requests[1][:2] == ('torrent-get', 'recently-active')
+        assert client.requests[2][:2] == ('get_torrents', [4]), 'only added torrents should be fetched in full'
+        assert len(client.requests) == 3
+
+    def test_stale_state(self):
+        client = MockClient([Torrent(1)])
+        sync = TransmissionSync(client)
+        sync.get_torrents(['name'])
+        sync.refreshed -= plugin_transmission.RECENTLY_ACTIVE_SECONDS
+        del client.requests[:]
+        sync.get_torrents(['name'])
+        assert [request[:2] for request in client.requests] == [('get_torrents', None)]
+
+    def test_private_request_fails(self):
+        client = MockClient([Torrent(1, 'a')])
+        sync = TransmissionSync(client)
+        sync.get_torrents(['name'])
+        client._request = mock.Mock(side_effect=TypeError('changed signature'))
+        client.torrents = [Torrent(1, 'a changed')]
+        del client.requests[:]
+
+        assert [t.name for t in sync.get_torrents(['name'])] == ['a changed']
+        assert client.requests[-1][:2] == ('get_torrents', None), 'should fall back to a full refresh'
+
+    def test_clear(self):
+        client = MockClient([Torrent(1), Torrent(2)])
+        sync = TransmissionSync(client)
+        sync.get_torrents(['name'])
+        sync.remove_torrents([1], False)
+        assert list(sync.torrents) == [2]
+        plugin_transmission._syncs['test'] = sync
+        try:
+            plugin_transmission.clear_torrent_state(None, None)
+        finally:
+            del plugin_transmission._syncs['test']
+        assert sync.torrents == {} and sync.refreshed is None
@@ -1,5 +1,9 @@
 from __future__ import unicode_literals, division, absolute_import
-from flexget.plugin import get_plugin_by_name
+import threading
+
+from flexget.plugin import get_plugin_by_name, get_plugins
+from flexget.plugins import plugin_urlrewriting
+from flexget.plugins.plugin_urlrewriting import RewriterIndex
 
 
 class TestURLRewriters(object):
@@ -96,3 +100,76 @@ class TestRegexpurlrewriter(object):
         task = execute_task('test')
         assert task.find_entry(url='http://newzleech.com/?m=gen&dl=1&post=123'), \
             'did not url_rewrite properly'
+
+
+class TestUrlRewriting(object):
+
+    config = """
+        tasks:
+          test:
+            mock:
+              - {title: 'cinemageddon', url: 'http://cinemageddon.net/details.php?id=1234'}
+              - {title: 'nyaa', url: 'http://www.nyaa.eu/?page=torrentinfo&tid=12345'}
+              - {title: 'other', url: 'http://example.com/details.php?id=1234'}
+            accept_all: yes
+            disable: seen
+            urlrewriting:
+              workers: 2
+    """
+
+    def test_index(self):
+        index = RewriterIndex(get_plugins(group='urlrewriter'))
+        names = [rewriter.name for rewriter in index.rewriters('http://torrents.thepiratebay.se/123/Test.avi')]
+        assert 'piratebay' in names
+        assert 'nyaa' not in names
+        assert 'urlrewrite' in names, 'rewriters without hosts should be tried for all urls'
+
+    def test_rewrite(self, execute_task):
+        task = execute_task('test')
+        assert task.find_entry(title='cinemageddon')['url'] == \
+            'http://cinemageddon.net/download.php?id=1234&name=cinemageddon.torrent'
+        assert task.find_entry(title='nyaa')['url'] == 'http://www.nyaa.eu/?page=download&tid=12345'
+        assert task.find_entry(title='other')['url'] == 'http://example.com/details.php?id=1234'
+
+    def test_cache(self, execute_task, monkeypatch):
+        execute_task('test')
+        rewriter = get_plugin_by_name('cinemageddon').instance
+        monkeypatch.setattr(rewriter, 'url_rewrite', lambda task, entry: None)
+        task = execute_task('test')
+        assert task.find_entry(title='cinemageddon')['url'] == \
+            'http://cinemageddon.net/download.php?id=1234&name=cinemageddon.torrent', 'rewritten url should be cached'
+
+    def test_cache_fields(self, execute_task, monkeypatch):
+        rewriter = get_plugin_by_name('cinemageddon').instance
+        url_rewrite = rewriter.url_rewrite
+
+        def rewrite_with_fields(task, entry):
+            url_rewrite(task, entry)
+            entry['urls'] = [entry['url'], 'http://mirror.example.com/1234.torrent']
+            entry['torrent_seeds'] = 5
+
+        monkeypatch.setattr(rewriter, 'url_rewrite', rewrite_with_fields)
+        execute_task('test')
+        monkeypatch.setattr(rewriter, 'url_rewrite', lambda task, entry: None)
+        task = execute_task('test')
+        entry = task.find_entry(title='cinemageddon')
+        assert entry['urls'][1] == 'http://mirror.example.com/1234.torrent', 'all rewritten fields should be cached'
+        assert entry['torrent_seeds'] == 5
+
+    def test_threaded(self, execute_task, monkeypatch):
+        threads = {}
+        for name in ['cinemageddon', 'nyaa']:
+            rewriter = get_plugin_by_name(name).instance
+
+            def record(task, entry, url_rewrite=rewriter.url_rewrite):
+                threads[entry['title']] = threading.current_thread()
+                url_rewrite(task, entry)
+
+            monkeypatch.setattr(rewriter, 'url_rewrite', record)
+        # The in memory test database can't be shared between threads, which disables the worker pool
+        monkeypatch.setattr(plugin_urlrewriting, 'threads_share_database', lambda engine: True)
+        task = execute_task('test')
+        assert task.find_entry(title='cinemageddon')['url'] == \
+            'http://cinemageddon.net/download.php?id=1234&name=cinemageddon.torrent'
+        assert task.find_entry(title='nyaa')['url'] == 'http://www.nyaa.eu/?page=download&tid=12345'
+        assert threading.current_thread() not in threads.values(), 'entries should be rewritten in worker threads'
@@ -1,5 +1,13 @@
 from datetime import datetime
-from flexget.utils import json
+import errno
+import io
+import os
+import shutil
+
+import mock
+import pytest
+
+from flexget.utils import json, log_index
 
 
 class TestJson(object):
@@ -30,3 +38,420 @@ class TestJson(object):
 
         dt = datetime.strptime(date_str, '"%Y-%m-%dT%H:%M:%SZ"')
         assert decoded_dt == {'date': dt}
+
+
+class MatchAll(object):
+    def matches(self, line):
+        return True
+
+
+class Contains(object):
+    def __init__(self, text):
+        self.text = text
+
+    def matches(self, line):
+        return self.text in line
+
+
+class TestLogIndex(object):
+    def write_log(self, path, start, count):
+        with open(path, 'wb') as f:
+            for i in range(start, start + count):
+                f.write(b'2016-01-%02d 10:00 INFO     test          task            message %d\n' % (i // 10 + 1, i))
+
+    def test_read_last_lines(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(log_index, 'LINES_PER_BLOCK', 7)
+        base_log_file = tmpdir.join('flexget.log').strpath
+        self.write_log(base_log_file + '.1', 0, 50)
+        self.write_log(base_log_file, 50, 20)
+
+        lines, stream_from = log_index.read_log_lines(base_log_file, 30, MatchAll())
+        assert len(lines) == 30
+        assert lines[0].endswith(b'message 40')
+        assert lines[-1].endswith(b'message 69')
+        assert stream_from == os.path.getsize(base_log_file)
+        # Index of the rotated file is saved next to the log
+        assert os.path.isfile(base_log_file + '.index')
+
+    def test_search_and_time_range(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(log_index, 'LINES_PER_BLOCK', 7)
+        base_log_file = tmpdir.join('flexget.log').strpath
+        self.write_log(base_log_file, 0, 70)
+
+        lines, _ = log_index.read_log_lines(base_log_file, 100, Contains(b'message 5'))
+        assert lines == [l for l in lines if b'message 5' in l]
+        assert len(lines) == 11
+
+        lines, _ = log_index.read_log_lines(base_log_file, 100, MatchAll(),
+                                         since=b'2016-01-03 00:00', until=b'2016-01-04 23:59')
+        assert len(lines) == 20
+        assert lines[0].endswith(b'message 20')
+        assert lines[-1].endswith(b'message 39')
+
+    def test_range_ended(self):
+        assert not log_index.range_ended(None)
+        assert log_index.range_ended(b'2016-01-01 10:00')
+        assert not log_index.range_ended(b'9999-12-31 23:59')
+
+
+class TestLogRecordBuffer(object):
+    def make_record(self, message, task='', task_id='', levelno=20):
+        return {'timestamp': '2016-01-01 10:00:00', 'levelno': levelno, 'level': 'INFO', 'plugin': 'test',
+                'task': task, 'task_id': task_id, 'message': message}
+
+    def test_query(self):
+        from flexget.logger import LogRecordBuffer
+        buffer = LogRecordBuffer()
+        buffer.add(self.make_record('a', task='task1', task_id='1'))
+        buffer.add(self.make_record('b', task='task2', task_id='2', levelno=10))
+        buffer.add(self.make_record('c', task='task1', task_id='3'))
+        buffer.add(self.make_record('d'))
+
+        assert [r['message'] for r in buffer.query()] == ['a', 'b', 'c', 'd']
+        assert [r['message'] for r in buffer.query(task='task1')] == ['a', 'c']
+        assert [r['message'] for r in buffer.query(task_id='2')] == ['b']
+        assert [r['message'] for r in buffer.query(level=20)] == ['a', 'c', 'd']
+        assert [r['message'] for r in buffer.query(limit=2)] == ['c', 'd']
+        assert [r['message'] for r in buffer.query(after=2)] == ['c', 'd']
+
+    def test_size_limit(self):
+        from flexget.logger import LogRecordBuffer
+        buffer = LogRecordBuffer(max_bytes=1000)
+        for i in range(20):
+            buffer.add(self.make_record('x' * 100, task='task%d' % (i % 2), task_id=str(i)))
+        assert buffer.size <= 1000
+        records = buffer.query()
+        assert records[-1]['id'] == 20
+        assert len(records) < 20
+        # Indexes don't keep evicted records around
+        assert sum(len(r) for r in buffer.by_task.values()) == len(records)
+        assert '0' not in buffer.by_task_id
+
+    def test_records_before_start(self, monkeypatch):
+        import logging
+        from flexget import logger
+        root = logging.getLogger()
+        monkeypatch.setattr(root, 'handlers', list(root.handlers))
+        monkeypatch.setattr(root, 'level', root.level)
+        monkeypatch.setattr(logger, '_logging_configured', False)
+        monkeypatch.setattr(logger, '_logging_started', False)
+        monkeypatch.setattr(logger, '_buff_handler', None)
+        monkeypatch.setattr(logger, 'record_buffer', logger.LogRecordBuffer())
+
+        logger.initialize()
+        logging.getLogger('test').info('before start')
+        logger.start(to_file=False, to_console=False)
+        logging.getLogger('test').info('after start')
+        messages = [r['message'] for r in logger.record_buffer.query(level=logging.INFO)]
+        assert messages == ['before start', 'after start'], 'each record should be stored once'
+
+
+class TestFileOps(object):
+    def make_tree(self, tmpdir):
+        src = tmpdir.mkdir('src')
+        src.join('a').write('a' * 100000)
+        src.mkdir('sub').join('b').write('b')
+        return src
+
+    def test_copy_file(self, tmpdir):
+        from flexget.utils import file_ops
+        src = self.make_tree(tmpdir)
+        transfer = file_ops.copy_file(src.join('a').strpath, tmpdir.strpath)
+        assert transfer.size == 100000
+        assert transfer.method in ('reflink', 'copy_file_range', 'sendfile', 'read/write')
+        assert tmpdir.join('a').read() == 'a' * 100000
+
+    def test_copy_file_fallback(self, tmpdir, monkeypatch):
+        from flexget.utils import file_ops
+
+        def unsupported(src_fd, dst_fd):
+            raise OSError(errno.ENOSYS, 'not supported')
+
+        monkeypatch.setattr(file_ops, 'reflink', lambda src_fd, dst_fd: False)
+        monkeypatch.setattr(file_ops, '_methods', [('unsupported', unsupported)] + file_ops._methods[-1:])
+        src = self.make_tree(tmpdir)
+        transfer = file_ops.copy_file(src.join('a').strpath, tmpdir.join('c').strpath)
+        assert transfer.method == 'read/write'
+        assert tmpdir.join('c').read() == 'a' * 100000
+
+    def test_copy_file_nothing_copied(self, tmpdir, monkeypatch):
+        from flexget.utils import file_ops
+        # Like copy_file_range on some fuse and network filesystems
+        monkeypatch.setattr(file_ops, 'reflink', lambda src_fd, dst_fd: False)
+        monkeypatch.setattr(file_ops, '_methods', [('eof', lambda src_fd, dst_fd: 0)] + file_ops._methods[-1:])
+        src = self.make_tree(tmpdir)
+        transfer = file_ops.copy_file(src.join('a').strpath, tmpdir.join('c').strpath)
+        assert transfer == ('read/write', 100000)
+        assert tmpdir.join('c').read() == 'a' * 100000
+
+    def test_move_incomplete_copy(self, tmpdir, monkeypatch):
+        from flexget.utils import file_ops
+
+        def rename(src, dst):
+            raise OSError(errno.EXDEV, 'cross-device link')
+
+        monkeypatch.setattr(file_ops.os, 'rename', rename)
+        monkeypatch.setattr(file_ops, 'reflink', lambda src_fd, dst_fd: False)
+        monkeypatch.setattr(file_ops, '_methods', [('read/write', lambda src_fd, dst_fd: 0)])
+        src = self.make_tree(tmpdir)
+        with pytest.raises(shutil.Error):
+            file_ops.move(src.join('a').strpath, tmpdir.strpath)
+        assert src.join('a').size() == 100000, 'the source should be kept when its data was not copied'
+        assert not tmpdir.join('a').exists()
+        with pytest.raises(shutil.Error):
+            file_ops.move(src.strpath, tmpdir.join('dst').strpath)
+        assert src.join('a').size() == 100000
+
+    def test_copy_tree(self, tmpdir):
+        from flexget.utils import file_ops
+        src = self.make_tree(tmpdir)
+        transfer = file_ops.copy_tree(src.strpath, tmpdir.join('dst').strpath, workers=4)
+        assert transfer.size == 100001
+        assert tmpdir.join('dst', 'sub', 'b').read() == 'b'
+        assert src.join('sub', 'b').exists()
+
+    def test_move(self, tmpdir):
+        from flexget.utils import file_ops
+        src = self.make_tree(tmpdir)
+        dst = tmpdir.mkdir('dst')
+        assert file_ops.move(src.strpath, dst.strpath).method == 'rename'
+        assert dst.join('src', 'a').size() == 100000
+        assert not src.exists()
+
+
+class TestConnectionPools(object):
+    def test_shared_between_sessions(self):
+        from flexget.utils import requests
+        pools = requests.ConnectionPools()
+        pool = pools.connection_from_url('http://example.com/a')
+        assert pools.connection_from_url('http://example.com/b') is pool
+        assert pools.connection_from_url('http://example.org/') is not pool
+        # Different certificate settings don't share connections
+        assert pools.connection_from_url('https://example.com/', verify=False) is not \
+            pools.connection_from_url('https://example.com/')
+        assert pools.stats()['hosts'] == 4
+
+    def test_evict_idle(self):
+        from flexget.utils import requests
+        pools = requests.ConnectionPools(idle_time=60)
+        old = pools.connection_from_url('http://example.com/')
+        pools.connection_from_url('http://example.org/')
+        pools.last_used[old] -= 120
+        pools.evict_idle()
+        assert pools.stats()['hosts'] == 1
+        assert pools.stats()['evicted'] == 1
+        assert old.pool is None
+
+    def test_session_adapters(self):
+        from flexget.utils import requests
+        session, other = requests.Session(), requests.Session()
+        session.cookies.set('name', 'value')
+        assert isinstance(session.get_adapter('https://example.com/'), requests.PooledHTTPAdapter)
+        assert not other.cookies
+        # Closing a session leaves the shared connections open
+        pool = requests.connection_pools.connection_from_url('http://example.com/')
+        session.close()
+        assert pool.pool is not None
+
+
+class TestHTTPCache(object):
+    def make_request(self, url='http://example.com/', headers=None):
+        from requests import Request
+        return Request('GET', url, headers=headers).prepare()
+
+    def test_freshness(self):
+        from flexget.utils.http_cache import freshness_lifetime
+        assert freshness_lifetime({'cache-control': 'public, max-age=60'}, 0) == 60
+        assert freshness_lifetime({'expires': 'Thu, 01 Jan 2015 01:00:00 GMT',
+                                   'date': 'Thu, 01 Jan 2015 00:00:00 GMT'}, 0) == 3600
+        assert freshness_lifetime({'expires': '0'}, 0) == 0
+        assert freshness_lifetime({'last-modified': 'Thu, 01 Jan 2015 00:00:00 GMT',
+                                   'date': 'Thu, 01 Jan 2015 01:00:00 GMT'}, 0) == 360
+        assert freshness_lifetime({}, 0) is None
+
+    def test_store_and_lookup(self, tmpdir):
+        from flexget.utils.http_cache import DiskStore, HTTPCache
+        cache = HTTPCache(DiskStore(tmpdir.strpath, 1024), {'example.org': 3600})
+        request = self.make_request()
+        assert cache.storable(request, 200, {'cache-control': 'max-age=60'})
+        assert not cache.storable(request, 200, {'cache-control': 'no-store, max-age=60'})
+        assert not cache.storable(request, 200, {})
+        assert not cache.storable(request, 500, {'cache-control': 'max-age=60'})
+
+        cache.save(request, 200, 'OK', {'Cache-Control': 'max-age=60', 'Content-Encoding': 'gzip'}, b'body')
+        meta, body, fresh = cache.lookup(request)
+        assert body == b'body'
+        assert fresh
+        assert 'content-encoding' not in meta['headers']
+
+        # Domain overrides apply to subdomains, even without caching headers
+        request = self.make_request('http://api.example.org/')
+        assert cache.storable(request, 200, {})
+        cache.save(request, 200, 'OK', {}, b'api')
+        assert cache.lookup(request)[2]
+        assert not cache.usable(self.make_request(headers={'Cookie': 'a=b'}))
+        assert cache.usable(self.make_request('http://api.example.org/', headers={'Cookie': 'a=b'}))
+
+    def test_stale(self, tmpdir):
+        from flexget.utils.http_cache import DiskStore, HTTPCache
+        cache = HTTPCache(DiskStore(tmpdir.strpath, 1024))
+        request = self.make_request()
+        cache.save(request, 200, 'OK', {'ETag': '"1"'}, b'body')
+        meta, body, fresh = cache.lookup(request)
+        assert not fresh
+        meta = cache.refresh(request, meta, body, {'Cache-Control': 'max-age=60'})
+        assert meta['headers']['etag'] == '"1"'
+        assert cache.lookup(request)[2]
+
+    def test_feed_heuristic(self):
+        from flexget.utils.http_cache import freshness_lifetime
+        headers = {'last-modified': 'Thu, 01 Jan 2015 00:00:00 GMT', 'date': 'Thu, 01 Jan 2015 01:00:00 GMT'}
+        assert freshness_lifetime(dict(headers, **{'content-type': 'text/html'}), 0) == 360
+        assert freshness_lifetime(dict(headers, **{'content-type': 'application/rss+xml'}), 0) is None
+
+    def test_lru_eviction(self, tmpdir):
+        from flexget.utils.http_cache import DiskStore
+        store = DiskStore(tmpdir.strpath, 250)
+        for key in ('a', 'b', 'c'):
+            store.set(key, {}, b'x' * 50)
+        store.get('a')
+        store.set('d', {}, b'x' * 50)
+        assert store.size <= 250
+        assert store.get('b') is None
+        assert store.get('a') is not None
+        assert len(DiskStore(tmpdir.strpath, 250).files) == 3
+
+
+class TestCachingHTTPAdapter(object):
+    @pytest.fixture()
+    def server(self, monkeypatch):
+        """Fake server behind the adapter, answers requests with the (status, headers, body) in `responses`."""
+        from requests.packages.urllib3.response import HTTPResponse
+        from flexget.utils import requests
+
+        class Server(object):
+            def __init__(self):
+                self.responses = []
+                self.requests = []
+
+        server = Server()
+
+        def send(adapter, request, **kwargs):
+            server.requests.append(request)
+            status, headers, body = server.responses.pop(0)
+            raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status, preload_content=False)
+            return adapter.build_response(request, raw)
+
+        monkeypatch.setattr(requests.PooledHTTPAdapter, 'send', send)
+        return server
+
+    def make_adapter(self, tmpdir):
+        from flexget.utils.http_cache import DiskStore, HTTPCache
+        from flexget.utils.requests import CachingHTTPAdapter
+        return CachingHTTPAdapter(HTTPCache(DiskStore(tmpdir.strpath, 1024 * 1024)))
+
+    def make_request(self, url='http://example.com/'):
+        from requests import Request
+        return Request('GET', url).prepare()
+
+    def test_fresh_hit(self, tmpdir, server):
+        adapter = self.make_adapter(tmpdir)
+        server.responses.append((200, {'Cache-Control': 'max-age=60'}, b'body'))
+        assert adapter.send(self.make_request()).content == b'body'
+        response = adapter.send(self.make_request())
+        assert response.content == b'body'
+        assert response.from_cache
+        assert len(server.requests) == 1
+        assert adapter.cache.counters['hits'] == 1
+
+    def test_revalidate(self, tmpdir, server):
+        adapter = self.make_adapter(tmpdir)
+        server.responses.append((200, {'ETag': '"1"'}, b'body'))
+        adapter.send(self.make_request()).content
+        server.responses.append((304, {'Cache-Control': 'max-age=60'}, b''))
+        response = adapter.send(self.make_request())
+        assert server.requests[1].headers['If-None-Match'] == '"1"'
+        assert response.status_code == 200
+        assert response.content == b'body'
+        assert adapter.cache.counters['revalidated'] == 1
+        # The server said it's fresh for a while now
+        assert adapter.send(self.make_request()).from_cache
+        assert len(server.requests) == 2
+
+    def test_too_big(self, tmpdir, server, monkeypatch):
+        from flexget.utils import requests
+        monkeypatch.setattr(requests, 'MAX_ENTRY_SIZE', 10)
+        adapter = self.make_adapter(tmpdir)
+        body = b''.join(b'%03d' % i for i in range(100))
+        server.responses.append((200, {'Cache-Control': 'max-age=60'}, body))
+        response = adapter.send(self.make_request())
+        # What was read while trying to store it is replayed before the rest
+        assert isinstance(response.raw, requests._PrefixedRaw)
+        assert response.raw.read(5) == body[:5]
+        assert response.raw.read() == body[5:]
+        assert not adapter.cache.store.files
+
+    def test_session_limiter(self, tmpdir, server, monkeypatch):
+        from flexget.utils import requests
+        from flexget.utils.http_cache import DiskStore, HTTPCache
+        from requests import Request, sessions
+
+        def request(session, method, url, **kwargs):
+            # Send through the mounted adapters, bypassing the no_requests fixture
+            return session.send(session.prepare_request(Request(method, url)), stream=True)
+
+        monkeypatch.setattr(sessions.Session, 'request', request)
+        monkeypatch.setattr(requests, 'response_cache', HTTPCache(DiskStore(tmpdir.strpath, 1024 * 1024)))
+        limiter = mock.Mock(domain='example.com')
+        session = requests.Session()
+        session.add_domain_limiter(limiter)
+        server.responses.append((200, {'Cache-Control': 'max-age=60'}, b'body'))
+        assert session.get('http://example.com/').content == b'body'
+        assert limiter.call_count == 1
+        assert session.get('http://example.com/').content == b'body'
+        assert limiter.call_count == 1, 'a response from the cache should not wait for the limiter'
+        server.responses.append((200, {}, b'other'))
+        session.get('http://example.com/other')
+        assert limiter.call_count == 2
+
+
+class TestDomainLimiters(object):
+    def test_find_limiter(self):
+        from flexget.utils.requests import DomainLimiters, find_limiter
+        limiters = DomainLimiters({'example.com': 'example', 'api.example.com': 'api', 'example.org/path': 'path',
+                                   'torrentleech': 'partial'})
+        # Only keys which aren't domain names are searched for in urls
+        assert sorted(limiters.partial) == ['example.org/path', 'torrentleech']
+        assert find_limiter('http://notexample.com/', limiters) is None
+        assert find_limiter('http://example.com/', limiters) == 'example'
+        assert find_limiter('https://www.example.com/a', limiters) == 'example'
+        assert find_limiter('https://api.example.com/a', limiters) == 'api'
+        assert find_limiter('http://example.net/', limiters) is None
+        assert find_limiter('http://example.org/path/a', limiters) == 'path'
+        # Keys which aren't domain names match any part of the url, like before the lookup by host
+        assert find_limiter('https://www.torrentleech.org/torrents', limiters) == 'partial'
+        del limiters['torrentleech']
+        assert find_limiter('https://www.torrentleech.org/torrents', limiters) is None
+
+    def test_non_blocking(self, monkeypatch):
+        from flexget.utils import requests
+        monkeypatch.setattr(requests.TokenBucketLimiter, 'state_store', requests.MemoryLimiterState())
+        limiter = requests.TokenBucketLimiter('example.com', 2, '1 minute')
+        limiter()
+        limiter(wait=False)
+        assert limiter.wait_time() > 50
+        with pytest.raises(requests.DomainLimitExceeded) as exc_info:
+            limiter(wait=False)
+        assert exc_info.value.wait > 50
+        # Other instances for the same domain share the state
+        assert requests.TokenBucketLimiter('example.com', 2, '1 minute').tokens < 1
+
+    def test_file_state(self, tmpdir):
+        from flexget.utils.requests import FileLimiterState
+        path = tmpdir.join('limits.json').strpath
+        state = FileLimiterState(path)
+        assert state.take('example.com', 1, 60) == 0
+        # Another process using the same file sees the taken token
+        assert FileLimiterState(path).take('example.com', 1, 60) > 50
+        state.set_tokens('example.com', 1)
+        assert FileLimiterState(path).take('example.com', 1, 60) == 0